@@ -0,0 +1,110 @@
+"""自动分析的通用缓存
+
+结果缓存: 每个章节、每种分析一个 JSON 文件，按两张图像的大小和修改时间判断是否有效。
+中间掩码缓存: 每页的掩码保存为 .npz 文件，文件名包含输入图像的状态摘要，
+输入变化后自动失效。修正少量页面后重新运行只会重新计算变化的页面。
+并行调度见 check_scheduler。
+"""
+import os
+import json
+import hashlib
+
+from session_store import file_stat
+
+# 缓存根目录名，位于标注文件夹下
+CACHE_DIR_NAME = ".mangaqc_cache"
+
+
+def chapter_name(original_folder):
+    return os.path.basename(os.path.normpath(original_folder))
+
+
+def chapter_cache_path(annotation_folder, original_folder, label):
+    """章节级结果缓存文件路径，例如 第1话_画质缓存.json"""
+    return os.path.join(annotation_folder, f"{chapter_name(original_folder)}_{label}.json")
+
+
+def mask_dir(annotation_folder, original_folder, kind):
+    """中间掩码缓存目录"""
+    return os.path.join(annotation_folder, CACHE_DIR_NAME, chapter_name(original_folder), kind)
+
+
+def load_results(path, version):
+    """读取结果缓存，不存在、损坏或版本不同时返回空缓存"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {"version": version, "pages": {}}
+    if cache.get("version") != version:
+        return {"version": version, "pages": {}}
+    cache.setdefault("pages", {})
+    return cache
+
+
+def save_results(path, cache):
+    """原子地写入结果缓存"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def stats_key(*stats):
+    """把若干文件状态压缩为短摘要，用于掩码缓存文件名"""
+    payload = json.dumps(stats, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def load_masks(folder, name, key):
+    """读取缓存的掩码，不存在时返回None"""
+    import numpy as np
+
+    path = os.path.join(folder, f"{name}.{key}.npz")
+    try:
+        with np.load(path) as data:
+            return {k: data[k] for k in data.files}
+    except (OSError, ValueError):
+        return None
+
+
+def save_masks(folder, name, key, **arrays):
+    """保存掩码并删除同一页面旧版本的缓存"""
+    import numpy as np
+
+    os.makedirs(folder, exist_ok=True)
+    prefix = f"{name}."
+    for existing in os.listdir(folder):
+        # 其他进程可能正在写入同一页面的临时文件，不要删除
+        if (existing.startswith(prefix) and existing.endswith(".npz") and ".tmp" not in existing
+                and existing != f"{name}.{key}.npz"):
+            try:
+                os.remove(os.path.join(folder, existing))
+            except OSError:
+                pass
+    # 多个工作进程可能同时计算同一页面的掩码，临时文件名包含进程号
+    tmp_path = os.path.join(folder, f"{name}.{key}.{os.getpid()}.tmp.npz")
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, os.path.join(folder, f"{name}.{key}.npz"))
+
+
+def split_cached(pairs, cache):
+    """把图像对分为缓存仍然有效的和需要重新分析的
+
+    pairs 为 [(原图路径, 翻译图路径, 文件名)]，文件大小和修改时间未变时缓存有效。
+    返回 ({文件名: 结果}, [(原图路径, 翻译图路径, 文件名, 文件状态)])。
+    """
+    results = {}
+    pending = []
+    for original_path, translated_path, filename in pairs:
+        try:
+            stats = [file_stat(original_path), file_stat(translated_path)]
+        except OSError:
+            continue
+        cached = cache["pages"].get(filename)
+        if cached and cached.get("stats") == stats:
+            results[filename] = cached["result"]
+        else:
+            pending.append((original_path, translated_path, filename, stats))
+    return results, pending
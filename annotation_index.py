@@ -0,0 +1,93 @@
+import math
+
+# 网格单元大小（场景坐标，像素）
+CELL_SIZE = 256
+
+
+class AnnotationIndex:
+    """标注矩形的均匀网格空间索引
+
+    每个矩形登记在它覆盖的所有网格单元中，点查询和区域查询只需要检查
+    相关单元内的矩形，标注数量达到上千个时命中测试仍然很快。
+    矩形使用 (x, y, w, h) 元组，键可以是任意可哈希对象（通常是矩形图元）。
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (列, 行) -> 键集合
+        self.rects = {}  # 键 -> (x, y, w, h)
+
+    def __len__(self):
+        return len(self.rects)
+
+    def __contains__(self, key):
+        return key in self.rects
+
+    def _cells_for(self, rect):
+        """返回矩形覆盖的所有网格单元"""
+        x, y, w, h = rect
+        size = self.cell_size
+        col1, row1 = math.floor(x / size), math.floor(y / size)
+        col2, row2 = math.floor((x + w) / size), math.floor((y + h) / size)
+        return [(col, row) for col in range(col1, col2 + 1) for row in range(row1, row2 + 1)]
+
+    def insert(self, key, rect):
+        """登记一个矩形，已存在的键会被更新"""
+        if key in self.rects:
+            self.remove(key)
+        self.rects[key] = tuple(rect)
+        for cell in self._cells_for(rect):
+            self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key):
+        """移除一个矩形，键不存在时忽略"""
+        rect = self.rects.pop(key, None)
+        if rect is None:
+            return
+        for cell in self._cells_for(rect):
+            bucket = self.cells.get(cell)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self.cells[cell]
+
+    def update(self, key, rect):
+        """矩形移动或缩放后更新索引"""
+        self.insert(key, rect)
+
+    def clear(self):
+        self.cells.clear()
+        self.rects.clear()
+
+    def rect(self, key):
+        return self.rects.get(key)
+
+    def query_point(self, x, y, margin=0.0):
+        """返回包含该点的所有键，按面积从小到大排序（最上层的在前）"""
+        candidates = set()
+        for cell in self._cells_for((x - margin, y - margin, 2 * margin, 2 * margin)):
+            candidates.update(self.cells.get(cell, ()))
+        hits = []
+        for key in candidates:
+            rx, ry, rw, rh = self.rects[key]
+            if rx - margin <= x <= rx + rw + margin and ry - margin <= y <= ry + rh + margin:
+                hits.append(key)
+        hits.sort(key=lambda k: self.rects[k][2] * self.rects[k][3])
+        return hits
+
+    def query_rect(self, rect, contained=False):
+        """返回与区域相交的键；contained为True时只返回完全位于区域内的键"""
+        qx, qy, qw, qh = rect
+        found = set()
+        for cell in self._cells_for(rect):
+            found.update(self.cells.get(cell, ()))
+
+        result = []
+        for key in found:
+            rx, ry, rw, rh = self.rects[key]
+            if contained:
+                if qx <= rx and qy <= ry and rx + rw <= qx + qw and ry + rh <= qy + qh:
+                    result.append(key)
+            elif rx <= qx + qw and qx <= rx + rw and ry <= qy + qh and qy <= ry + rh:
+                result.append(key)
+        return result
@@ -0,0 +1,160 @@
+"""标注文字的全文索引（与资料库共用同一个 SQLite 文件）
+
+倒排索引 annotation_terms 记录 词 -> 标注。分词规则:
+- 文字先做 NFKC 规范化（全角字母数字转半角）并转为小写
+- 中日韩文字没有空格分词，按单字和相邻两字（二元组）建索引
+- 其他字母数字按单词建索引，查询时按前缀匹配（“honor” 能找到 “honorific”）
+
+查询时把每个词的倒排列表取交集（走 (term, annotation_id) 主键），再用原文做子串校验，
+去掉二元组恰好都出现但并不相连的误匹配。几万条标注的查询也只需要几毫秒。
+
+索引按页更新：界面中增删改或撤销标注时只重建当前页的记录；
+资料库后台索引时按会话文件的修改时间判断章节的标注是否需要重建。
+"""
+import os
+import re
+import unicodedata
+
+from image_pairing import folder_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    id INTEGER PRIMARY KEY,
+    chapter_id INTEGER NOT NULL REFERENCES chapters(id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    view TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    w REAL NOT NULL,
+    h REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS annotations_page ON annotations (chapter_id, filename);
+CREATE TABLE IF NOT EXISTS annotation_terms (
+    term TEXT NOT NULL,
+    annotation_id INTEGER NOT NULL REFERENCES annotations(id) ON DELETE CASCADE,
+    PRIMARY KEY (term, annotation_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS annotation_terms_annotation ON annotation_terms (annotation_id);
+CREATE TABLE IF NOT EXISTS annotation_sources (
+    chapter_id INTEGER PRIMARY KEY REFERENCES chapters(id) ON DELETE CASCADE,
+    session_mtime INTEGER NOT NULL
+);
+"""
+
+# 中日韩统一表意文字、扩展A、兼容表意文字、平假名、片假名、谚文
+CJK = "㐀-䶿一-鿿豈-﫿぀-ヿ가-힯"
+RUN_PATTERN = re.compile(f"([{CJK}]+)|([^\\W{CJK}]+)")
+VIEWS = ("original", "translated")
+
+
+def normalize(text):
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def runs(text):
+    """返回 [(是否中日韩, 片段)]"""
+    return [(bool(cjk), cjk or word) for cjk, word in RUN_PATTERN.findall(normalize(text))]
+
+
+def tokenize(text):
+    """建索引用的词集合"""
+    terms = set()
+    for is_cjk, run in runs(text):
+        if is_cjk:
+            terms.update(run)
+            terms.update(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            terms.add(run)
+    return terms
+
+
+def query_terms(query):
+    """返回 [(词, 是否前缀匹配)]"""
+    terms = []
+    for is_cjk, run in runs(query):
+        if not is_cjk:
+            terms.append((run, True))
+        elif len(run) == 1:
+            terms.append((run, False))
+        else:
+            terms.extend((run[i:i + 2], False) for i in range(len(run) - 1))
+    return list(dict.fromkeys(terms))
+
+
+def index_page(conn, chapter_id, filename, page, commit=True):
+    """用 page = {"original": [(x, y, w, h, 文字)], "translated": [...]} 替换一页的索引"""
+    conn.execute("DELETE FROM annotations WHERE chapter_id = ? AND filename = ?", (chapter_id, filename))
+    for view in VIEWS:
+        for position, (x, y, w, h, text) in enumerate(page.get(view, [])):
+            if not text.strip():
+                continue
+            cursor = conn.execute(
+                "INSERT INTO annotations (chapter_id, filename, view, position, x, y, w, h, text) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (chapter_id, filename, view, position, x, y, w, h, text))
+            conn.executemany("INSERT INTO annotation_terms (term, annotation_id) VALUES (?, ?)",
+                             [(term, cursor.lastrowid) for term in tokenize(text)])
+    if commit:
+        conn.commit()
+
+
+def update_page(conn, original_folder, filename, page):
+    """界面编辑标注后更新一页的索引，章节不在资料库中时返回False"""
+    row = conn.execute("SELECT id FROM chapters WHERE folder_key = ?", (folder_key(original_folder),)).fetchone()
+    if row is None:
+        return False
+    index_page(conn, row["id"], filename, page)
+    return True
+
+
+def index_session(conn, chapter_id, session, session_mtime):
+    """会话文件变化后重建章节的标注索引，返回是否重建"""
+    row = conn.execute("SELECT session_mtime FROM annotation_sources WHERE chapter_id = ?", (chapter_id,)).fetchone()
+    if row is not None and row["session_mtime"] == session_mtime:
+        return False
+    conn.execute("DELETE FROM annotations WHERE chapter_id = ?", (chapter_id,))
+    for filename, page in session.get("page_annotations", {}).items():
+        index_page(conn, chapter_id, filename, page, commit=False)
+    conn.execute("INSERT INTO annotation_sources (chapter_id, session_mtime) VALUES (?, ?) "
+                 "ON CONFLICT (chapter_id) DO UPDATE SET session_mtime = excluded.session_mtime",
+                 (chapter_id, session_mtime))
+    return True
+
+
+def session_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def search(conn, query, series_id=None, limit=500):
+    """查询包含所有查询词的标注，返回带系列、章节和位置信息的行"""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    subqueries = []
+    params = []
+    for term, prefix in terms:
+        if prefix:
+            # 单词按前缀匹配，范围查询同样走主键
+            subqueries.append("SELECT annotation_id FROM annotation_terms WHERE term >= ? AND term < ?")
+            params += [term, term + "\U0010ffff"]
+        else:
+            subqueries.append("SELECT annotation_id FROM annotation_terms WHERE term = ?")
+            params.append(term)
+    where = "a.id IN (" + " INTERSECT ".join(subqueries) + ")"
+    if series_id is not None:
+        where += " AND c.series_id = ?"
+        params.append(series_id)
+    rows = conn.execute(
+        "SELECT a.*, c.name AS chapter, c.original_folder, s.name AS series "
+        "FROM annotations a JOIN chapters c ON c.id = a.chapter_id JOIN series s ON s.id = c.series_id "
+        f"WHERE {where} ORDER BY s.name, c.name, a.filename, a.view, a.position", params).fetchall()
+
+    # 二元组都出现不代表原文相连，用子串校验
+    phrases = [run for is_cjk, run in runs(query) if is_cjk and len(run) > 2]
+    if phrases:
+        rows = [row for row in rows if all(phrase in normalize(row["text"]) for phrase in phrases)]
+    return rows[:limit]
@@ -0,0 +1,221 @@
+"""无界面的批量质量检查
+
+在原图/翻译图根目录下按相同的相对路径配对章节，章节内按 find_image_pairs 相同的规则
+（文件名相同且尺寸相同）配对图像，然后在一个进程池中对所有章节运行自动检查:
+画质检查、排版溢出、清理残留和差异面积。
+
+    python batch_qc.py 原图根目录 翻译根目录 --workers 8
+
+结果写入每个章节的标注文件夹（与界面默认位置相同: 原图章节文件夹旁边的“标注”文件夹）:
+- 各项检查的结果缓存，界面打开章节时直接显示画质问题和建议标注，并按风险排序
+- <章节>_QC报告.json，按风险从高到低列出每页的检查结果（尺寸不同而没有配对的页面记为“分辨率不同”）
+- 会话文件（已有会话时不覆盖），界面打开章节时不需要重新扫描文件夹
+
+所有章节共用一个进程池，按页分批提交（check_scheduler），每页在一个工作进程中
+只解码一次并运行所有需要的检查，主进程只负责汇总，速度随核心数近似线性增长。
+结果缓存定期写入磁盘，中断后重新运行只会分析还没有结果的页面。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import analysis_cache
+import check_scheduler
+import image_decoders
+import quality_check
+import triage
+import session_store
+from image_pairing import pair_images, find_chapters, default_annotation_folder
+
+REPORT_LABEL = "QC报告"
+SAVE_INTERVAL = 30.0  # 结果缓存的最长写入间隔（秒）
+BATCH_SIZE = 2  # 每个工作进程任务处理的页数
+
+
+class Chapter:
+    """一个章节的配对结果、各项检查的缓存和未完成的任务数"""
+
+    def __init__(self, name, original_folder, translated_folder, checks):
+        self.name = name
+        self.original_folder = original_folder
+        self.translated_folder = translated_folder
+        self.annotation_folder = default_annotation_folder(original_folder)
+        pairs, self.mismatched = pair_images(original_folder, translated_folder)
+        self.pairs = [(o, t, filename) for o, t, filename, _ in pairs]
+        self.sizes = {filename: list(size) for _, _, filename, size in pairs}
+        self.job = check_scheduler.ChapterJob(self.pairs, self.annotation_folder, original_folder, checks)
+        self.results = self.job.results
+        self.outstanding = self.job.outstanding
+
+    def save_caches(self):
+        self.job.save_caches()
+
+    def report(self):
+        """汇总各项结果，按风险从高到低排列页面"""
+        pages = []
+        for _, _, filename in self.pairs:
+            quality = self.results.get("quality", {}).get(filename)
+            suggestions = (self.results.get("overflow", {}).get(filename, [])
+                           + self.results.get("residue", {}).get(filename, []))
+            diff = self.results.get("diff", {}).get(filename)
+            pages.append({
+                "filename": filename,
+                "risk": round(triage.risk_score(diff, quality, suggestions), 3),
+                "quality_issues": quality["issues"] if quality else None,
+                "quality_score": quality["score"] if quality else None,
+                "diff_area": diff["area"] if diff else None,
+                "suggestions": suggestions,
+            })
+        # 翻译图被缩小等尺寸不同的页面没有配对，也要出现在报告中
+        for filename, quality in quality_check.size_mismatch_results(self.mismatched).items():
+            pages.append({
+                "filename": filename,
+                "risk": round(triage.risk_score(quality=quality), 3),
+                "quality_issues": quality["issues"],
+                "quality_score": quality["score"],
+                "diff_area": None,
+                "suggestions": [],
+            })
+        pages.sort(key=lambda page: (-page["risk"], page["filename"]))
+        return {
+            "chapter": self.name,
+            "original_folder": self.original_folder,
+            "translated_folder": self.translated_folder,
+            "generated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "checks": sorted(self.results),
+            "summary": {
+                "pages": len(self.pairs),  # 配对的页面数
+                "quality_flagged": sum(1 for p in pages if p["quality_issues"]),
+                "suggestion_pages": sum(1 for p in pages if p["suggestions"]),
+                "suggestions": sum(len(p["suggestions"]) for p in pages),
+                "size_mismatched": len(self.mismatched),
+            },
+            "size_mismatched": [{"filename": f, "original": o, "translated": t} for f, o, t in self.mismatched],
+            "pages": pages,
+        }
+
+    def write_outputs(self, write_session=True):
+        """写入报告和会话文件，返回报告路径"""
+        self.save_caches()
+        path = analysis_cache.chapter_cache_path(self.annotation_folder, self.original_folder, REPORT_LABEL)
+        analysis_cache.save_results(path, self.report())
+        if write_session and self.pairs and not os.path.exists(
+                session_store.session_path(self.original_folder, self.translated_folder)):
+            session_store.save_session(self.initial_session())
+        return path
+
+    def initial_session(self):
+        """界面可以直接打开的会话"""
+        pairs = [{"filename": filename, "size": self.sizes[filename],
+                  "original": session_store.file_stat(o), "translated": session_store.file_stat(t)}
+                 for o, t, filename in self.pairs]
+        mismatched = [session_store.mismatched_entry(self.original_folder, self.translated_folder, *page)
+                      for page in self.mismatched]
+        return session_store.new_session(self.original_folder, self.translated_folder, self.annotation_folder, pairs,
+                                         mismatched=mismatched)
+
+
+def run(chapters, checks, workers=None, write_session=True, progress=print):
+    """对所有章节运行检查，返回 {章节名: 报告路径}"""
+    chapters = [Chapter(name, o, t, checks) for name, o, t in chapters]
+    reports = {}
+    for chapter in chapters:
+        if chapter.outstanding == 0:
+            reports[chapter.name] = chapter.write_outputs(write_session)
+    total = sum(chapter.outstanding for chapter in chapters)
+    progress(f"{len(chapters)} 个章节, {total} 项待分析（{len(reports)} 个章节已有全部结果）")
+    if total == 0:
+        return reports
+
+    # 缺少依赖时在主进程中尽早报错
+    check_scheduler.check_dependencies(checks)
+
+    done = 0
+    last_save = time.monotonic()
+    executor = ProcessPoolExecutor(max_workers=workers)
+    futures = {}
+    try:
+        for chapter in chapters:
+            for batch in chapter.job.batches(BATCH_SIZE):
+                future = executor.submit(check_scheduler.analyze_pages, batch, chapter.annotation_folder,
+                                         chapter.original_folder, check_scheduler.CHECK_MODULES)
+                futures[future] = (chapter, sum(len(page[4]) for page in batch))
+
+        for future in as_completed(futures):
+            chapter, count = futures[future]
+            try:
+                outcomes = future.result()
+            except Exception as e:
+                progress(f"{chapter.name} 检查失败: {e}")
+                outcomes = []
+            for filename, stats, results, errors in outcomes:
+                for check, error in errors.items():
+                    progress(f"{chapter.name}/{filename} {check} 失败: {error}")
+                chapter.job.record(filename, stats, results)
+            chapter.outstanding -= count
+            done += count
+            if chapter.outstanding == 0:
+                reports[chapter.name] = chapter.write_outputs(write_session)
+                progress(f"[{done}/{total}] 完成章节: {chapter.name}")
+            if time.monotonic() - last_save > SAVE_INTERVAL:
+                for other in chapters:
+                    other.save_caches()
+                last_save = time.monotonic()
+    except KeyboardInterrupt:
+        progress("已中断，保存已完成的结果，重新运行会从中断处继续")
+        for future in futures:
+            future.cancel()
+        raise
+    finally:
+        for chapter in chapters:
+            chapter.save_caches()
+        executor.shutdown(wait=True)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量运行原图/翻译图的自动质量检查")
+    parser.add_argument("original_root", help="原图根目录（每个子文件夹一个章节，或本身就是一个章节）")
+    parser.add_argument("translated_root", help="翻译图根目录，章节文件夹的相对路径与原图相同")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认为CPU核心数")
+    available = list(check_scheduler.load_checks())
+    parser.add_argument("--checks", default=",".join(available),
+                        help=f"逗号分隔的检查项目，可选: {', '.join(available)}")
+    parser.add_argument("--chapter", action="append", help="只检查指定的章节（相对路径），可以重复")
+    parser.add_argument("--no-session", action="store_true", help="不创建界面会话文件")
+    args = parser.parse_args()
+
+    checks = [c.strip() for c in args.checks.split(",") if c.strip()]
+    unknown = [c for c in checks if c not in available]
+    if unknown:
+        parser.error(f"未知的检查项目: {', '.join(unknown)}")
+
+    # 第一次运行时选择解码后端，工作进程读取保存的结果
+    image_decoders.ensure_benchmark()
+
+    chapters = find_chapters(args.original_root, args.translated_root)
+    if args.chapter:
+        wanted = {os.path.normpath(c) for c in args.chapter}
+        chapters = [c for c in chapters if os.path.normpath(c[0]) in wanted]
+    if not chapters:
+        print("没有找到可以配对的章节")
+        sys.exit(1)
+
+    try:
+        reports = run(chapters, checks, workers=args.workers, write_session=not args.no_session)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+    print(f"\n== 批量检查完成: {len(reports)} 个章节 ==")
+    for name, path in sorted(reports.items()):
+        with open(path, "r", encoding="utf-8") as f:
+            summary = json.load(f)["summary"]
+        print(f"{name}: {summary['pages']} 页, 画质问题 {summary['quality_flagged']} 页, "
+              f"建议标注 {summary['suggestions']} 处, 尺寸不同 {summary['size_mismatched']} 页  -> {path}")
+
+
+if __name__ == "__main__":
+    main()
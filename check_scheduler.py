@@ -0,0 +1,286 @@
+"""可插拔的自动检查调度
+
+每项检查是一个模块，模块中定义 CHECK 字典:
+    {"name": 检查名, "version": 算法版本, "inputs": (需要的中间结果名, ...),
+     "run": 函数(中间结果字典) -> 可以写入 JSON 的结果,
+     "cache_path": 函数(标注文件夹, 原图文件夹) -> 结果缓存路径,
+     "requires": 可选，[(可以互相替代的可选依赖模块, ...)]}
+内置检查见 CHECK_MODULES，新的检查模块用 register_check_module() 登记。
+
+中间结果（灰度图、缩小的灰度图、气泡掩码、差异图等）在 INPUTS 中声明各自依赖的中间结果。
+调度时按每对图像需要运行的检查求出依赖闭包，每个中间结果只计算一次，
+所有需要它的检查运行完后立即释放。每对图像在一个工作进程中完成所有检查，
+不同图像对在进程池中并行。
+
+结果仍然按检查分别缓存（与界面和批量检查读取的缓存相同），
+以两张图像的大小和修改时间以及检查的版本为键。
+"""
+import importlib
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import analysis_cache
+from image_ops import load_gray, downsample
+
+CHECK_MODULES = ["quality_check", "overflow_check", "residue_check", "triage"]
+
+# 中间结果: 名称 -> (依赖的中间结果, 函数(PageInputs) -> 值)
+INPUTS = {}
+
+# 每个进程中已经加载的检查，避免每页重新导入
+_loaded_checks = {}
+
+
+def register_input(name, deps, compute):
+    """声明一个中间结果，compute(page) 通过 page.get(依赖名) 读取依赖"""
+    INPUTS[name] = (tuple(deps), compute)
+
+
+def register_check_module(module_name):
+    """登记一个定义了 CHECK 的检查模块（必须可以在工作进程中按名称导入）"""
+    if module_name not in CHECK_MODULES:
+        CHECK_MODULES.append(module_name)
+
+
+def load_checks(module_names=None):
+    """导入检查模块，返回 {检查名: CHECK}"""
+    checks = {}
+    for module_name in module_names or CHECK_MODULES:
+        if module_name not in _loaded_checks:
+            _loaded_checks[module_name] = importlib.import_module(module_name).CHECK
+        check = _loaded_checks[module_name]
+        checks[check["name"]] = check
+    return checks
+
+
+def dependency_closure(names):
+    """返回 names 以及它们间接依赖的所有中间结果"""
+    closure = set()
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name in closure:
+            continue
+        if name not in INPUTS:
+            raise KeyError(f"未知的中间结果: {name}")
+        closure.add(name)
+        stack.extend(INPUTS[name][0])
+    return closure
+
+
+class PageInputs:
+    """一对图像的中间结果，按需计算，每项只计算一次"""
+
+    def __init__(self, original_path, translated_path, stats, annotation_folder, original_folder):
+        self.original_path = original_path
+        self.translated_path = translated_path
+        self.stats = stats
+        self.annotation_folder = annotation_folder
+        self.original_folder = original_folder
+        self.values = {}
+        self.computing = set()
+
+    def get(self, name):
+        if name not in self.values:
+            if name in self.computing:
+                raise ValueError(f"中间结果循环依赖: {name}")
+            deps, compute = INPUTS[name]
+            self.computing.add(name)
+            try:
+                for dep in deps:
+                    self.get(dep)
+                self.values[name] = compute(self)
+            finally:
+                # 计算失败时也要清除标记，否则同一页之后的检查会误报循环依赖
+                self.computing.discard(name)
+        return self.values[name]
+
+    def release(self, name):
+        self.values.pop(name, None)
+
+    def mask_folder(self, kind):
+        """中间掩码的磁盘缓存目录"""
+        return analysis_cache.mask_dir(self.annotation_folder, self.original_folder, kind)
+
+
+def common_crop(a, b):
+    height = min(a.shape[0], b.shape[0])
+    width = min(a.shape[1], b.shape[1])
+    return a[:height, :width], b[:height, :width]
+
+
+def diff_map(page):
+    """4 倍缩小后两张图像的灰度差"""
+    import numpy as np
+
+    original, translated = common_crop(page.get("original_quarter"), page.get("translated_quarter"))
+    return np.abs(original.astype(np.int16) - translated.astype(np.int16)).astype(np.uint8)
+
+
+def balloon_masks(page):
+    """原图的气泡/分格留白掩码（2 倍缩小），按原图文件状态缓存在磁盘上"""
+    import overflow_check
+
+    return overflow_check.cached_balloon_masks(page.get("original_half"), page.original_path,
+                                               page.stats[0], page.mask_folder("balloons"))
+
+
+register_input("original_gray", (), lambda page: load_gray(page.original_path))
+register_input("translated_gray", (), lambda page: load_gray(page.translated_path))
+register_input("original_half", ("original_gray",), lambda page: downsample(page.get("original_gray"), 2))
+register_input("translated_half", ("translated_gray",), lambda page: downsample(page.get("translated_gray"), 2))
+register_input("original_quarter", ("original_gray",), lambda page: downsample(page.get("original_gray"), 4))
+register_input("translated_quarter", ("translated_gray",), lambda page: downsample(page.get("translated_gray"), 4))
+register_input("diff_map", ("original_quarter", "translated_quarter"), diff_map)
+register_input("balloon_masks", ("original_half",), balloon_masks)
+
+
+def analyze_page(page, checks, check_names):
+    """对一对图像运行多项检查，返回 ({检查名: 结果}, {检查名: 错误信息})
+
+    中间结果在最后一个需要它的检查运行完后释放，控制工作进程的内存占用。
+    """
+    closures = {name: dependency_closure(checks[name]["inputs"]) for name in check_names}
+    remaining = {}
+    for closure in closures.values():
+        for item in closure:
+            remaining[item] = remaining.get(item, 0) + 1
+
+    results = {}
+    errors = {}
+    for name in check_names:
+        check = checks[name]
+        try:
+            results[name] = check["run"]({item: page.get(item) for item in check["inputs"]})
+        except Exception as e:
+            errors[name] = str(e)
+        for item in closures[name]:
+            remaining[item] -= 1
+            if remaining[item] == 0:
+                page.release(item)
+    return results, errors
+
+
+def analyze_pages(batch, annotation_folder, original_folder, module_names):
+    """在工作进程中分析一批图像对
+
+    batch 为 [(原图路径, 翻译图路径, 文件名, 文件状态, [检查名])]，
+    返回 [(文件名, 文件状态, {检查名: 结果}, {检查名: 错误信息})]。
+    """
+    checks = load_checks(module_names)
+    outcomes = []
+    for original_path, translated_path, filename, stats, check_names in batch:
+        page = PageInputs(original_path, translated_path, stats, annotation_folder, original_folder)
+        try:
+            results, errors = analyze_page(page, checks, check_names)
+        except Exception as e:
+            results, errors = {}, {name: str(e) for name in check_names}
+        outcomes.append((filename, stats, results, errors))
+    return outcomes
+
+
+class ChapterJob:
+    """一个章节需要运行的检查：各项检查的缓存、已有结果和每页待运行的检查"""
+
+    def __init__(self, pairs, annotation_folder, original_folder, check_names=None):
+        self.annotation_folder = annotation_folder
+        self.original_folder = original_folder
+        self.checks = load_checks()
+        self.check_names = list(check_names or self.checks)
+        self.caches = {}
+        self.results = {}
+        pages = {}
+        for name in self.check_names:
+            check = self.checks[name]
+            path = check["cache_path"](annotation_folder, original_folder)
+            cache = analysis_cache.load_results(path, check["version"])
+            self.caches[name] = (path, cache)
+            self.results[name], pending = analysis_cache.split_cached(pairs, cache)
+            for original_path, translated_path, filename, stats in pending:
+                pages.setdefault(filename, (original_path, translated_path, filename, stats, []))[4].append(name)
+        self.pending = list(pages.values())
+        self.outstanding = sum(len(page[4]) for page in self.pending)
+        self.dirty = set()
+
+    def batches(self, batch_size):
+        for i in range(0, len(self.pending), batch_size):
+            yield self.pending[i:i + batch_size]
+
+    def record(self, filename, stats, results):
+        for name, result in results.items():
+            self.results[name][filename] = result
+            self.caches[name][1]["pages"][filename] = {"stats": stats, "result": result}
+            self.dirty.add(name)
+
+    def save_caches(self):
+        for name in self.dirty:
+            path, cache = self.caches[name]
+            analysis_cache.save_results(path, cache)
+        self.dirty.clear()
+
+
+def check_dependencies(check_names):
+    """在主进程中检查依赖，缺少时抛出 ImportError，而不是每个工作进程各失败一次
+
+    CHECK 中可选的 "requires" 为 [(可以互相替代的模块, ...)]，例如 [("cv2", "scipy")]。
+    """
+    import numpy  # noqa: F401
+    import PIL.Image  # noqa: F401
+
+    checks = load_checks()
+    for name in check_names:
+        for group in checks[name].get("requires", ()):
+            if not any(importlib.util.find_spec(module) is not None for module in group):
+                raise ImportError(f"检查 {name} 需要 {' 或 '.join(group)}")
+
+
+def run_checks(pairs, annotation_folder, original_folder, check_names=None, workers=None, progress=None,
+               on_result=None, cancelled=None, batch_size=2):
+    """对章节运行检查，只分析缓存失效的页面，返回 {检查名: {文件名: 结果}}
+
+    progress(已完成项数, 总项数) 在每批完成后调用，一项是一页的一项检查。
+    on_result(检查名, 文件名, 结果) 在每页得到结果（包括缓存命中）时调用。
+    cancelled() 返回True时不再等待尚未开始的任务。
+    """
+    job = ChapterJob(pairs, annotation_folder, original_folder, check_names)
+    if on_result:
+        for name, results in job.results.items():
+            for filename, result in results.items():
+                on_result(name, filename, result)
+
+    total = len(pairs) * len(job.check_names)
+    done = total - job.outstanding
+    if progress:
+        progress(done, total)
+    if not job.pending:
+        return job.results
+
+    check_dependencies(job.check_names)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(analyze_pages, batch, annotation_folder, original_folder, CHECK_MODULES)
+                       for batch in job.batches(batch_size)]
+            for future in as_completed(futures):
+                try:
+                    outcomes = future.result()
+                except Exception as e:
+                    print(f"检查失败: {e}")
+                    continue
+                for filename, stats, results, errors in outcomes:
+                    job.record(filename, stats, results)
+                    done += len(results) + len(errors)
+                    for name, error in errors.items():
+                        print(f"{name} 检查失败: {filename}: {error}")
+                    if on_result:
+                        for name, result in results.items():
+                            on_result(name, filename, result)
+                if progress:
+                    progress(done, total)
+                if cancelled and cancelled():
+                    for pending_future in futures:
+                        pending_future.cancel()
+                    break
+    finally:
+        job.save_caches()
+    return job.results
@@ -0,0 +1,230 @@
+"""系列范围的近似重复页面索引
+
+卷中经常有重复的页面（制作人员页、前情提要、相同的章节封面）。
+每页原图计算 64 位差值哈希 (dHash)，按 4 段 16 位分桶建立多重索引:
+汉明距离不超过 3 的两个哈希至少有一段完全相同，所以查询只需要检查
+4 个桶中的候选，不需要遍历所有页面。
+
+翻译图另外保存一个 16x16 的灰度缩略图，只有原图近似且翻译图也几乎相同时，
+才把一页的标注沿用到它的重复页。缩略图的精度不足以发现改动很小的单个字，
+所以审核结果只在翻译图的内容哈希（review_ledger 计算的 digest）完全相同时才沿用；
+内容不同的页面只沿用标注，并标记为需要抽查。
+标注只沿用一次（记录在接收标注的页面上），审核人员删除沿用的标注后不会再次出现。
+
+索引保存在标注文件夹中（同一系列的所有章节共用一个标注文件夹）。
+"""
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import image_decoders
+from session_store import file_stat
+
+INDEX_VERSION = 1
+INDEX_NAME = "页面指纹索引.json"
+
+HASH_BITS = 64
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+ORIGINAL_DISTANCE = 3  # 原图哈希的最大汉明距离，必须小于 BANDS
+TRANSLATED_DISTANCE = 2  # 翻译图哈希的最大汉明距离
+THUMB_SIZE = 16
+THUMB_TOLERANCE = 3  # 翻译图缩略图每个格子允许的最大灰度差
+
+HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+def index_path(annotation_folder):
+    return os.path.join(annotation_folder, INDEX_NAME)
+
+
+def page_key(chapter, filename):
+    return f"{chapter}/{filename}"
+
+
+def image_signature(path, thumb=False):
+    """返回 (dHash, 缩略图)，缩略图为十六进制字符串，thumb 为False时为None"""
+    from PIL import Image
+
+    # 缩小解码（例如 JPEG 在 DCT 阶段直接缩小）比全分辨率解码快很多
+    gray = image_decoders.to_pil(image_decoders.decode(path, "scaled", THUMB_SIZE * 8)).convert("L")
+    pixels = list(gray.resize((9, 8), Image.BILINEAR).getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    small = gray.resize((THUMB_SIZE, THUMB_SIZE), Image.BOX).tobytes().hex() if thumb else None
+    return value, small
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def thumbs_match(a, b):
+    if a is None or b is None:
+        return False
+    return max(abs(x - y) for x, y in zip(bytes.fromhex(a), bytes.fromhex(b))) <= THUMB_TOLERANCE
+
+
+class DuplicateIndex:
+    """页面指纹的多重哈希索引
+
+    pages: 页面键 -> {"original", "translated", "thumb", "stats", "approved", "annotations", "digest",
+                      "annotations_from"}，
+    哈希以整数保存在内存中，写入 JSON 时转为十六进制。
+    """
+
+    def __init__(self):
+        self.pages = {}
+        self.bands = [{} for _ in range(BANDS)]
+
+    @staticmethod
+    def band_values(value):
+        mask = (1 << BAND_BITS) - 1
+        return [(value >> (i * BAND_BITS)) & mask for i in range(BANDS)]
+
+    def add(self, key, entry):
+        self.remove(key)
+        self.pages[key] = entry
+        for band, value in zip(self.bands, self.band_values(entry["original"])):
+            band.setdefault(value, set()).add(key)
+
+    def remove(self, key):
+        entry = self.pages.pop(key, None)
+        if entry is None:
+            return
+        for band, value in zip(self.bands, self.band_values(entry["original"])):
+            bucket = band.get(value)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del band[value]
+
+    def near(self, value, max_distance=ORIGINAL_DISTANCE):
+        """返回原图哈希与 value 距离不超过 max_distance 的 [(距离, 页面键)]，按距离排序"""
+        candidates = set()
+        for band, band_value in zip(self.bands, self.band_values(value)):
+            candidates |= band.get(band_value, set())
+        matches = []
+        for key in candidates:
+            distance = hamming(value, self.pages[key]["original"])
+            if distance <= max_distance:
+                matches.append((distance, key))
+        matches.sort()
+        return matches
+
+    def duplicates(self, key):
+        """返回与某页原图近似重复的其他页面键"""
+        entry = self.pages.get(key)
+        if entry is None:
+            return []
+        return [other for _, other in self.near(entry["original"]) if other != key]
+
+    def translated_match(self, a, b):
+        """两页的翻译图是否也几乎相同"""
+        a, b = self.pages[a], self.pages[b]
+        return (hamming(a["translated"], b["translated"]) <= TRANSLATED_DISTANCE
+                and thumbs_match(a["thumb"], b["thumb"]))
+
+    def update_chapter(self, chapter, pairs):
+        """为章节中新增或有变化的页面计算指纹，删除已不存在的页面，返回重新计算的页数"""
+        prefix = f"{chapter}/"
+        current = {page_key(chapter, filename) for _, _, filename in pairs}
+        for key in [k for k in self.pages if k.startswith(prefix) and k not in current]:
+            self.remove(key)
+
+        def work(pair):
+            original_path, translated_path, filename = pair
+            key = page_key(chapter, filename)
+            try:
+                stats = [file_stat(original_path), file_stat(translated_path)]
+                entry = self.pages.get(key)
+                if entry and entry["stats"] == stats:
+                    return None
+                original, _ = image_signature(original_path)
+                translated, thumb = image_signature(translated_path, thumb=True)
+            except OSError:
+                return None
+            previous = entry or {}
+            # 翻译图变化后记录的内容哈希失效
+            digest = previous.get("digest") if previous.get("stats", [None, None])[1] == stats[1] else None
+            return key, {"original": original, "translated": translated, "thumb": thumb, "stats": stats,
+                         "approved": previous.get("approved", False),
+                         "annotations": previous.get("annotations"), "digest": digest,
+                         "annotations_from": previous.get("annotations_from")}
+
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+            updated = [item for item in executor.map(work, pairs) if item is not None]
+        for key, entry in updated:
+            self.add(key, entry)
+        return len(updated)
+
+    def record_review(self, chapter, filename, approved, annotations, digest=None):
+        """记录一页的审核结果、标注和翻译图的内容哈希，供重复页沿用"""
+        entry = self.pages.get(page_key(chapter, filename))
+        if entry is not None:
+            entry["approved"] = bool(approved)
+            entry["annotations"] = annotations or None
+            if digest is not None:
+                entry["digest"] = digest
+
+    def annotations_carried(self, chapter, filename):
+        """这一页是否已经沿用过重复页的标注"""
+        entry = self.pages.get(page_key(chapter, filename))
+        return bool(entry and entry.get("annotations_from"))
+
+    def mark_annotations_carried(self, chapter, filename, source_key):
+        """记录这一页已经沿用了 source_key 的标注，以后不再沿用"""
+        entry = self.pages.get(page_key(chapter, filename))
+        if entry is not None:
+            entry["annotations_from"] = source_key
+
+    def carry_over_source(self, chapter, filename):
+        """为一页找到可以沿用审核结果或标注的重复页，返回页面键，没有时返回None
+
+        优先选择已通过审核的、原图距离最近的页面。
+        """
+        key = page_key(chapter, filename)
+        entry = self.pages.get(key)
+        if entry is None:
+            return None
+        best = None
+        for distance, other in self.near(entry["original"]):
+            if other == key:
+                continue
+            source = self.pages[other]
+            if not (source["approved"] or source["annotations"]) or not self.translated_match(key, other):
+                continue
+            rank = (not source["approved"], distance)
+            if best is None or rank < best[0]:
+                best = (rank, other)
+        return best[1] if best else None
+
+
+def load_index(path):
+    """读取索引，不存在、损坏或版本不同时返回空索引"""
+    index = DuplicateIndex()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return index
+    if data.get("version") != INDEX_VERSION:
+        return index
+    for key, entry in data.get("pages", {}).items():
+        entry["original"] = int(entry["original"], 16)
+        entry["translated"] = int(entry["translated"], 16)
+        index.add(key, entry)
+    return index
+
+
+def save_index(path, index):
+    """原子地写入索引"""
+    pages = {key: dict(entry, original=f"{entry['original']:016x}", translated=f"{entry['translated']:016x}")
+             for key, entry in index.pages.items()}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"version": INDEX_VERSION, "pages": pages}, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
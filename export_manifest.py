@@ -0,0 +1,96 @@
+import os
+import json
+import hashlib
+
+# 导出清单文件名，保存在导出文件夹根目录
+MANIFEST_NAME = "export_manifest.json"
+MANIFEST_VERSION = 1
+
+# 流式读取文件时的块大小
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path, previous=None):
+    """计算源文件内容的哈希
+
+    如果上一次清单中记录的大小和修改时间与当前一致，直接复用旧的哈希，
+    避免在修订轮次中重复读取没有变化的文件。
+    返回 {"size", "mtime", "digest"} 字典。
+    """
+    stat = os.stat(path)
+    if (previous and previous.get("size") == stat.st_size
+            and previous.get("mtime") == stat.st_mtime_ns):
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "digest": previous["digest"]}
+
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "digest": hasher.hexdigest()}
+
+
+def annotation_digest(annotations):
+    """计算标注数据的哈希，annotations 为 {视图名: [(x, y, w, h, 文本), ...]}"""
+    payload = json.dumps(annotations, ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def load_manifest(export_folder):
+    """读取导出文件夹中的清单，不存在或损坏时返回空清单"""
+    path = os.path.join(export_folder, MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"version": MANIFEST_VERSION, "pairs": {}}
+
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "pairs": {}}
+    manifest.setdefault("pairs", {})
+    return manifest
+
+
+def save_manifest(export_folder, manifest):
+    """原子地写入清单，避免中途中断留下半个文件"""
+    path = os.path.join(export_folder, MANIFEST_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def build_entry(original_path, translated_path, annotations, status, outputs, previous=None):
+    """为一个图像对构建清单条目"""
+    previous = previous or {}
+    return {
+        "original": file_digest(original_path, previous.get("original")),
+        "translated": file_digest(translated_path, previous.get("translated")),
+        "annotations": annotation_digest(annotations),
+        "status": status,
+        "outputs": sorted(outputs),
+    }
+
+
+def entry_unchanged(entry, previous, export_folder):
+    """判断条目与上一次导出是否一致且输出文件仍然存在"""
+    if not previous:
+        return False
+    for key in ("annotations", "status", "outputs"):
+        if entry[key] != previous.get(key):
+            return False
+    for key in ("original", "translated"):
+        if entry[key]["digest"] != previous.get(key, {}).get("digest"):
+            return False
+    return all(os.path.exists(os.path.join(export_folder, rel)) for rel in entry["outputs"])
+
+
+def stale_outputs(previous_manifest, new_manifest):
+    """找出上一次导出中存在、但本次不再需要的输出文件（相对路径）"""
+    keep = set()
+    for entry in new_manifest["pairs"].values():
+        keep.update(entry["outputs"])
+
+    stale = set()
+    for entry in previous_manifest["pairs"].values():
+        stale.update(rel for rel in entry.get("outputs", []) if rel not in keep)
+    return sorted(stale)
@@ -1,19 +1,110 @@
 import sys
 import os
+import threading
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QHBoxLayout, 
                             QVBoxLayout, QPushButton, QFileDialog, QLabel, 
                             QSplitter, QGraphicsView, QGraphicsScene,
                             QGraphicsRectItem, QInputDialog, QToolBar, 
                             QAction, QMessageBox, QCheckBox, QListWidget,
-                            QComboBox, QGroupBox, QShortcut)
+                            QComboBox, QGroupBox, QShortcut, QToolTip, QMenu,
+                            QGraphicsItem, QSlider, QDialog, QTreeWidget, QTreeWidgetItem, QLineEdit)
 from PyQt5.QtGui import QPixmap, QPainter, QPen, QColor, QImage, QTransform, QKeySequence
-from PyQt5.QtCore import Qt, QRectF, QPointF, QSizeF, pyqtSignal, QObject, QDateTime
+from PyQt5.QtCore import (Qt, QRect, QRectF, QPointF, QSize, QSizeF, QPoint, QEvent, pyqtSignal, QObject,
+                          QDateTime, QTimer)
+
+from export_manifest import (MANIFEST_VERSION, load_manifest, save_manifest,
+                             build_entry, entry_unchanged, stale_outputs)
+import review_ledger
+import session_store
+from annotation_index import AnnotationIndex
+from review_history import ReviewHistory
+import leak_detector
+import quality_check
+import overflow_check
+import residue_check
+import triage
+import analysis_cache
+import check_scheduler
+import duplicate_index
+import library_index
+import annotation_search
+import review_client
+import share_cache
+import pixel_cache
+import image_decoders
+from image_pairing import pair_images, default_annotation_folder
+
+
+def load_image(path):
+    """解码图像为 QImage（后端由 image_decoders 按格式选择）
+
+    其他进程或上次运行已经解码过的页面直接映射 pixel_cache 中的像素。
+    """
+    cached = pixel_cache.get(path, "qt")
+    if cached is not None:
+        width, height, stride, fmt, pixels = cached
+        image = QImage(pixels, width, height, stride, QImage.Format(fmt))
+        if not image.isNull():
+            # QImage 不拥有映射的内存，由包装对象保持映射有效
+            image.pixels = pixels
+            return image
+    try:
+        image = image_decoders.to_qimage(image_decoders.decode(path, "full"))
+    except image_decoders.DecodeError as e:
+        print(e)
+        return QImage()
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    pixel_cache.put(path, "qt", image.width(), image.height(), image.bytesPerLine(), int(image.format()), bits)
+    return image
+
+
+def render_annotated_image(image_path, annotations):
+    """离屏渲染带标注的图像，不需要切换当前显示的图像对
+
+    annotations 为 [(x, y, w, h, 文本), ...]，绘制效果与视图中的标注一致。
+    """
+    pixmap = QPixmap.fromImage(load_image(image_path))
+    if pixmap.isNull():
+        return None
+
+    scene = QGraphicsScene()
+    scene.addPixmap(pixmap)
+    scene.setSceneRect(0, 0, pixmap.width(), pixmap.height())
+    for x, y, w, h, text in annotations:
+        rect_item = scene.addRect(QRectF(x, y, w, h), QPen(Qt.red, 2))
+        text_item = scene.addText(text)
+        text_item.setPos(rect_item.rect().topLeft())
+        text_item.setDefaultTextColor(Qt.red)
+
+    image = QImage(pixmap.size(), QImage.Format_ARGB32)
+    image.fill(Qt.white)
+    painter = QPainter(image)
+    painter.setRenderHint(QPainter.Antialiasing, True)
+    painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+    scene.render(painter)
+    painter.end()
+    return image
+
 
 class SyncedGraphicsView(QGraphicsView):
     """同步的图形视图，可与其他视图同步操作"""
     transformChanged = pyqtSignal(QTransform)
     scrollBarChanged = pyqtSignal(str, int)  # 方向, 值
     annotationAdded = pyqtSignal(str)  # 标注添加信号
+    # 标注增删改信号，参数为说明和变化列表 [(序号, 旧数据, 新数据), ...]
+    annotationChanged = pyqtSignal(str, list)
+    suggestionAccepted = pyqtSignal(dict)  # 自动检测的建议被采纳为标注
+    suggestionDismissed = pyqtSignal(dict)  # 自动检测的建议被忽略
+    cursorMoved = pyqtSignal(QPointF, QPoint)  # 鼠标移动: (场景坐标, 全局坐标)
+    cursorLeft = pyqtSignal()  # 鼠标离开视图
+    
+    # 标注的画笔：普通和选中
+    ANNOTATION_PEN = QPen(Qt.red, 2)
+    SELECTED_PEN = QPen(QColor(0, 120, 255), 2, Qt.DashLine)
+    SUGGESTION_PEN = QPen(QColor(255, 140, 0), 2, Qt.DashDotLine)
+    # 右下角缩放手柄的命中范围（视图像素）
+    HANDLE_SIZE = 8
     
     def __init__(self, scene, parent=None):
         super().__init__(scene, parent)
@@ -42,6 +133,14 @@ class SyncedGraphicsView(QGraphicsView):
         self.annotation_start = None
         self.current_annotation = None
         self.annotations = []  # 保存(矩形, 文本项)元组
+        self.annotation_texts = {}  # 矩形图元 -> 文本项
+        self.annotation_index = AnnotationIndex()  # 当前页标注的空间索引
+        self.selected_annotations = set()  # 选中的矩形图元
+        self.edit_action = None  # 正在进行的编辑: "move", "resize", "select"
+        self.edit_origin = None  # 编辑开始时的场景坐标
+        self.edit_start_rects = {}  # 编辑开始时各矩形的位置
+        self.selection_rect = None  # 区域选择时显示的虚线框
+        self.suggestions = []  # 自动检测的建议标注 [(矩形图元, 文本项, 数据)]
         
         # 启用水平和垂直滚动条
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
@@ -96,12 +195,13 @@ class SyncedGraphicsView(QGraphicsView):
         self.setTransform(transform)
         self.is_syncing = False
         
-    def syncScrollBar(self, orientation, value):
-        """同步滚动条位置"""
+    def syncScrollBar(self, orientation, value, source_max=None):
+        """同步滚动条位置，source_max 为来源视图的滚动条最大值（默认取信号发送者的）"""
         self.is_syncing = True
         if orientation == "horizontal":
             # 获取目标百分比位置
-            source_max = self.sender().horizontalScrollBar().maximum()
+            if source_max is None:
+                source_max = self.sender().horizontalScrollBar().maximum()
             if source_max > 0:  # 避免除以零
                 percent = value / source_max
                 # 应用到当前视图的滚动条
@@ -110,7 +210,8 @@ class SyncedGraphicsView(QGraphicsView):
                 self.horizontalScrollBar().setValue(new_value)
         else:  # vertical
             # 获取目标百分比位置
-            source_max = self.sender().verticalScrollBar().maximum()
+            if source_max is None:
+                source_max = self.sender().verticalScrollBar().maximum()
             if source_max > 0:  # 避免除以零
                 percent = value / source_max
                 # 应用到当前视图的滚动条
@@ -148,26 +249,74 @@ class SyncedGraphicsView(QGraphicsView):
             # 滚动条的值变化已经通过专门的信号处理
             pass
     
+    def annotation_at(self, view_pos):
+        """返回视图坐标处最上层的标注矩形图元，没有时返回None"""
+        pos = self.mapToScene(view_pos)
+        margin = self.HANDLE_SIZE / max(self.current_scale, 1e-6)
+        hits = self.annotation_index.query_point(pos.x(), pos.y(), margin)
+        return hits[0] if hits else None
+    
+    def on_resize_handle(self, rect_item, view_pos):
+        """判断视图坐标是否落在标注右下角的缩放手柄上"""
+        corner = self.mapFromScene(rect_item.rect().bottomRight())
+        return (abs(corner.x() - view_pos.x()) <= self.HANDLE_SIZE
+                and abs(corner.y() - view_pos.y()) <= self.HANDLE_SIZE)
+    
     def mousePressEvent(self, event):
         """处理鼠标按下事件用于标注"""
         if self.annotation_mode and event.button() == Qt.LeftButton:
             pos = self.mapToScene(event.pos())
-            self.annotation_start = pos
-            self.current_annotation = QGraphicsRectItem(QRectF(pos, QSizeF(1, 1)))
-            self.current_annotation.setPen(QPen(Qt.red, 2))
-            self.scene().addItem(self.current_annotation)
+            hit = self.annotation_at(event.pos())
+            
+            if event.modifiers() & Qt.ShiftModifier:
+                # Shift+拖动：区域选择
+                self.edit_action = "select"
+                self.edit_origin = pos
+                self.selection_rect = self.scene().addRect(QRectF(pos, QSizeF(1, 1)), QPen(QColor(0, 120, 255), 1, Qt.DotLine))
+                self.selection_rect.setZValue(100)
+            elif hit is not None:
+                # 点击已有标注：选中后移动，或拖动右下角缩放
+                if hit not in self.selected_annotations:
+                    self.set_selection([hit])
+                self.edit_action = "resize" if self.on_resize_handle(hit, event.pos()) else "move"
+                self.edit_origin = pos
+                self.edit_start_rects = {item: QRectF(item.rect()) for item in self.selected_annotations}
+            else:
+                self.set_selection([])
+                self.annotation_start = pos
+                self.current_annotation = QGraphicsRectItem(QRectF(pos, QSizeF(1, 1)))
+                self.current_annotation.setPen(self.ANNOTATION_PEN)
+                self.scene().addItem(self.current_annotation)
         else:
             super().mousePressEvent(event)
     
     def mouseMoveEvent(self, event):
         """处理鼠标移动事件用于标注"""
+        self.cursorMoved.emit(self.mapToScene(event.pos()), event.globalPos())
         if self.annotation_mode and self.annotation_start and self.current_annotation:
             pos = self.mapToScene(event.pos())
             rect = QRectF(self.annotation_start, pos).normalized()
             self.current_annotation.setRect(rect)
+        elif self.edit_action == "select":
+            pos = self.mapToScene(event.pos())
+            self.selection_rect.setRect(QRectF(self.edit_origin, pos).normalized())
+        elif self.edit_action in ("move", "resize"):
+            delta = self.mapToScene(event.pos()) - self.edit_origin
+            for item, start in self.edit_start_rects.items():
+                if self.edit_action == "move":
+                    rect = start.translated(delta)
+                else:
+                    rect = QRectF(start.topLeft(), start.bottomRight() + delta).normalized()
+                self.set_annotation_rect(item, rect, reindex=False)
         else:
+            self.update_hover(event.pos())
             super().mouseMoveEvent(event)
     
+    def viewportEvent(self, event):
+        if event.type() == QEvent.Leave:
+            self.cursorLeft.emit()
+        return super().viewportEvent(event)
+    
     def mouseReleaseEvent(self, event):
         """处理鼠标释放事件用于标注"""
         if self.annotation_mode and event.button() == Qt.LeftButton and self.current_annotation:
@@ -179,12 +328,15 @@ class SyncedGraphicsView(QGraphicsView):
                 # 添加标注文本
                 text, ok = QInputDialog.getText(self, "标注", "输入标注文本:")
                 if ok and text:
+                    self.current_annotation.setRect(rect)
                     text_item = self.scene().addText(text)
                     text_item.setPos(rect.topLeft())
                     text_item.setDefaultTextColor(Qt.red)
-                    self.annotations.append((self.current_annotation, text_item))
+                    self.register_annotation(self.current_annotation, text_item)
                     
                     # 发出标注添加信号
+                    index = len(self.annotations) - 1
+                    self.annotationChanged.emit("添加标注", [(index, None, self.annotation_entry(index))])
                     self.annotationAdded.emit(text)
                 else:
                     self.scene().removeItem(self.current_annotation)
@@ -193,20 +345,216 @@ class SyncedGraphicsView(QGraphicsView):
                 
             self.current_annotation = None
             self.annotation_start = None
+        elif self.edit_action == "select" and event.button() == Qt.LeftButton:
+            area = self.selection_rect.rect()
+            self.scene().removeItem(self.selection_rect)
+            self.selection_rect = None
+            self.edit_action = None
+            self.set_selection(self.annotation_index.query_rect(
+                (area.x(), area.y(), area.width(), area.height()), contained=True))
+        elif self.edit_action in ("move", "resize") and event.button() == Qt.LeftButton:
+            changes = []
+            for item, start in self.edit_start_rects.items():
+                self.annotation_index.update(item, self.rect_tuple(item.rect()))
+                self.update_z_order(item)
+                if item.rect() != start:
+                    index = self.index_of(item)
+                    text = self.annotation_texts[item].toPlainText()
+                    changes.append((index, self.rect_tuple(start) + (text,), self.annotation_entry(index)))
+            action = self.edit_action
+            self.edit_action = None
+            self.edit_start_rects = {}
+            if changes:
+                self.annotationChanged.emit("移动标注" if action == "move" else "调整标注大小", changes)
         else:
             super().mouseReleaseEvent(event)
     
+    def mouseDoubleClickEvent(self, event):
+        """双击标注修改文本"""
+        hit = self.annotation_at(event.pos()) if self.annotation_mode else None
+        if hit is None:
+            super().mouseDoubleClickEvent(event)
+            return
+            
+        text_item = self.annotation_texts[hit]
+        text, ok = QInputDialog.getText(self, "标注", "修改标注文本:", text=text_item.toPlainText())
+        if ok and text and text != text_item.toPlainText():
+            index = self.index_of(hit)
+            old = self.annotation_entry(index)
+            text_item.setPlainText(text)
+            self.annotationChanged.emit("修改标注文本", [(index, old, self.annotation_entry(index))])
+    
+    def keyPressEvent(self, event):
+        """Delete/Backspace 删除选中的标注"""
+        if event.key() in (Qt.Key_Delete, Qt.Key_Backspace) and self.selected_annotations:
+            self.delete_selected_annotations()
+        else:
+            super().keyPressEvent(event)
+    
+    def update_hover(self, view_pos):
+        """鼠标悬停在标注上时显示文本提示并切换光标"""
+        hit = self.annotation_at(view_pos)
+        if hit is None:
+            if self.annotation_mode:
+                self.viewport().setCursor(Qt.CrossCursor)
+            QToolTip.hideText()
+            return
+            
+        if self.annotation_mode:
+            self.viewport().setCursor(Qt.SizeFDiagCursor if self.on_resize_handle(hit, view_pos)
+                                      else Qt.SizeAllCursor)
+        QToolTip.showText(self.viewport().mapToGlobal(view_pos),
+                          self.annotation_texts[hit].toPlainText(), self.viewport())
+    
+    def set_selection(self, items):
+        """设置选中的标注，并更新画笔和层级"""
+        previous = self.selected_annotations
+        self.selected_annotations = set(items)
+        for item in previous | self.selected_annotations:
+            item.setPen(self.SELECTED_PEN if item in self.selected_annotations else self.ANNOTATION_PEN)
+            self.update_z_order(item)
+    
+    def delete_selected_annotations(self):
+        """删除所有选中的标注"""
+        # 从后往前删除，记录的序号在撤销时可以按相反顺序插回
+        indexes = sorted((self.index_of(item) for item in self.selected_annotations), reverse=True)
+        changes = []
+        for index in indexes:
+            changes.append((index, self.annotation_entry(index), None))
+            self.remove_annotation(self.annotations[index][0])
+        self.selected_annotations = set()
+        self.viewport().update()
+        self.annotationChanged.emit(f"删除 {len(changes)} 个标注", changes)
+    
+    def index_of(self, rect_item):
+        """返回标注在列表中的序号"""
+        return self.annotations.index((rect_item, self.annotation_texts[rect_item]))
+    
+    def annotation_entry(self, index):
+        """返回序号处标注的数据 (x, y, w, h, 文本)"""
+        rect_item, text_item = self.annotations[index]
+        return self.rect_tuple(rect_item.rect()) + (text_item.toPlainText(),)
+    
+    @staticmethod
+    def rect_tuple(rect):
+        return (rect.x(), rect.y(), rect.width(), rect.height())
+    
+    def update_z_order(self, rect_item):
+        """小的标注放在上层，重叠时仍然可以点中；选中的标注在最上层"""
+        rect = rect_item.rect()
+        z = 1.0 + 1.0 / (1.0 + rect.width() * rect.height())
+        if rect_item in self.selected_annotations:
+            z += 10.0
+        rect_item.setZValue(z)
+        self.annotation_texts[rect_item].setZValue(z)
+    
+    def set_annotation_rect(self, rect_item, rect, reindex=True):
+        """移动或缩放标注，文本跟随矩形左上角"""
+        rect_item.setRect(rect)
+        self.annotation_texts[rect_item].setPos(rect.topLeft())
+        if reindex:
+            self.annotation_index.update(rect_item, self.rect_tuple(rect))
+            self.update_z_order(rect_item)
+    
+    def register_annotation(self, rect_item, text_item):
+        """把已加入场景的标注登记到列表和空间索引中"""
+        self.annotations.append((rect_item, text_item))
+        self.annotation_texts[rect_item] = text_item
+        self.annotation_index.insert(rect_item, self.rect_tuple(rect_item.rect()))
+        self.update_z_order(rect_item)
+    
+    def remove_annotation(self, rect_item):
+        """从场景、列表和空间索引中移除一个标注"""
+        text_item = self.annotation_texts.pop(rect_item)
+        self.annotations.remove((rect_item, text_item))
+        self.annotation_index.remove(rect_item)
+        self.selected_annotations.discard(rect_item)
+        for item in (rect_item, text_item):
+            if item.scene() is self.scene():
+                self.scene().removeItem(item)
+    
+    def remove_all_annotations(self):
+        """从场景中删除本页的全部标注和建议"""
+        for rect_item, text_item in self.annotations:
+            for item in (rect_item, text_item):
+                if item.scene() is self.scene():
+                    self.scene().removeItem(item)
+        self.clear_suggestions()
+        self.clear_annotations()
+    
+    def add_suggestion(self, data):
+        """显示一个自动检测的建议标注，data 包含 rect、text、confidence"""
+        rect = QRectF(*data["rect"])
+        rect_item = self.scene().addRect(rect, self.SUGGESTION_PEN)
+        text_item = self.scene().addText(f"{data['text']} ({data['confidence']:.0%})")
+        text_item.setPos(rect.topLeft())
+        text_item.setDefaultTextColor(QColor(255, 140, 0))
+        # 建议放在正式标注下面
+        rect_item.setZValue(0.5)
+        text_item.setZValue(0.5)
+        self.suggestions.append((rect_item, text_item, data))
+    
+    def remove_suggestion(self, data):
+        """移除一个建议标注"""
+        for entry in self.suggestions:
+            if entry[2] is data:
+                for item in entry[:2]:
+                    if item.scene() is self.scene():
+                        self.scene().removeItem(item)
+                self.suggestions.remove(entry)
+                return
+    
+    def clear_suggestions(self):
+        """从场景中移除所有建议标注"""
+        for rect_item, text_item, _ in self.suggestions:
+            for item in (rect_item, text_item):
+                if item.scene() is self.scene():
+                    self.scene().removeItem(item)
+        self.suggestions = []
+    
+    def suggestion_at(self, view_pos):
+        """返回视图坐标处面积最小的建议，没有时返回None"""
+        pos = self.mapToScene(view_pos)
+        hits = [data for rect_item, _, data in self.suggestions if rect_item.rect().contains(pos)]
+        if not hits:
+            return None
+        return min(hits, key=lambda d: d["rect"][2] * d["rect"][3])
+    
+    def contextMenuEvent(self, event):
+        """右键点击建议标注：采纳或忽略"""
+        data = self.suggestion_at(event.pos())
+        if data is None:
+            super().contextMenuEvent(event)
+            return
+            
+        menu = QMenu(self)
+        accept_action = menu.addAction("采纳为标注")
+        dismiss_action = menu.addAction("忽略此建议")
+        chosen = menu.exec_(event.globalPos())
+        if chosen is accept_action:
+            self.suggestionAccepted.emit(data)
+        elif chosen is dismiss_action:
+            self.suggestionDismissed.emit(data)
+    
+    def clear_annotations(self):
+        """切换页面时清空标注记录（场景中的图元由scene.clear()删除）"""
+        self.suggestions = []
+        self.annotations = []
+        self.annotation_texts = {}
+        self.annotation_index.clear()
+        self.selected_annotations = set()
+        self.edit_action = None
+        self.edit_start_rects = {}
+        self.selection_rect = None
+        self.current_annotation = None
+        self.annotation_start = None
+    
     def undo_last_annotation(self):
         """撤销最后一个添加的标注"""
         if self.annotations:
-            # 获取最后添加的标注
-            rect_item, text_item = self.annotations.pop()
-            
-            # 从场景中移除
-            if rect_item in self.scene().items():
-                self.scene().removeItem(rect_item)
-            if text_item in self.scene().items():
-                self.scene().removeItem(text_item)
+            # 获取最后添加的标注并从场景中移除
+            rect_item, _ = self.annotations[-1]
+            self.remove_annotation(rect_item)
                 
             # 更新视图
             self.viewport().update()
@@ -214,10 +562,842 @@ class SyncedGraphicsView(QGraphicsView):
             return True  # 返回True表示成功撤销了一个标注
         
         return False  # 返回False表示没有标注可撤销
+    
+    def add_annotation(self, rect, text):
+        """根据保存的数据在场景中重建一个标注"""
+        rect_item = QGraphicsRectItem(rect)
+        rect_item.setPen(self.ANNOTATION_PEN)
+        self.scene().addItem(rect_item)
+        text_item = self.scene().addText(text)
+        text_item.setPos(rect.topLeft())
+        text_item.setDefaultTextColor(Qt.red)
+        self.register_annotation(rect_item, text_item)
+        return rect_item, text_item
+    
+    def annotation_data(self):
+        """返回可保存的标注数据列表 [(x, y, w, h, 文本), ...]"""
+        return [self.annotation_entry(index) for index in range(len(self.annotations))]
+
+
+class ViewStateModel(QObject):
+    """多个视图共享的缩放和滚动位置
+
+    每个视图只和模型连接（N 个视图 N 组连接，而不是两两互连）。视图的变化先记在模型里，
+    每帧最多向其他视图广播一次：连续滚轮或拖动产生的多次变化合并为一次更新，
+    先应用变换再按比例应用滚动位置。
+    """
+    stateChanged = pyqtSignal()  # 每次广播后发出，供放大镜等跟随视图的部件使用
+    FRAME_MS = 16
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.views = []
+        self.source = None  # 最近一次变化的来源视图，广播时跳过
+        self.transform = None
+        self.scroll = {}  # 方向 -> (值, 来源滚动条最大值)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(self.FRAME_MS)
+        self.timer.timeout.connect(self.broadcast)
+    
+    def attach(self, view):
+        self.views.append(view)
+        view.transformChanged.connect(self.on_transform_changed)
+        view.scrollBarChanged.connect(self.on_scroll_changed)
+    
+    def detach(self, view):
+        if view in self.views:
+            self.views.remove(view)
+            view.transformChanged.disconnect(self.on_transform_changed)
+            view.scrollBarChanged.disconnect(self.on_scroll_changed)
+        if self.source is view:
+            self.source = None
+    
+    def on_transform_changed(self, transform):
+        self.set_source(self.sender())
+        self.transform = QTransform(transform)
+        if not self.timer.isActive():
+            self.timer.start()
+    
+    def on_scroll_changed(self, orientation, value):
+        view = self.sender()
+        self.set_source(view)
+        bar = view.horizontalScrollBar() if orientation == "horizontal" else view.verticalScrollBar()
+        self.scroll[orientation] = (value, bar.maximum())
+        if not self.timer.isActive():
+            self.timer.start()
+    
+    def set_source(self, view):
+        """换了操作的视图时，先把上一个视图的变化广播出去"""
+        if self.source is not None and self.source is not view and self.timer.isActive():
+            self.timer.stop()
+            self.broadcast()
+        self.source = view
+    
+    def broadcast(self):
+        transform, scroll = self.transform, self.scroll
+        self.transform, self.scroll = None, {}
+        for view in self.views:
+            if view is self.source:
+                continue
+            if transform is not None:
+                view.syncTransform(transform)
+            for orientation, (value, source_max) in scroll.items():
+                view.syncScrollBar(orientation, value, source_max)
+        self.stateChanged.emit()
+
+
+class DecodedImageCache:
+    """所有视图共用的解码图像缓存，在后台线程中预先解码相邻页面
+
+    缓存 QImage（可以在非界面线程中解码），显示时再转换为 QPixmap。
+    以路径、文件大小和修改时间为键，文件被修改后自动重新解码。
+    网络文件夹中的文件通过 share_cache 从本地副本解码，文件状态也来自缓存的目录清单；
+    解码结果同时写入跨进程的 pixel_cache，下次启动时直接映射。
+    总字节数超过上限时淘汰最久未使用的图像。
+    
+    另外保存每页的小缩略图（小地图等使用），已经解码的页面直接缩小，
+    没有解码的页面按缩小后的尺寸解码（image_decoders 的 "scaled" 操作），都不需要全分辨率渲染。
+    """
+    THUMB_SIZE = 256
+    THUMB_LIMIT = 512  # 最多保留的缩略图数量
+    
+    def __init__(self, max_bytes=768 * 1024 * 1024, workers=2):
+        from collections import OrderedDict
+        from concurrent.futures import ThreadPoolExecutor
+        
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()  # 键 -> QImage
+        self.thumbs = OrderedDict()  # 键 -> 缩略图 QImage
+        self.total_bytes = 0
+        self.pending = {}  # 键 -> 正在解码的 Future
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+    
+    @staticmethod
+    def key(path):
+        try:
+            size, mtime = share_cache.stat(path)
+        except OSError:
+            return None
+        return (path, size, mtime)
+    
+    def get(self, path):
+        """返回解码后的 QImage，没有缓存时在当前线程解码（正在预取时等待预取结果）"""
+        key = self.key(path)
+        if key is None:
+            return QImage()
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+                return image
+            future = self.pending.get(key)
+        if future is not None:
+            # 还在排队的预取直接取消，在当前线程解码，不等前面的任务
+            if not future.cancel():
+                return future.result()
+            with self.lock:
+                self.pending.pop(key, None)
+        return self.decode(key)
+    
+    def thumbnail(self, path):
+        """返回长边不超过 THUMB_SIZE 的缩略图，读取失败时返回空 QImage"""
+        key = self.key(path)
+        if key is None:
+            return QImage()
+        with self.lock:
+            thumb = self.thumbs.get(key)
+            if thumb is not None:
+                self.thumbs.move_to_end(key)
+                return thumb
+            image = self.images.get(key)
+        if image is not None:
+            thumb = image.scaled(self.THUMB_SIZE, self.THUMB_SIZE, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        else:
+            try:
+                thumb = image_decoders.to_qimage(image_decoders.decode(path, "scaled", self.THUMB_SIZE))
+            except image_decoders.DecodeError:
+                thumb = QImage()
+        if not thumb.isNull():
+            with self.lock:
+                self.thumbs[key] = thumb
+                while len(self.thumbs) > self.THUMB_LIMIT:
+                    self.thumbs.popitem(last=False)
+        return thumb
+    
+    def prefetch(self, paths):
+        """在后台解码尚未缓存的图像"""
+        for path in paths:
+            key = self.key(path)
+            if key is None:
+                continue
+            with self.lock:
+                if key in self.images or key in self.pending:
+                    continue
+                self.pending[key] = self.executor.submit(self.decode, key)
+    
+    def decode(self, key):
+        image = load_image(key[0])
+        with self.lock:
+            self.pending.pop(key, None)
+            if not image.isNull() and key not in self.images:
+                self.images[key] = image
+                self.total_bytes += image.sizeInBytes()
+                while self.total_bytes > self.max_bytes and len(self.images) > 1:
+                    _, old = self.images.popitem(last=False)
+                    self.total_bytes -= old.sizeInBytes()
+        return image
+    
+    def clear(self):
+        with self.lock:
+            self.images.clear()
+            self.thumbs.clear()
+            self.total_bytes = 0
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class TiledPage:
+    """审核服务器上一页图像的图块金字塔，连接服务器时代替 QPixmap 用于显示
+
+    提供与 QPixmap 相同的尺寸接口（第0级即原图尺寸）。绘制时按缩放比例选择级别，
+    只取出与绘制区域相交的图块；还没有下载的图块先用更粗的级别代替，
+    下载完成后由 RemoteTileCache 通知主窗口重绘。
+    """
+    
+    def __init__(self, tiles, filename, side, info):
+        self.tiles = tiles
+        self.filename = filename
+        self.side = side
+        self.tile_size = info["tile_size"]
+        self.levels = [tuple(size) for size in info["levels"]]
+        # 文件修改后图块目录不同，旧图块不会被误用
+        self.identity = (filename, side, tiles.client.tile_folder(filename, side))
+    
+    def width(self):
+        return self.levels[0][0]
+    
+    def height(self):
+        return self.levels[0][1]
+    
+    def size(self):
+        return QSize(self.width(), self.height())
+    
+    def rect(self):
+        return QRect(0, 0, self.width(), self.height())
+    
+    def isNull(self):
+        return False
+    
+    def level_for(self, lod):
+        """缩放比例为 lod（屏幕像素/图像像素）时使用的级别：分辨率不低于屏幕的最粗级别"""
+        level = 0
+        for index, (width, _) in enumerate(self.levels):
+            if width / self.width() >= lod:
+                level = index
+        return level
+    
+    def draw(self, painter, target, source, lod=1.0):
+        """把图像坐标中的 source 区域画到 target"""
+        if not source.isEmpty():
+            self.draw_level(painter, target, source, self.level_for(lod))
+    
+    def draw_level(self, painter, target, source, level):
+        width, height = self.levels[level]
+        sx, sy = width / self.width(), height / self.height()
+        scale_x, scale_y = target.width() / source.width(), target.height() / source.height()
+        size = self.tile_size
+        first_col = max(int(source.left() * sx), 0) // size
+        first_row = max(int(source.top() * sy), 0) // size
+        last_col = min(int(source.right() * sx), width - 1) // size
+        last_row = min(int(source.bottom() * sy), height - 1) // size
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                tile_rect = QRectF(col * size / sx, row * size / sy,
+                                   min(size, width - col * size) / sx, min(size, height - row * size) / sy)
+                part = tile_rect.intersected(source)
+                if part.isEmpty():
+                    continue
+                part_target = QRectF(target.left() + (part.left() - source.left()) * scale_x,
+                                     target.top() + (part.top() - source.top()) * scale_y,
+                                     part.width() * scale_x, part.height() * scale_y)
+                image = self.tiles.tile(self, level, col, row)
+                if image is not None:
+                    painter.drawImage(part_target, image,
+                                      QRectF(part.left() * sx - col * size, part.top() * sy - row * size,
+                                             part.width() * sx, part.height() * sy))
+                elif level + 1 < len(self.levels):
+                    self.draw_level(painter, part_target, part, level + 1)
+                else:
+                    painter.fillRect(part_target, QColor(128, 128, 128))
+    
+    def overview(self, size):
+        """最粗一级的整图（只有一个图块）缩小到长边不超过 size，在当前线程下载"""
+        image = self.tiles.load(self, len(self.levels) - 1, 0, 0)
+        if image.isNull():
+            return image
+        return image.scaled(size, size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+
+class RemoteTileCache:
+    """连接审核服务器时显示页面用的图块缓存
+    
+    图块在后台线程中取得（review_client 先查本地磁盘缓存，没有时从服务器下载）并解码为 QImage，
+    内存中总字节数超过上限时淘汰最久未使用的图块。图块下载完成后调用 on_loaded(文件名, 视图)，
+    由主窗口重绘；on_loaded 在后台线程中调用。
+    """
+    PREFETCH_TILES = 4  # 预取相邻页面时，图块数不超过这个数的级别全部取得
+    
+    def __init__(self, client, on_loaded, max_bytes=256 * 1024 * 1024, workers=4):
+        from collections import OrderedDict
+        from concurrent.futures import ThreadPoolExecutor
+        
+        self.client = client
+        self.on_loaded = on_loaded
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()  # 键 -> 图块 QImage
+        self.total_bytes = 0
+        self.pending = set()  # 正在下载的键
+        self.failed = set()  # 下载失败的键，不再重试，用粗略级别代替
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tiles")
+    
+    def page(self, filename, side):
+        """返回页面的 TiledPage，服务器不可用时返回None"""
+        try:
+            return TiledPage(self, filename, side, self.client.cached_page_info(filename, side))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"读取图块信息失败: {filename} {side}: {str(e)}")
+            return None
+    
+    def tile(self, page, level, col, row):
+        """返回已经解码的图块，还没有时在后台下载并返回None"""
+        key = page.identity + (level, col, row)
+        with self.lock:
+            image = self.images.get(key)
+            if image is not None:
+                self.images.move_to_end(key)
+                return image
+            if key in self.pending or key in self.failed:
+                return None
+            self.pending.add(key)
+        self.executor.submit(self.fetch, page, key, level, col, row)
+        return None
+    
+    def load(self, page, level, col, row):
+        """在当前线程取得并解码图块，失败时返回空 QImage"""
+        key = page.identity + (level, col, row)
+        with self.lock:
+            image = self.images.get(key)
+        if image is not None:
+            return image
+        try:
+            image = QImage.fromData(self.client.cached_tile(page.filename, page.side, level, col, row), "PNG")
+        except (OSError, ValueError):
+            return QImage()
+        if not image.isNull():
+            with self.lock:
+                if key not in self.images:
+                    self.images[key] = image
+                    self.total_bytes += image.sizeInBytes()
+                while self.total_bytes > self.max_bytes and len(self.images) > 1:
+                    _, old = self.images.popitem(last=False)
+                    self.total_bytes -= old.sizeInBytes()
+        return image
+    
+    def fetch(self, page, key, level, col, row):
+        image = self.load(page, level, col, row)
+        with self.lock:
+            self.pending.discard(key)
+            if image.isNull():
+                self.failed.add(key)
+        if not image.isNull():
+            self.on_loaded(page.filename, page.side)
+    
+    def prefetch(self, filenames):
+        """在后台取得相邻页面的图块信息和粗略级别的图块，翻到时可以马上显示"""
+        def run(filename):
+            for side in ("original", "translated"):
+                page = self.page(filename, side)
+                if page is None:
+                    continue
+                size = page.tile_size
+                for level in range(len(page.levels) - 1, -1, -1):
+                    width, height = page.levels[level]
+                    cols, rows = (width + size - 1) // size, (height + size - 1) // size
+                    if cols * rows > self.PREFETCH_TILES:
+                        break
+                    for row in range(rows):
+                        for col in range(cols):
+                            self.load(page, level, col, row)
+        
+        for filename in filenames:
+            self.executor.submit(run, filename)
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class TiledPageItem(QGraphicsItem):
+    """在场景中显示 TiledPage，每次只绘制可见区域"""
+    
+    def __init__(self, page):
+        super().__init__()
+        self.page = page
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+    
+    def boundingRect(self):
+        return QRectF(self.page.rect())
+    
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        self.page.draw(painter, exposed, exposed, option.levelOfDetailFromTransform(painter.worldTransform()))
+
+
+def draw_source(painter, source, target, region, lod=1.0):
+    """把图像 source（QPixmap 或 TiledPage）中的 region 区域画到 target，lod 为绘制时的缩放比例"""
+    if isinstance(source, TiledPage):
+        source.draw(painter, target, region, lod)
+    else:
+        painter.drawPixmap(target, source, region)
+
+
+class CompareOverlayItem(QGraphicsItem):
+    """在一个视图中叠加显示原图和翻译图
+
+    直接使用已经加载的两张 QPixmap（连接审核服务器时为 TiledPage），
+    通过 QPainter 的合成模式在绘制时组合，每次只绘制可见区域，不重新解码，也不做整张图像的像素运算。
+    """
+    
+    MODES = ("叠加", "差异", "闪烁", "滑动")
+    DIVIDER_PEN = QPen(QColor(255, 200, 0), 2)
+    DIVIDER_PEN.setCosmetic(True)
+    
+    def __init__(self, original, translated, mode):
+        super().__init__()
+        self.original = original
+        self.translated = translated
+        self.mode = mode
+        self.opacity = 0.5  # 叠加模式下原图的不透明度
+        self.show_original = False  # 闪烁模式下当前显示的图像
+        self.divider = original.width() / 2  # 滑动模式下分界线的x坐标
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        # 放在标注和建议下面
+        self.setZValue(-1)
+    
+    def boundingRect(self):
+        return QRectF(0, 0, max(self.original.width(), self.translated.width()),
+                      max(self.original.height(), self.translated.height()))
+    
+    def set_opacity(self, opacity):
+        self.opacity = opacity
+        self.update()
+    
+    def toggle_blink(self):
+        self.show_original = not self.show_original
+        self.update()
+    
+    def set_divider(self, x):
+        self.divider = x
+        self.update()
+    
+    @staticmethod
+    def draw_region(painter, pixmap, region, lod=1.0):
+        """只绘制 region 与图像相交的部分"""
+        target = region.intersected(QRectF(pixmap.rect()))
+        if not target.isEmpty():
+            draw_source(painter, pixmap, target, target, lod)
+    
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if self.mode == "闪烁":
+            self.draw_region(painter, self.original if self.show_original else self.translated, exposed, lod)
+            return
+        
+        self.draw_region(painter, self.translated, exposed, lod)
+        if self.mode == "叠加":
+            painter.setOpacity(self.opacity)
+            self.draw_region(painter, self.original, exposed, lod)
+            painter.setOpacity(1.0)
+        elif self.mode == "差异":
+            # 相同的像素变黑，只有差异处发亮
+            painter.setCompositionMode(QPainter.CompositionMode_Difference)
+            self.draw_region(painter, self.original, exposed, lod)
+            painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        elif self.mode == "滑动":
+            # 分界线左侧显示原图，右侧显示翻译图
+            left = QRectF(0, 0, self.divider, self.boundingRect().height())
+            self.draw_region(painter, self.original, exposed.intersected(left), lod)
+            painter.setPen(self.DIVIDER_PEN)
+            painter.drawLine(QPointF(self.divider, exposed.top()), QPointF(self.divider, exposed.bottom()))
+
+
+class SwipeHandleItem(QGraphicsRectItem):
+    """滑动模式下可以左右拖动的分界线手柄"""
+    
+    WIDTH = 16
+    
+    def __init__(self, overlay):
+        height = overlay.boundingRect().height()
+        super().__init__(QRectF(-self.WIDTH / 2, 0, self.WIDTH, height))
+        self.overlay = overlay
+        self.setPen(QPen(Qt.NoPen))
+        self.setBrush(QColor(255, 200, 0, 40))
+        self.setCursor(Qt.SizeHorCursor)
+        self.setFlag(QGraphicsItem.ItemIsMovable, True)
+        self.setFlag(QGraphicsItem.ItemSendsGeometryChanges, True)
+        self.setPos(overlay.divider, 0)
+        self.setZValue(2)
+    
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.ItemPositionChange:
+            # 只允许水平移动，并限制在图像范围内
+            x = min(max(value.x(), 0.0), self.overlay.boundingRect().width())
+            self.overlay.set_divider(x)
+            return QPointF(x, 0)
+        return super().itemChange(change, value)
+
+
+class LoupeWidget(QWidget):
+    """跟随鼠标的放大镜，并排显示原图和翻译图同一位置的局部
+
+    直接从全分辨率的 QPixmap（连接审核服务器时为第0级图块）中取出放大镜大小的区域绘制，
+    不改变主视图的缩放和滚动，鼠标每次移动只重绘这个小窗口。
+    """
+    
+    PANEL_SIZE = 200  # 每一半的边长（屏幕像素）
+    LABEL_HEIGHT = 18
+    CURSOR_OFFSET = 24  # 放大镜与鼠标的距离，避免挡住鼠标
+    
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.original = None
+        self.translated = None
+        self.zoom = 1  # 1 表示 1:1，2 表示 2:1
+        self.center = QPointF()
+        self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
+        self.setFixedSize(self.PANEL_SIZE * 2 + 3, self.PANEL_SIZE + self.LABEL_HEIGHT + 2)
+        self.hide()
+    
+    def set_sources(self, original, translated):
+        self.original = original
+        self.translated = translated
+    
+    def show_at(self, scene_pos, global_pos):
+        """以场景坐标 scene_pos 为中心显示，窗口放在鼠标右下方，靠近边缘时翻到另一侧"""
+        if self.original is None:
+            return
+        self.center = scene_pos
+        pos = self.parentWidget().mapFromGlobal(global_pos)
+        x = pos.x() + self.CURSOR_OFFSET
+        y = pos.y() + self.CURSOR_OFFSET
+        if x + self.width() > self.parentWidget().width():
+            x = pos.x() - self.CURSOR_OFFSET - self.width()
+        if y + self.height() > self.parentWidget().height():
+            y = pos.y() - self.CURSOR_OFFSET - self.height()
+        self.move(max(x, 0), max(y, 0))
+        self.raise_()
+        self.show()
+        self.update()
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(60, 60, 60))
+        # 放大时保持像素清晰，方便检查笔画边缘
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+        
+        span = self.PANEL_SIZE / self.zoom
+        source = QRectF(self.center.x() - span / 2, self.center.y() - span / 2, span, span)
+        for column, (label, pixmap) in enumerate((("原图", self.original), ("翻译", self.translated))):
+            left = 1 + column * (self.PANEL_SIZE + 1)
+            target = QRectF(left, self.LABEL_HEIGHT + 1, self.PANEL_SIZE, self.PANEL_SIZE)
+            painter.fillRect(target, QColor(128, 128, 128))
+            if pixmap is not None:
+                draw_source(painter, pixmap, target, source, self.zoom)
+            painter.setPen(Qt.white)
+            painter.drawText(QRectF(left, 0, self.PANEL_SIZE, self.LABEL_HEIGHT), Qt.AlignCenter,
+                             f"{label} {self.zoom}:1")
+            # 中心十字线
+            painter.setPen(QPen(QColor(255, 0, 0, 160), 1))
+            cx, cy = target.center().x(), target.center().y()
+            painter.drawLine(QPointF(cx - 6, cy), QPointF(cx + 6, cy))
+            painter.drawLine(QPointF(cx, cy - 6), QPointF(cx, cy + 6))
+
+
+def diff_hotspots(original, translated, page_width, cell=8):
+    """比较两张缩略图，返回差异明显的区域（场景坐标的 QRectF 列表），缺少 numpy 时返回空列表"""
+    try:
+        import numpy as np
+    except ImportError:
+        return []
+    if original.isNull() or translated.isNull() or original.size() != translated.size():
+        return []
+    
+    def gray(image):
+        image = image.convertToFormat(QImage.Format_Grayscale8)
+        ptr = image.constBits()
+        ptr.setsize(image.bytesPerLine() * image.height())
+        array = np.frombuffer(ptr, dtype=np.uint8).reshape(image.height(), image.bytesPerLine())
+        return array[:, :image.width()].astype(np.int16)
+    
+    diff = np.abs(gray(original) - gray(translated))
+    rows, cols = diff.shape[0] // cell, diff.shape[1] // cell
+    if rows == 0 or cols == 0:
+        return []
+    blocks = diff[:rows * cell, :cols * cell].reshape(rows, cell, cols, cell).mean(axis=(1, 3))
+    scale = page_width / original.width()
+    return [QRectF(c * cell * scale, r * cell * scale, cell * scale, cell * scale)
+            for r, c in zip(*np.nonzero(blocks > triage.DIFF_THRESHOLD))]
+
+
+class MinimapWidget(QWidget):
+    """整页的小地图：低分辨率缩略图、当前视口、标注和差异热点
+
+    缩略图来自 DecodedImageCache，不渲染全分辨率场景。点击或拖动时发出场景坐标，
+    由主窗口把视图中心移到该位置（其他视图通过共享的视图状态跟随）。
+    """
+    navigateRequested = pyqtSignal(QPointF)  # 场景坐标
+    
+    VIEWPORT_PEN = QPen(QColor(0, 120, 255), 2)
+    HOTSPOT_COLOR = QColor(255, 0, 0, 70)
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.thumb = None
+        self.page_size = QSizeF()
+        self.viewport_rect = QRectF()
+        self.markers = []  # [(场景矩形, 颜色)]
+        self.hotspots = []
+        self.setMinimumHeight(160)
+        self.setCursor(Qt.PointingHandCursor)
+        self.setToolTip("小地图：点击或拖动移动视图")
+    
+    def set_page(self, thumb, page_size, hotspots=()):
+        self.thumb = QPixmap.fromImage(thumb) if not thumb.isNull() else None
+        self.page_size = QSizeF(page_size)
+        self.hotspots = list(hotspots)
+        self.update()
+    
+    def clear(self):
+        self.thumb = None
+        self.markers = []
+        self.hotspots = []
+        self.update()
+    
+    def set_markers(self, markers):
+        self.markers = markers
+        self.update()
+    
+    def set_viewport(self, rect):
+        if rect != self.viewport_rect:
+            self.viewport_rect = rect
+            self.update()
+    
+    def page_rect(self):
+        """缩略图在控件中的位置（保持宽高比居中）"""
+        if self.page_size.isEmpty():
+            return QRectF()
+        size = self.page_size.scaled(QSizeF(self.width() - 2, self.height() - 2), Qt.KeepAspectRatio)
+        return QRectF((self.width() - size.width()) / 2, (self.height() - size.height()) / 2,
+                      size.width(), size.height())
+    
+    def to_widget(self, rect, target):
+        sx = target.width() / self.page_size.width()
+        sy = target.height() / self.page_size.height()
+        return QRectF(target.x() + rect.x() * sx, target.y() + rect.y() * sy, rect.width() * sx, rect.height() * sy)
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(60, 60, 60))
+        target = self.page_rect()
+        if self.thumb is None or target.isEmpty():
+            return
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
+        painter.drawPixmap(target, self.thumb, QRectF(self.thumb.rect()))
+        for rect in self.hotspots:
+            painter.fillRect(self.to_widget(rect, target), self.HOTSPOT_COLOR)
+        for rect, color in self.markers:
+            painter.setPen(QPen(color, 1))
+            painter.drawRect(self.to_widget(rect, target))
+        painter.setPen(self.VIEWPORT_PEN)
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(self.to_widget(self.viewport_rect.intersected(
+            QRectF(QPointF(0, 0), self.page_size)), target))
+    
+    def navigate(self, pos):
+        target = self.page_rect()
+        if self.thumb is None or target.isEmpty():
+            return
+        x = (pos.x() - target.x()) / target.width() * self.page_size.width()
+        y = (pos.y() - target.y()) / target.height() * self.page_size.height()
+        self.navigateRequested.emit(QPointF(min(max(x, 0), self.page_size.width()),
+                                            min(max(y, 0), self.page_size.height())))
+    
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.navigate(event.pos())
+    
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton:
+            self.navigate(event.pos())
+
+
+class LibraryBrowser(QDialog):
+    """资料库浏览器：系列 → 章节，以及跨系列的“需要修改”页面
+
+    所有数据来自 SQLite 索引，打开章节时不扫描文件夹。索引在后台线程中增量更新。
+    """
+    chapterRequested = pyqtSignal(str, str)  # 打开章节: (原图文件夹, 要选中的文件名，可以为空)
+    annotationRequested = pyqtSignal(str, str, str, list)  # 跳到标注: (原图文件夹, 文件名, 视图名, [x, y, w, h])
+    indexProgress = pyqtSignal(str)
+    indexFinished = pyqtSignal()
+    
+    def __init__(self, conn, parent=None):
+        super().__init__(parent)
+        self.conn = conn
+        self.indexing = False
+        self.setWindowTitle("资料库")
+        self.resize(720, 520)
+        
+        layout = QVBoxLayout(self)
+        buttons = QHBoxLayout()
+        add_btn = QPushButton("添加系列")
+        add_btn.clicked.connect(self.add_series)
+        buttons.addWidget(add_btn)
+        self.refresh_btn = QPushButton("更新索引")
+        self.refresh_btn.clicked.connect(lambda: self.start_indexing())
+        buttons.addWidget(self.refresh_btn)
+        self.needs_fix_checkbox = QCheckBox("只看需要修改的页面")
+        self.needs_fix_checkbox.stateChanged.connect(self.refresh)
+        buttons.addWidget(self.needs_fix_checkbox)
+        buttons.addStretch()
+        layout.addLayout(buttons)
+        
+        # 标注全文搜索，输入时立即查询
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("搜索所有系列的标注文字，例如: 敬语、honorific")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.refresh)
+        layout.addWidget(self.search_box)
+        
+        self.tree = QTreeWidget()
+        self.tree.setHeaderLabels(["名称", "页数", "需要修改", "已通过", "有问题"])
+        self.tree.setColumnWidth(0, 320)
+        self.tree.itemDoubleClicked.connect(self.open_item)
+        layout.addWidget(self.tree)
+        
+        self.status = QLabel("双击章节或页面打开")
+        layout.addWidget(self.status)
+        
+        self.indexProgress.connect(self.status.setText)
+        self.indexFinished.connect(self.on_index_finished)
+        self.refresh()
+    
+    def refresh(self, state=None):
+        """从索引重新填充列表"""
+        self.tree.clear()
+        query = self.search_box.text().strip()
+        if query:
+            views = {"original": "原图", "translated": "翻译图"}
+            results = annotation_search.search(self.conn, query)
+            for row in results:
+                item = QTreeWidgetItem([f"{row['series']} / {row['chapter']} / {row['filename']} "
+                                        f"[{views.get(row['view'], row['view'])}] {row['text']}"])
+                item.setToolTip(0, row["text"])
+                item.setData(0, Qt.UserRole + 1, (row["original_folder"], row["filename"], row["view"],
+                                                  [row["x"], row["y"], row["w"], row["h"]]))
+                self.tree.addTopLevelItem(item)
+            self.status.setText(f"找到 {len(results)} 处标注（双击跳到标注位置）")
+            return
+        if self.needs_fix_checkbox.isChecked():
+            pages = library_index.find_pages(self.conn, needs_fix=True)
+            for page in pages:
+                item = QTreeWidgetItem([f"{page['series']} / {page['chapter']} / {page['filename']}", "", "✓",
+                                        "✓" if page["approved"] else "", str(page["issue_count"] or "")])
+                item.setData(0, Qt.UserRole, (page["original_folder"], page["filename"]))
+                self.tree.addTopLevelItem(item)
+            self.status.setText(f"需要修改的页面: {len(pages)}")
+            return
+        
+        for series in library_index.list_series(self.conn):
+            series_item = QTreeWidgetItem([series["name"]])
+            series_item.setToolTip(0, f"{series['original_root']}\n{series['translated_root']}\n"
+                                      f"索引时间: {series['indexed_at'] or '未索引'}")
+            for chapter in library_index.list_chapters(self.conn, series["id"]):
+                item = QTreeWidgetItem([chapter["name"], str(chapter["pages"]), str(chapter["needs_fix"]),
+                                        str(chapter["approved"]), str(chapter["flagged"])])
+                item.setData(0, Qt.UserRole, (chapter["original_folder"], ""))
+                series_item.addChild(item)
+            self.tree.addTopLevelItem(series_item)
+            series_item.setExpanded(True)
+    
+    def open_item(self, item, column):
+        annotation = item.data(0, Qt.UserRole + 1)
+        if annotation:
+            self.annotationRequested.emit(*annotation)
+            return
+        data = item.data(0, Qt.UserRole)
+        if data:
+            self.chapterRequested.emit(*data)
+    
+    def add_series(self):
+        """登记一个系列（原图根目录和翻译根目录），然后在后台索引"""
+        original_root = QFileDialog.getExistingDirectory(self, "选择系列的原图根目录", "")
+        if not original_root:
+            return
+        translated_root = QFileDialog.getExistingDirectory(self, "选择系列的翻译根目录", "")
+        if not translated_root:
+            return
+        series_id = library_index.add_series(self.conn, original_root, translated_root)
+        self.refresh()
+        self.start_indexing([series_id])
+    
+    def start_indexing(self, series_ids=None):
+        """在后台线程中增量索引指定系列（默认全部）"""
+        if self.indexing:
+            return
+        if series_ids is None:
+            series_ids = [series["id"] for series in library_index.list_series(self.conn)]
+        self.indexing = True
+        self.refresh_btn.setEnabled(False)
+        
+        def work():
+            # sqlite3 连接不能跨线程使用
+            conn = library_index.connect()
+            try:
+                for series_id in series_ids:
+                    library_index.index_series(conn, series_id, image_size=image_decoders.probe,
+                                               progress=self.indexProgress.emit)
+            except (OSError, library_index.sqlite3.Error) as e:
+                self.indexProgress.emit(f"索引失败: {str(e)}")
+            finally:
+                conn.close()
+                self.indexFinished.emit()
+        
+        threading.Thread(target=work, daemon=True).start()
+    
+    def on_index_finished(self):
+        self.indexing = False
+        self.refresh_btn.setEnabled(True)
+        self.refresh()
+        self.status.setText("索引已更新")
 
 
 class ImageComparisonTool(QMainWindow):
     """主应用程序窗口"""
+    BLINK_INTERVAL_MS = 400  # 闪烁模式的切换间隔
+    REVIEW_SYNC_MS = 3000  # 与审核服务器同步标注的间隔
+    sessionValidated = pyqtSignal(int, list)  # 后台会话校验完成信号: (章节批次, 问题列表)
+    hashesReady = pyqtSignal(int, dict)  # 翻译图像内容哈希计算完成: (章节批次, 哈希)
+    riskUpdated = pyqtSignal(int, str, dict)  # 后台差异分析得到一页结果: (批次, 文件名, 结果)
+    riskScanFinished = pyqtSignal(int)  # 后台差异分析结束: 批次
+    duplicatesReady = pyqtSignal(int, object, dict)  # 重复页索引更新完成: (批次, 索引, {文件名: 来源页面键})
+    tileLoaded = pyqtSignal(str, str)  # 审核服务器的图块下载完成: (文件名, 视图)
+    sharedSynced = pyqtSignal(object, dict, object, str)  # 后台标注同步完成: (客户端, 已提交的页面, 有变化的文件名, 错误信息)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("翻译质量检查图像对比工具")
@@ -230,7 +1410,54 @@ class ImageComparisonTool(QMainWindow):
         self.image_pairs = []  # 存储图像对的列表，每个元素是(原始图像路径,翻译图像路径)
         self.current_index = -1
         self.modified_images = set()
+        self.page_annotations = {}  # 每页的标注数据: 文件名 -> {"original": [...], "translated": [...]}
+        self.loaded_filename = None  # 当前场景中显示的图像文件名
+        self.review_ledger = None  # 本章节的审核记录
+        self.ledger_path = ""
+        self.page_hashes = {}  # 翻译图像的内容哈希: 文件名 -> {"size", "mtime", "digest"}
+        self.unchanged_pages = set()  # 已通过且内容未变化的页面
+        self.chapter_generation = 0  # 每次打开章节加一，旧章节的后台哈希和会话校验结果被忽略
+        self.pair_info = {}  # 图像对的尺寸和文件状态: 文件名 -> {"size", "original", "translated"}
+        # 尺寸不同的图像: 文件名 -> session_store.mismatched_entry(...)，也列在 image_pairs 中，
+        # 但不参与需要两张图尺寸相同的自动检查和叠加对比
+        self.mismatched_pages = {}
+        self.history = ReviewHistory()  # 整个章节的撤销/重做历史
+        self.replaying_history = False  # 正在撤销/重做时不记录新的历史
+        self.leak_tracker = leak_detector.tracker_from_env()  # 内存泄漏诊断模式
+        self.quality_results = {}  # 画质检查结果: 文件名 -> {"issues", "score", ...}
+        self.page_suggestions = {}  # 自动检测的建议标注: 文件名 -> [{"source", "kind", "rect", ...}]
+        self.dismissed_suggestions = {}  # 已忽略或已采纳的建议: 文件名 -> {建议键}
+        self.diff_results = {}  # 差异分析结果: 文件名 -> {"area"}
+        self.risk_generation = 0  # 差异分析批次，切换章节后旧批次的结果被忽略
+        self.risk_resort_pending = False
+        self.duplicate_index = None  # 系列范围的重复页索引，后台更新完成前为None
+        self.duplicate_carries = {}  # 可以沿用重复页结果的页面: 文件名 -> 来源页面键
+        self.spot_check_pages = {}  # 来源已通过但翻译图内容不同、需要抽查的页面: 文件名 -> 来源页面键
+        self.duplicate_generation = 0
+        self.library = None  # 资料库连接，第一次使用时打开
+        self.library_browser = None
+        self.compare_mode = "并排"  # 并排，或 CompareOverlayItem.MODES 中的叠加模式
+        self.original_pixmap_item = None
+        self.translated_pixmap_item = None
+        self.original_source = None  # 当前页面的图像: QPixmap，连接审核服务器时为 TiledPage
+        self.translated_source = None
+        self.compare_overlay = None
+        self.swipe_handle = None
+        self.blink_timer = QTimer(self)
+        self.blink_timer.setInterval(self.BLINK_INTERVAL_MS)
+        self.blink_timer.timeout.connect(self.toggle_blink)
         self.active_view = None  # 当前活动的视图（用于确定撤销哪个视图的标注）
+        self.view_state = ViewStateModel(self)  # 所有视图共享的缩放和滚动位置
+        self.image_cache = DecodedImageCache()  # 所有视图共用的解码图像缓存
+        self.compare_panes = []  # 额外的对比版本: [{"folder", "scene", "view", "container", "label", "pixmap_item"}]
+        self.review_client = None  # 连接审核服务器时的客户端
+        self.remote_tiles = None  # 连接审核服务器时显示页面用的图块缓存
+        self.shared_snapshot = {}  # 上次与服务器同步时每页的标注: 文件名 -> {"original", "translated"}
+        self.review_sync_timer = QTimer(self)
+        self.review_sync_timer.setInterval(self.REVIEW_SYNC_MS)
+        self.review_sync_timer.timeout.connect(self.sync_shared_annotations)
+        self.review_sync_running = False  # 后台同步未完成时定时器不再启动新的同步
+        self.review_sync_lock = threading.Lock()  # 同一时间只有一个后台线程读写共享存储
         
         # 界面设置
         self.setup_ui()
@@ -238,6 +1465,16 @@ class ImageComparisonTool(QMainWindow):
         # 设置快捷键
         self.setup_shortcuts()
         
+        # 窗口显示后恢复上一次的会话
+        self.sessionValidated.connect(self.on_session_validated)
+        self.hashesReady.connect(self.on_hashes_ready)
+        self.riskUpdated.connect(self.on_risk_updated)
+        self.riskScanFinished.connect(self.on_risk_scan_finished)
+        self.duplicatesReady.connect(self.on_duplicates_ready)
+        self.tileLoaded.connect(self.on_tile_loaded)
+        self.sharedSynced.connect(self.on_shared_synced)
+        QTimer.singleShot(0, self.restore_last_session)
+        
         # 添加调试信息
         print("程序已启动")
         print(f"用户登录名: Juggernautsst")
@@ -245,31 +1482,159 @@ class ImageComparisonTool(QMainWindow):
     
     def setup_shortcuts(self):
         """设置键盘快捷键"""
-        # 设置Ctrl+Z撤销标注
+        # 设置Ctrl+Z撤销，Ctrl+Y或Ctrl+Shift+Z重做
         self.undo_shortcut = QShortcut(QKeySequence("Ctrl+Z"), self)
         self.undo_shortcut.activated.connect(self.undo_annotation)
+        self.redo_shortcut = QShortcut(QKeySequence("Ctrl+Y"), self)
+        self.redo_shortcut.activated.connect(self.redo_annotation)
+        self.redo_shortcut_alt = QShortcut(QKeySequence("Ctrl+Shift+Z"), self)
+        self.redo_shortcut_alt.activated.connect(self.redo_annotation)
+        
+        # 设置Ctrl+Enter标记当前页通过审核
+        self.approve_shortcut = QShortcut(QKeySequence("Ctrl+Return"), self)
+        self.approve_shortcut.activated.connect(self.approve_current_page)
+        
+        # 设置Ctrl+L开关放大镜
+        self.loupe_shortcut = QShortcut(QKeySequence("Ctrl+L"), self)
+        self.loupe_shortcut.activated.connect(lambda: self.loupe_checkbox.toggle())
+        
+        # 设置Ctrl+Shift+D显示解码后端的选择和耗时
+        self.decoder_shortcut = QShortcut(QKeySequence("Ctrl+Shift+D"), self)
+        self.decoder_shortcut.activated.connect(self.show_decoder_report)
         
         # 其他快捷键可以在这里添加
         # 例如: Ctrl+S保存, 左右方向键导航等
     
+    def show_decoder_report(self):
+        """显示每种格式和操作使用的解码后端"""
+        QMessageBox.information(self, "解码后端", "\n".join(image_decoders.report()))
+    
     def undo_annotation(self):
-        """撤销上一个标注动作"""
-        # 尝试撤销原始视图中的标注
-        if self.original_view.undo_last_annotation():
-            self.status_label.setText("已撤销原始图像中的最后一个标注")
-            print("已撤销原始图像中的最后一个标注")
+        """撤销章节中最近的一次操作（标注增删改、修改标记、审核通过）"""
+        entry = self.history.pop_undo()
+        if entry is None:
+            self.status_label.setText("没有操作可撤销")
+            print("没有操作可撤销")
             return
-            
-        # 如果原始视图没有标注可撤销，尝试翻译视图
-        if self.translated_view.undo_last_annotation():
-            self.status_label.setText("已撤销翻译图像中的最后一个标注")
-            print("已撤销翻译图像中的最后一个标注")
+        self.apply_history_entry(entry, undo=True)
+        self.status_label.setText(f"已撤销: {entry[0]} ({entry[1]})")
+        print(f"已撤销: {entry[0]} ({entry[1]})")
+    
+    def redo_annotation(self):
+        """重做最近撤销的一次操作"""
+        entry = self.history.pop_redo()
+        if entry is None:
+            self.status_label.setText("没有操作可重做")
+            print("没有操作可重做")
             return
+        self.apply_history_entry(entry, undo=False)
+        self.status_label.setText(f"已重做: {entry[0]} ({entry[1]})")
+        print(f"已重做: {entry[0]} ({entry[1]})")
+    
+    def apply_history_entry(self, entry, undo):
+        """切换到记录所在的页面并应用（或反向应用）其中的增量"""
+        _, filename, deltas = entry
+        rows = {name: row for row, (_, _, name) in enumerate(self.image_pairs)}
+        if filename not in rows:
+            return
+        if filename != self.loaded_filename:
+            self.current_index = rows[filename]
+            self.image_list.setCurrentRow(self.current_index)
+            if self.loaded_filename != filename:
+                self.load_current_image_pair()
+        
+        self.remember_current_annotations()
+        self.replaying_history = True
+        try:
+            for delta in (reversed(deltas) if undo else deltas):
+                kind = delta[0]
+                if kind == "annotation":
+                    _, view_name, index, old, new = delta
+                    if undo:
+                        old, new = new, old
+                    page = self.page_annotations.setdefault(filename, {"original": [], "translated": []})
+                    items = page.setdefault(view_name, [])
+                    if old is None:
+                        items.insert(index, new)
+                    elif new is None:
+                        del items[index]
+                    else:
+                        items[index] = new
+                elif kind == "flag":
+                    _, old, new = delta
+                    if (old if undo else new):
+                        self.modified_images.add(filename)
+                    else:
+                        self.modified_images.discard(filename)
+                elif kind == "approval":
+                    _, old, new = delta
+                    self.set_approval_record(filename, old if undo else new)
+                elif kind == "suggestion":
+                    _, key, old, new = delta
+                    dismissed = self.dismissed_suggestions.setdefault(filename, set())
+                    if (old if undo else new):
+                        dismissed.add(key)
+                    else:
+                        dismissed.discard(key)
+                        if not dismissed:
+                            del self.dismissed_suggestions[filename]
             
-        # 如果两个视图都没有标注可撤销
-        self.status_label.setText("没有标注可撤销")
-        print("没有标注可撤销")
+            # 根据更新后的数据重建当前页的标注、建议和复选框
+            self.original_view.remove_all_annotations()
+            self.translated_view.remove_all_annotations()
+            self.restore_annotations(filename)
+            self.restore_suggestions(filename)
+            self.modified_checkbox.setChecked(filename in self.modified_images)
+        finally:
+            self.replaying_history = False
+        self.update_search_index(filename)
+        self.update_list_item(rows[filename])
+    
+    def set_approval_record(self, filename, record):
+        """撤销/重做时直接写入审核记录中的条目"""
+        if self.review_ledger is None:
+            return
+        if record is None:
+            self.review_ledger["pages"].pop(filename, None)
+        else:
+            self.review_ledger["pages"][filename] = dict(record)
+        review_ledger.save_ledger(self.ledger_path, self.review_ledger)
         
+        info = self.page_hashes.get(filename)
+        if record and record.get("approved") and info and record.get("digest") == info["digest"]:
+            self.unchanged_pages.add(filename)
+        else:
+            self.unchanged_pages.discard(filename)
+        self.update_list_item(self.image_list_row(filename))
+    
+    def revoke_approval(self, filename):
+        """撤销某页的通过记录（标记需要修改或添加标注时），记入历史以便撤销"""
+        if self.review_ledger is None:
+            return
+        record = self.review_ledger["pages"].get(filename)
+        if not record or not record.get("approved"):
+            return
+        old_record = dict(record)
+        review_ledger.revoke(self.review_ledger, filename)
+        try:
+            review_ledger.save_ledger(self.ledger_path, self.review_ledger)
+        except OSError as e:
+            print(f"保存审核记录时出错: {str(e)}")
+        self.history.record("撤销通过", filename,
+                            [("approval", old_record, dict(self.review_ledger["pages"][filename]))])
+        self.unchanged_pages.discard(filename)
+        row = self.image_list_row(filename)
+        if row >= 0:
+            self.update_list_item(row)
+        print(f"已撤销通过: {filename}")
+    
+    def image_list_row(self, filename):
+        """返回文件名在图像列表中的行号"""
+        for row, (_, _, name) in enumerate(self.image_pairs):
+            if name == filename:
+                return row
+        return -1
+    
     def setup_ui(self):
         """设置用户界面"""
         # 主部件和布局
@@ -287,6 +1652,16 @@ class ImageComparisonTool(QMainWindow):
         select_folders_btn.clicked.connect(self.select_image_folders)
         left_layout.addWidget(select_folders_btn)
         
+        # 资料库浏览器
+        library_btn = QPushButton("资料库")
+        library_btn.clicked.connect(self.open_library)
+        left_layout.addWidget(library_btn)
+        
+        # 连接局域网审核服务器（review_server.py）
+        server_btn = QPushButton("连接审核服务器")
+        server_btn.clicked.connect(self.connect_review_server)
+        left_layout.addWidget(server_btn)
+        
         # 标注文件夹选择按钮
         select_annotation_folder_btn = QPushButton("选择标注保存文件夹")
         select_annotation_folder_btn.clicked.connect(self.select_annotation_folder)
@@ -296,8 +1671,24 @@ class ImageComparisonTool(QMainWindow):
         self.image_list = QListWidget()
         self.image_list.currentRowChanged.connect(self.on_image_selected)
         left_layout.addWidget(QLabel("图像列表:"))
+        
+        # 图像列表排序方式
+        sort_layout = QHBoxLayout()
+        sort_layout.addWidget(QLabel("排序:"))
+        self.sort_mode = QComboBox()
+        self.sort_mode.addItems(["文件名", "画质问题", "风险"])
+        self.sort_mode.currentTextChanged.connect(self.sort_image_list)
+        sort_layout.addWidget(self.sort_mode)
+        left_layout.addLayout(sort_layout)
+        
         left_layout.addWidget(self.image_list)
         
+        # 整页小地图，显示当前视口、标注和差异热点
+        self.minimap = MinimapWidget()
+        self.minimap.setFixedHeight(240)
+        self.minimap.navigateRequested.connect(self.on_minimap_navigate)
+        left_layout.addWidget(self.minimap)
+        
         # 导航按钮
         nav_layout = QHBoxLayout()
         self.prev_button = QPushButton("上一章")
@@ -315,13 +1706,46 @@ class ImageComparisonTool(QMainWindow):
         self.modified_checkbox.stateChanged.connect(self.modified_checkbox_changed)
         left_layout.addWidget(self.modified_checkbox)
         
+        # 审核通过按钮
+        approve_btn = QPushButton("通过本页(Ctrl+Enter)")
+        approve_btn.clicked.connect(self.approve_current_page)
+        left_layout.addWidget(approve_btn)
+        
+        # 只显示内容有变化的页面
+        self.changed_only_checkbox = QCheckBox("只显示有变化的页面")
+        self.changed_only_checkbox.setChecked(True)
+        self.changed_only_checkbox.stateChanged.connect(self.apply_review_filter)
+        left_layout.addWidget(self.changed_only_checkbox)
+        
+        # 画质检查按钮
+        quality_btn = QPushButton("画质检查")
+        quality_btn.clicked.connect(self.run_quality_check)
+        left_layout.addWidget(quality_btn)
+        
+        # 排版溢出检查按钮
+        overflow_btn = QPushButton("排版溢出检查")
+        overflow_btn.clicked.connect(self.run_overflow_check)
+        left_layout.addWidget(overflow_btn)
+        
+        # 清理残留检查按钮
+        residue_btn = QPushButton("清理残留检查")
+        residue_btn.clicked.connect(self.run_residue_check)
+        left_layout.addWidget(residue_btn)
+        
+        # 一次运行所有自动检查，每页只解码一次
+        all_checks_btn = QPushButton("全部检查")
+        all_checks_btn.clicked.connect(self.run_all_checks)
+        left_layout.addWidget(all_checks_btn)
+        
         # 导出按钮
         export_btn = QPushButton("导出带标注的图像")
         export_btn.clicked.connect(self.export_annotated_images)
         left_layout.addWidget(export_btn)
         
         # 快捷键说明
-        shortcut_label = QLabel("快捷键：\nCtrl+Z - 撤销上一个标注")
+        shortcut_label = QLabel("快捷键：\nCtrl+Z - 撤销上一个操作\nCtrl+Y - 重做\nCtrl+Enter - 通过本页\nCtrl+L - 放大镜\n"
+                                "标注模式下：拖动标注移动，拖动右下角缩放，\n"
+                                "双击修改文本，Shift+拖动框选，Delete删除")
         left_layout.addWidget(shortcut_label)
         
         # 将左侧面板添加到主布局
@@ -359,11 +1783,15 @@ class ImageComparisonTool(QMainWindow):
         save_annotation_btn.clicked.connect(self.save_current_annotation)
         toolbar_layout.addWidget(save_annotation_btn)
         
-        # 撤销标注按钮
-        undo_btn = QPushButton("撤销标注(Ctrl+Z)")
+        # 撤销/重做按钮
+        undo_btn = QPushButton("撤销(Ctrl+Z)")
         undo_btn.clicked.connect(self.undo_annotation)
         toolbar_layout.addWidget(undo_btn)
         
+        redo_btn = QPushButton("重做(Ctrl+Y)")
+        redo_btn.clicked.connect(self.redo_annotation)
+        toolbar_layout.addWidget(redo_btn)
+        
         # 添加工具栏到布局
         right_layout.addLayout(toolbar_layout)
         
@@ -386,10 +1814,46 @@ class ImageComparisonTool(QMainWindow):
         quality_layout.addWidget(QLabel("最小缩放:"))
         quality_layout.addWidget(self.min_zoom)
         
+        # 额外的对比版本（例如上一版翻译或另一个汉化组），与原图和翻译图同步显示
+        add_pane_btn = QPushButton("添加对比版本")
+        add_pane_btn.clicked.connect(self.add_compare_folder)
+        quality_layout.addWidget(add_pane_btn)
+        self.remove_panes_btn = QPushButton("移除对比版本")
+        self.remove_panes_btn.clicked.connect(lambda: self.set_compare_folders([]))
+        self.remove_panes_btn.setEnabled(False)
+        quality_layout.addWidget(self.remove_panes_btn)
+        
+        # 对比模式：并排或在翻译视图中叠加
+        quality_layout.addWidget(QLabel("对比模式:"))
+        self.compare_mode_combo = QComboBox()
+        self.compare_mode_combo.addItems(["并排"] + list(CompareOverlayItem.MODES))
+        self.compare_mode_combo.currentTextChanged.connect(self.set_compare_mode)
+        quality_layout.addWidget(self.compare_mode_combo)
+        
+        self.overlay_opacity = QSlider(Qt.Horizontal)
+        self.overlay_opacity.setRange(0, 100)
+        self.overlay_opacity.setValue(50)
+        self.overlay_opacity.setMaximumWidth(120)
+        self.overlay_opacity.setToolTip("叠加模式下原图的不透明度")
+        self.overlay_opacity.setEnabled(False)
+        self.overlay_opacity.valueChanged.connect(self.set_overlay_opacity)
+        quality_layout.addWidget(self.overlay_opacity)
+        
+        # 放大镜
+        self.loupe_checkbox = QCheckBox("放大镜")
+        self.loupe_checkbox.setToolTip("鼠标所在位置的原图和翻译图局部 (Ctrl+L)")
+        self.loupe_checkbox.stateChanged.connect(self.toggle_loupe)
+        quality_layout.addWidget(self.loupe_checkbox)
+        self.loupe_zoom = QComboBox()
+        self.loupe_zoom.addItems(["1:1", "2:1"])
+        self.loupe_zoom.currentIndexChanged.connect(self.set_loupe_zoom)
+        quality_layout.addWidget(self.loupe_zoom)
+        
         right_layout.addLayout(quality_layout)
         
         # 图像视图
         image_splitter = QSplitter(Qt.Horizontal)
+        self.image_splitter = image_splitter
         
         # 原始图像视图
         self.original_scene = QGraphicsScene()
@@ -409,17 +1873,34 @@ class ImageComparisonTool(QMainWindow):
         translated_layout.addWidget(self.translated_view)
         image_splitter.addWidget(self.translated_container)
         
-        # 连接变换同步信号
-        self.original_view.transformChanged.connect(self.translated_view.syncTransform)
-        self.translated_view.transformChanged.connect(self.original_view.syncTransform)
-        
-        # 连接滚动条同步信号
-        self.original_view.scrollBarChanged.connect(self.translated_view.syncScrollBar)
-        self.translated_view.scrollBarChanged.connect(self.original_view.syncScrollBar)
+        # 所有视图通过共享的视图状态同步缩放和滚动
+        self.view_state.attach(self.original_view)
+        self.view_state.attach(self.translated_view)
         
         # 连接标注添加信号
         self.original_view.annotationAdded.connect(self.on_annotation_added)
         self.translated_view.annotationAdded.connect(self.on_annotation_added)
+        self.original_view.annotationChanged.connect(self.on_annotation_changed)
+        self.translated_view.annotationChanged.connect(self.on_annotation_changed)
+        
+        # 连接建议标注的采纳/忽略信号
+        self.translated_view.suggestionAccepted.connect(self.on_suggestion_accepted)
+        self.translated_view.suggestionDismissed.connect(self.on_suggestion_dismissed)
+        
+        # 视图滚动或缩放后更新小地图上的视口（合并为每帧一次）
+        self.minimap_timer = QTimer(self)
+        self.minimap_timer.setSingleShot(True)
+        self.minimap_timer.setInterval(16)
+        self.minimap_timer.timeout.connect(self.update_minimap_viewport)
+        for bar in (self.translated_view.horizontalScrollBar(), self.translated_view.verticalScrollBar()):
+            bar.valueChanged.connect(self.minimap_timer.start)
+            bar.rangeChanged.connect(self.minimap_timer.start)
+        
+        # 放大镜跟随两个视图中的鼠标
+        self.loupe = LoupeWidget(self)
+        for view in (self.original_view, self.translated_view):
+            view.cursorMoved.connect(self.update_loupe)
+            view.cursorLeft.connect(self.loupe.hide)
         
         right_layout.addWidget(image_splitter)
         
@@ -436,27 +1917,177 @@ class ImageComparisonTool(QMainWindow):
         # 设置默认图像质量模式
         self.change_quality_mode("高质量")
     
+    def all_views(self):
+        """原图、翻译图以及所有额外对比版本的视图"""
+        return [self.original_view, self.translated_view] + [pane["view"] for pane in self.compare_panes]
+    
+    def add_compare_folder(self):
+        """选择一个额外的对比版本文件夹，按文件名与当前章节的页面对应"""
+        folder = QFileDialog.getExistingDirectory(self, "选择对比版本文件夹", "")
+        if folder:
+            self.set_compare_folders([pane["folder"] for pane in self.compare_panes] + [folder])
+    
+    def set_compare_folders(self, folders):
+        """重建额外的对比视图"""
+        for pane in self.compare_panes:
+            self.view_state.detach(pane["view"])
+            pane["container"].setParent(None)
+            pane["container"].deleteLater()
+        self.compare_panes = []
+        
+        for folder in folders:
+            if not os.path.isdir(folder):
+                print(f"对比版本文件夹不存在: {folder}")
+                continue
+            scene = QGraphicsScene()
+            view = SyncedGraphicsView(scene)
+            view.setQualityMode(self.quality_mode.currentText())
+            view.min_scale = self.original_view.min_scale
+            view.setTransform(self.original_view.transform())
+            view.current_scale = self.original_view.current_scale
+            view.cursorMoved.connect(self.update_loupe)
+            view.cursorLeft.connect(self.loupe.hide)
+            container = QWidget()
+            layout = QVBoxLayout(container)
+            label = QLabel(f"对比版本: {os.path.basename(folder)}")
+            label.setToolTip(folder)
+            layout.addWidget(label)
+            layout.addWidget(view)
+            self.image_splitter.addWidget(container)
+            self.view_state.attach(view)
+            self.compare_panes.append({"folder": folder, "scene": scene, "view": view,
+                                       "container": container, "label": label, "pixmap_item": None})
+        
+        self.remove_panes_btn.setEnabled(bool(self.compare_panes))
+        if self.loaded_filename is not None:
+            for pane in self.compare_panes:
+                self.load_compare_pane(pane, self.loaded_filename)
+    
+    def load_compare_pane(self, pane, filename):
+        """在对比视图中显示同名页面，缺少该页时显示提示"""
+        pane["scene"].clear()
+        pane["pixmap_item"] = None
+        image = self.image_cache.get(os.path.join(pane["folder"], filename))
+        if image.isNull():
+            pane["label"].setText(f"对比版本: {os.path.basename(pane['folder'])}（缺少 {filename}）")
+            return
+        pane["label"].setText(f"对比版本: {os.path.basename(pane['folder'])}")
+        pane["pixmap_item"] = pane["scene"].addPixmap(QPixmap.fromImage(image))
+        pane["scene"].setSceneRect(0, 0, image.width(), image.height())
+        pane["view"].setSceneRect(pane["scene"].sceneRect())
+    
+    def prefetch_neighbors(self):
+        """在后台解码前后可见页面的所有版本，翻页时直接从缓存显示
+
+        连接审核服务器时改为预取相邻页面的粗略级别图块。
+
+        网络文件夹另外按翻页方向顺序预读后面几页的文件到本地缓存。
+        """
+        paths = []
+        remote = []
+        for direction in (1, -1):
+            row = self.find_visible_row(self.current_index + direction, direction)
+            if row is None:
+                continue
+            original_path, translated_path, filename = self.image_pairs[row]
+            if self.remote_tiles is not None:
+                remote.append(filename)
+            else:
+                paths += [original_path, translated_path]
+            paths += [os.path.join(pane["folder"], filename) for pane in self.compare_panes]
+        self.image_cache.prefetch(paths)
+        if remote:
+            self.remote_tiles.prefetch(remote)
+        
+        ahead = []
+        row = self.current_index
+        for _ in range(share_cache.READ_AHEAD):
+            row = self.find_visible_row(row + 1, 1)
+            if row is None:
+                break
+            original_path, translated_path, filename = self.image_pairs[row]
+            ahead += [original_path, translated_path]
+            ahead += [os.path.join(pane["folder"], filename) for pane in self.compare_panes]
+        share_cache.read_ahead(ahead)
+    
     def change_quality_mode(self, mode):
         """更改图像质量模式"""
-        self.original_view.setQualityMode(mode)
-        self.translated_view.setQualityMode(mode)
+        for view in self.all_views():
+            view.setQualityMode(mode)
         self.status_label.setText(f"图像质量模式已设置为: {mode}")
     
+    def set_compare_mode(self, mode):
+        """切换并排显示或单视图叠加对比"""
+        self.compare_mode = mode
+        self.overlay_opacity.setEnabled(mode == "叠加")
+        self.apply_compare_mode()
+    
+    def apply_compare_mode(self):
+        """按当前对比模式重建翻译视图中的叠加图元"""
+        self.blink_timer.stop()
+        for item in (self.compare_overlay, self.swipe_handle):
+            if item is not None and item.scene() is self.translated_scene:
+                self.translated_scene.removeItem(item)
+        self.compare_overlay = None
+        self.swipe_handle = None
+        
+        overlay_mode = self.compare_mode != "并排"
+        if overlay_mode and self.loaded_filename in self.mismatched_pages:
+            # 尺寸不同的两张图无法逐像素叠加，只能并排查看
+            overlay_mode = False
+            self.status_label.setText(f"{self.loaded_filename} 的两张图尺寸不同，只能并排对比")
+        self.original_container.setVisible(not overlay_mode)
+        if self.translated_pixmap_item is None or self.loaded_filename is None:
+            return
+        self.translated_pixmap_item.setVisible(not overlay_mode)
+        if not overlay_mode:
+            return
+        
+        # 复用已经解码的两张图像
+        self.compare_overlay = CompareOverlayItem(self.original_source, self.translated_source, self.compare_mode)
+        self.compare_overlay.opacity = self.overlay_opacity.value() / 100
+        self.translated_scene.addItem(self.compare_overlay)
+        if self.compare_mode == "滑动":
+            self.swipe_handle = SwipeHandleItem(self.compare_overlay)
+            self.translated_scene.addItem(self.swipe_handle)
+        elif self.compare_mode == "闪烁":
+            self.blink_timer.start()
+    
+    def toggle_loupe(self, state):
+        if not state:
+            self.loupe.hide()
+    
+    def set_loupe_zoom(self, index):
+        self.loupe.zoom = index + 1
+        self.loupe.update()
+    
+    def update_loupe(self, scene_pos, global_pos):
+        """鼠标在任一视图中移动时更新放大镜"""
+        if self.loupe_checkbox.isChecked() and self.loaded_filename is not None:
+            self.loupe.show_at(scene_pos, global_pos)
+    
+    def set_overlay_opacity(self, value):
+        if self.compare_overlay is not None:
+            self.compare_overlay.set_opacity(value / 100)
+    
+    def toggle_blink(self):
+        if self.compare_overlay is not None:
+            self.compare_overlay.toggle_blink()
+    
     def set_min_zoom(self, index):
         """设置最小缩放比例"""
         min_scales = [0.01, 0.1, 0.25, 0.5]  # 对应不限制，10%，25%，50%
         min_scale = min_scales[index]
         
-        self.original_view.min_scale = min_scale
-        self.translated_view.min_scale = min_scale
+        for view in self.all_views():
+            view.min_scale = min_scale
         
         # 如果当前缩放小于新设置的最小值，则调整缩放
         if self.original_view.current_scale < min_scale:
             factor = min_scale / self.original_view.current_scale
-            self.original_view.scale(factor, factor)
-            self.original_view.current_scale = min_scale
-            self.translated_view.scale(factor, factor)
-            self.translated_view.current_scale = min_scale
+            for view in self.all_views():
+                view.scale(factor, factor)
+                view.current_scale = min_scale
     
     def select_annotation_folder(self):
         """选择标注文件保存文件夹"""
@@ -470,6 +2101,22 @@ class ImageComparisonTool(QMainWindow):
         """当添加标注时自动保存图像"""
         self.save_current_annotation(annotation_text)
     
+    def on_annotation_changed(self, description, changes):
+        """标注增删改时记录到历史中"""
+        if self.replaying_history or self.loaded_filename is None:
+            return
+        self.refresh_minimap_markers()
+        view_name = "original" if self.sender() is self.original_view else "translated"
+        with self.history.group(description, self.loaded_filename):
+            self.history.record(description, self.loaded_filename,
+                                [("annotation", view_name, index, old, new) for index, old, new in changes])
+            # 新加或修改了标注的页面需要重新审核
+            if any(new is not None for _, _, new in changes):
+                self.revoke_approval(self.loaded_filename)
+        self.update_search_index(self.loaded_filename)
+        self.status_label.setText(description)
+        print(description)
+    
     def save_current_annotation(self, annotation_text=None):
         """保存当前带标注的图像"""
         if self.current_index < 0 or self.current_index >= len(self.image_pairs):
@@ -538,12 +2185,11 @@ class ImageComparisonTool(QMainWindow):
             print(f"保存标注图像时出错: {str(e)}")
     
     def zoom_in(self):
-        """放大两个视图"""
+        """放大所有视图"""
         factor = 1.2
-        self.original_view.scale(factor, factor)
-        self.original_view.current_scale *= factor
-        self.translated_view.scale(factor, factor)
-        self.translated_view.current_scale *= factor
+        for view in self.all_views():
+            view.scale(factor, factor)
+            view.current_scale *= factor
         
     def zoom_out(self):
         """缩小两个视图"""
@@ -554,33 +2200,31 @@ class ImageComparisonTool(QMainWindow):
         if new_scale < self.original_view.min_scale:
             factor = self.original_view.min_scale / self.original_view.current_scale
             
-        self.original_view.scale(factor, factor)
-        self.original_view.current_scale *= factor
-        self.translated_view.scale(factor, factor)
-        self.translated_view.current_scale *= factor
+        for view in self.all_views():
+            view.scale(factor, factor)
+            view.current_scale *= factor
         
     def reset_views(self):
-        """重置两个视图的缩放和位置"""
+        """重置所有视图的缩放和位置"""
+        views = self.all_views()
         # 重置变换
-        self.original_view.resetTransform()
-        self.original_view.current_scale = 1.0
-        self.translated_view.resetTransform()
-        self.translated_view.current_scale = 1.0
+        for view in views:
+            view.resetTransform()
+            view.current_scale = 1.0
         
         # 重置滚动条位置
-        self.original_view.horizontalScrollBar().setValue(0)
-        self.original_view.verticalScrollBar().setValue(0)
-        self.translated_view.horizontalScrollBar().setValue(0)
-        self.translated_view.verticalScrollBar().setValue(0)
+        for view in views:
+            view.horizontalScrollBar().setValue(0)
+            view.verticalScrollBar().setValue(0)
         
         # 调整视图以适应内容
         if not self.original_scene.items():
             return
             
-        self.original_view.fitInView(self.original_scene.sceneRect(), Qt.KeepAspectRatio)
-        self.original_view.current_scale = self.original_view.transform().m11()
-        self.translated_view.fitInView(self.translated_scene.sceneRect(), Qt.KeepAspectRatio)
-        self.translated_view.current_scale = self.translated_view.transform().m11()
+        for view in views:
+            if view.scene().items():
+                view.fitInView(view.scene().sceneRect(), Qt.KeepAspectRatio)
+                view.current_scale = view.transform().m11()
     
     def select_image_folders(self):
         """选择包含原始图像和翻译图像的文件夹"""
@@ -593,10 +2237,34 @@ class ImageComparisonTool(QMainWindow):
         translated_folder = QFileDialog.getExistingDirectory(self, "选择翻译图像文件夹", "")
         if not translated_folder:
             return
-            
+        self.open_folders(original_folder, translated_folder)
+    
+    def open_folders(self, original_folder, translated_folder, remote_tiles=None):
+        """打开一个章节：有会话时直接恢复，否则扫描文件夹
+
+        remote_tiles 为审核服务器的图块缓存时，页面通过图块显示，不在本机解码整页。
+        """
+        # 切换章节前保存当前章节的会话，并清空上一章节的审核状态
+        self.disconnect_review_server()
+        self.save_session()
+        self.remote_tiles = remote_tiles
+        self.modified_images = set()
+        self.page_annotations = {}
+        self.dismissed_suggestions = {}
+        self.loaded_filename = None
+        self.history.clear()
+        self.set_compare_folders([])
+        
         self.original_folder = original_folder
         self.translated_folder = translated_folder
         
+        # 之前打开过的章节直接从会话恢复，不需要重新扫描
+        session = session_store.load_session(
+            session_store.session_path(original_folder, translated_folder))
+        if session:
+            self.restore_session(session)
+            return
+        
         # 如果没有选择标注文件夹，默认在原始图像文件夹旁边创建"标注"文件夹
         if not self.annotation_folder:
             parent_folder = os.path.dirname(original_folder)
@@ -607,43 +2275,50 @@ class ImageComparisonTool(QMainWindow):
     
     def find_image_pairs(self):
         """在选定的文件夹中查找匹配的图像对"""
+        self.chapter_generation += 1
         self.image_pairs = []
+        self.pair_info = {}
+        self.mismatched_pages = {}
         self.image_list.clear()
         
         if not self.original_folder or not self.translated_folder:
             return
             
-        # 获取原始文件夹中的所有图像文件
-        original_images = [f for f in os.listdir(self.original_folder) 
-                         if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.webp'))]
-        
-        # 获取翻译文件夹中的所有图像文件
-        translated_images = [f for f in os.listdir(self.translated_folder) 
-                           if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.webp'))]
-        
-        # 找出两个文件夹中文件名相同的图像
-        matching_filenames = set(original_images) & set(translated_images)
-        
-        # 创建图像对
-        for filename in sorted(matching_filenames):
-            original_path = os.path.join(self.original_folder, filename)
-            translated_path = os.path.join(self.translated_folder, filename)
-            
-            # 检查图像尺寸是否相同
-            orig_img = QImage(original_path)
-            trans_img = QImage(translated_path)
-            
-            if orig_img.size() == trans_img.size():
-                self.image_pairs.append((original_path, translated_path, filename))
-                self.image_list.addItem(filename)
-            else:
-                print(f"警告: 图像 {filename} 的尺寸不匹配，原始尺寸: {orig_img.size()}, 翻译尺寸: {trans_img.size()}")
+        # 创建图像对（两个文件夹中文件名相同且尺寸相同的图像），只读取文件头获取尺寸
+        # 重新打开章节时重新列出目录，网络文件夹之后的文件状态都来自这次的清单
+        share_cache.invalidate(self.original_folder)
+        share_cache.invalidate(self.translated_folder)
+        pairs, mismatched = pair_images(self.original_folder, self.translated_folder, image_decoders.probe)
+        for original_path, translated_path, filename, (width, height) in pairs:
+            self.image_pairs.append((original_path, translated_path, filename))
+            self.pair_info[filename] = {
+                "size": [width, height],
+                "original": session_store.file_stat(original_path),
+                "translated": session_store.file_stat(translated_path),
+            }
+        # 尺寸不同的页面（例如翻译图被缩小）也列出，标记为“分辨率不同”
+        for filename, original_size, translated_size in mismatched:
+            self.mismatched_pages[filename] = session_store.mismatched_entry(
+                self.original_folder, self.translated_folder, filename, original_size, translated_size)
+            self.image_pairs.append((os.path.join(self.original_folder, filename),
+                                     os.path.join(self.translated_folder, filename), filename))
+            print(f"警告: 图像 {filename} 的尺寸不匹配，原始尺寸: {original_size}, 翻译尺寸: {translated_size}")
+        self.image_pairs.sort(key=lambda pair: pair[2])
+        for _, _, filename in self.image_pairs:
+            self.image_list.addItem(filename)
         
         # 更新状态
         if self.image_pairs:
             self.status_label.setText(f"找到 {len(self.image_pairs)} 对匹配的图像")
-            self.current_index = 0
-            self.image_list.setCurrentRow(0)
+            self.current_index = -1
+            self.load_cached_analysis()
+            self.check_review_ledger()
+            self.start_duplicate_scan()
+            self.start_risk_scan()
+            # 从第一个需要审核的页面开始
+            row = self.find_visible_row(0, 1)
+            self.current_index = row if row is not None else 0
+            self.image_list.setCurrentRow(self.current_index)
             self.load_current_image_pair()
         else:
             self.status_label.setText("未找到匹配的图像对")
@@ -651,6 +2326,918 @@ class ImageComparisonTool(QMainWindow):
         # 更新导航按钮状态
         self.update_navigation()
     
+    def build_session(self):
+        """收集需要保存到会话文件中的审核状态"""
+        self.remember_current_annotations()
+        transform = self.original_view.transform()
+        return {
+            "original_folder": self.original_folder,
+            "translated_folder": self.translated_folder,
+            "annotation_folder": self.annotation_folder,
+            "pairs": [dict(self.pair_info[filename], filename=filename)
+                      for _, _, filename in self.image_pairs if filename in self.pair_info],
+            "mismatched": list(self.mismatched_pages.values()),
+            "current_index": self.current_index,
+            "current_filename": (self.image_pairs[self.current_index][2]
+                                 if 0 <= self.current_index < len(self.image_pairs) else None),
+            "modified_images": sorted(self.modified_images),
+            "page_annotations": self.page_annotations,
+            "dismissed_suggestions": {filename: sorted(keys) for filename, keys
+                                      in self.dismissed_suggestions.items()},
+            "compare_folders": [pane["folder"] for pane in self.compare_panes],
+            "view": {
+                "transform": [transform.m11(), transform.m12(), transform.m13(),
+                              transform.m21(), transform.m22(), transform.m23(),
+                              transform.m31(), transform.m32(), transform.m33()],
+                "original_scroll": [self.original_view.horizontalScrollBar().value(),
+                                    self.original_view.verticalScrollBar().value()],
+                "translated_scroll": [self.translated_view.horizontalScrollBar().value(),
+                                      self.translated_view.verticalScrollBar().value()],
+                "quality_mode": self.quality_mode.currentText(),
+                "min_zoom_index": self.min_zoom.currentIndex(),
+                "changed_only": self.changed_only_checkbox.isChecked(),
+            },
+        }
+    
+    def save_session(self):
+        """保存当前章节的会话文件"""
+        if not self.image_pairs:
+            return
+        try:
+            path = session_store.save_session(self.build_session())
+            print(f"已保存会话: {path}")
+        except OSError as e:
+            print(f"保存会话时出错: {str(e)}")
+        self.save_duplicate_index()
+        self.sync_library_status()
+    
+    def library_connection(self, create=False):
+        """返回资料库连接；资料库还不存在且 create 为False时返回None"""
+        if self.library is None and (create or os.path.exists(library_index.LIBRARY_PATH)):
+            self.library = library_index.connect()
+        return self.library
+    
+    def sync_library_status(self):
+        """把当前章节的“需要修改”和审核状态同步到资料库"""
+        conn = self.library_connection()
+        if conn is None or not self.image_pairs:
+            return
+        try:
+            library_index.update_chapter_status(conn, self.original_folder, self.modified_images, self.unchanged_pages)
+        except library_index.sqlite3.Error as e:
+            print(f"更新资料库时出错: {str(e)}")
+    
+    def open_library(self):
+        """打开资料库浏览器，并在后台增量更新索引"""
+        if self.library_browser is None:
+            self.library_browser = LibraryBrowser(self.library_connection(create=True), self)
+            self.library_browser.chapterRequested.connect(self.open_library_chapter)
+            self.library_browser.annotationRequested.connect(self.open_library_annotation)
+        self.library_browser.refresh()
+        self.library_browser.show()
+        self.library_browser.raise_()
+        self.library_browser.start_indexing()
+    
+    def open_library_chapter(self, original_folder, filename):
+        """根据资料库中的信息直接打开章节，可选地跳到指定页面"""
+        session = library_index.chapter_session(self.library_connection(create=True), original_folder)
+        if session is None:
+            return
+        if os.path.normpath(original_folder) != os.path.normpath(self.original_folder or ""):
+            # 切换章节前保存当前章节的会话
+            self.disconnect_review_server()
+            self.save_session()
+            self.restore_session(session)
+        if filename:
+            row = self.image_list_row(filename)
+            if row >= 0:
+                if self.image_list.isRowHidden(row):
+                    self.changed_only_checkbox.setChecked(False)
+                self.image_list.setCurrentRow(row)
+    
+    def open_library_annotation(self, original_folder, filename, view_name, rect):
+        """打开搜索结果所在的页面，选中并居中显示该标注"""
+        self.open_library_chapter(original_folder, filename)
+        if self.loaded_filename != filename:
+            return
+        view = self.original_view if view_name == "original" else self.translated_view
+        target = QRectF(*rect)
+        for rect_item, _ in view.annotations:
+            if abs(rect_item.rect().x() - target.x()) < 0.5 and abs(rect_item.rect().y() - target.y()) < 0.5:
+                view.set_selection([rect_item])
+                break
+        view.centerOn(target.center())
+        self.activateWindow()
+    
+    def update_search_index(self, filename):
+        """标注变化后只更新这一页的全文索引"""
+        conn = self.library_connection()
+        if conn is None or filename is None:
+            return
+        if filename == self.loaded_filename:
+            self.remember_current_annotations()
+        try:
+            annotation_search.update_page(conn, self.original_folder, filename, self.page_annotations.get(filename, {}))
+        except library_index.sqlite3.Error as e:
+            print(f"更新标注索引时出错: {str(e)}")
+    
+    def connect_review_server(self):
+        """连接审核服务器：下载章节到本地镜像后打开，标注与其他审核人员同步"""
+        url, ok = QInputDialog.getText(self, "连接审核服务器", "服务器地址:",
+                                       text="http://127.0.0.1:8765")
+        if not ok or not url.strip():
+            return
+        client = review_client.ReviewClient(url.strip())
+        try:
+            chapters = client.chapters()
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "连接审核服务器", f"无法连接服务器: {str(e)}")
+            return
+        if not chapters:
+            QMessageBox.information(self, "连接审核服务器", "服务器上没有章节")
+            return
+        names = [chapter["name"] for chapter in chapters]
+        name, ok = QInputDialog.getItem(self, "连接审核服务器", "选择章节:", names, 0, False)
+        if not ok:
+            return
+        client.chapter = name
+        
+        def progress(done, total):
+            self.status_label.setText(f"正在下载章节: {done}/{total}")
+            QApplication.processEvents()
+        
+        try:
+            original_folder, translated_folder = review_client.mirror_chapter(client, progress)
+            client.pull()
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "连接审核服务器", f"下载章节失败: {str(e)}")
+            return
+        
+        self.annotation_folder = default_annotation_folder(original_folder)
+        # 页面显示使用服务器生成的图块，镜像中的原文件只用于画质检查和导出
+        tiles = RemoteTileCache(client, self.tileLoaded.emit)
+        self.open_folders(original_folder, translated_folder, tiles)
+        self.review_client = client
+        # 服务器上的标注为准
+        self.shared_snapshot = {}
+        self.apply_shared_pages({filename for _, _, filename in self.image_pairs})
+        self.review_sync_timer.start()
+        self.status_label.setText(f"已连接审核服务器: {name} ({client.author})")
+    
+    def disconnect_review_server(self):
+        if self.remote_tiles is not None:
+            self.remote_tiles.shutdown()
+            self.remote_tiles = None
+        if self.review_client is None:
+            return
+        client = self.review_client
+        pending = self.pending_shared_pages()
+        self.review_client = None
+        self.review_sync_running = False
+        self.review_sync_timer.stop()
+        if pending:
+            # 最后一次提交不等待结果；不是守护线程，退出程序前会提交完
+            threading.Thread(target=self.push_shared_pages, args=(client, pending, False)).start()
+    
+    def sync_shared_annotations(self):
+        """在后台提交本地修改过的页面标注，再拉取其他审核人员的修改"""
+        client = self.review_client
+        if client is None or self.review_sync_running:
+            return
+        pending = self.pending_shared_pages()
+        self.review_sync_running = True
+        threading.Thread(target=self.push_shared_pages, args=(client, pending, True), daemon=True).start()
+    
+    def pending_shared_pages(self):
+        """本地修改过、还没有提交到服务器的页面标注"""
+        self.remember_current_annotations()
+        empty = {"original": [], "translated": []}
+        pending = {}
+        for filename in set(self.page_annotations) | set(self.shared_snapshot):
+            page = self.page_annotations.get(filename, empty)
+            if page != self.shared_snapshot.get(filename, empty):
+                # 复制一份，后台提交时GUI线程可能继续修改标注
+                pending[filename] = {view: list(page.get(view, [])) for view in ("original", "translated")}
+        return pending
+    
+    def push_shared_pages(self, client, pending, pull):
+        """后台线程：提交页面标注并拉取其他人的修改，结果通过 sharedSynced 交给GUI线程"""
+        pushed = {}
+        changed = set()
+        error = ""
+        with self.review_sync_lock:
+            try:
+                for filename, page in pending.items():
+                    client.push_page(filename, page)
+                    pushed[filename] = page
+                if pull:
+                    changed = {record["filename"] for record in client.pull()}
+            except (OSError, ValueError) as e:
+                error = str(e)
+        # 断开连接后结果不再需要
+        if pull and client is self.review_client:
+            self.sharedSynced.emit(client, pushed, changed, error)
+    
+    def on_shared_synced(self, client, pushed, changed, error):
+        if client is not self.review_client:
+            return
+        self.review_sync_running = False
+        self.shared_snapshot.update(pushed)
+        if error:
+            self.status_label.setText(f"审核服务器同步失败: {error}")
+            return
+        self.apply_shared_pages(changed)
+    
+    def apply_shared_pages(self, filenames):
+        """用共享存储中的标注替换这些页面的本地标注，当前页面有变化时重建显示"""
+        empty = {"original": [], "translated": []}
+        for filename in filenames:
+            page = self.review_client.store.page_annotations(filename)
+            self.shared_snapshot[filename] = page
+            local = self.page_annotations.get(filename, empty)
+            if all(sorted(local.get(view, [])) == sorted(page[view]) for view in ("original", "translated")):
+                continue
+            if page["original"] or page["translated"]:
+                self.page_annotations[filename] = page
+            else:
+                self.page_annotations.pop(filename, None)
+            # 其他人修改后，本页撤销记录中的标注序号已经失效
+            self.history.discard_page(filename)
+            if filename == self.loaded_filename:
+                self.original_view.remove_all_annotations()
+                self.translated_view.remove_all_annotations()
+                self.restore_annotations(filename)
+                self.restore_suggestions(filename)
+            self.update_search_index(filename)
+            row = self.image_list_row(filename)
+            if row >= 0:
+                self.update_list_item(row)
+    
+    def restore_last_session(self):
+        """启动时恢复最近一次的会话"""
+        path = session_store.latest_session_path()
+        session = session_store.load_session(path) if path else None
+        if session:
+            self.restore_session(session)
+    
+    def restore_session(self, session):
+        """直接根据会话中的配对和尺寸信息恢复审核状态，不重新扫描文件夹"""
+        self.chapter_generation += 1
+        generation = self.chapter_generation
+        self.original_folder = session["original_folder"]
+        self.translated_folder = session["translated_folder"]
+        self.annotation_folder = session["annotation_folder"]
+        self.modified_images = set(session["modified_images"])
+        self.page_annotations = {
+            filename: {name: [tuple(a) for a in items] for name, items in data.items()}
+            for filename, data in session["page_annotations"].items()
+        }
+        self.dismissed_suggestions = {filename: set(keys) for filename, keys
+                                      in session.get("dismissed_suggestions", {}).items()}
+        self.loaded_filename = None
+        self.history.clear()
+        
+        self.image_pairs = []
+        self.pair_info = {}
+        self.mismatched_pages = {entry["filename"]: entry for entry in session.get("mismatched", [])}
+        self.current_index = -1
+        self.image_list.clear()
+        
+        self.set_compare_folders(session.get("compare_folders", []))
+        view = session["view"]
+        self.quality_mode.setCurrentText(view["quality_mode"])
+        self.min_zoom.setCurrentIndex(view["min_zoom_index"])
+        self.changed_only_checkbox.setChecked(view["changed_only"])
+        
+        filenames = []
+        for pair in session["pairs"]:
+            filenames.append(pair["filename"])
+            self.pair_info[pair["filename"]] = {key: pair[key] for key in ("size", "original", "translated")}
+        # 尺寸不同的页面插在文件名顺序中的位置
+        for filename in sorted(self.mismatched_pages):
+            position = next((i for i, other in enumerate(filenames) if other > filename), len(filenames))
+            filenames.insert(position, filename)
+        for filename in filenames:
+            self.image_pairs.append((os.path.join(self.original_folder, filename),
+                                     os.path.join(self.translated_folder, filename),
+                                     filename))
+            self.image_list.addItem(filename)
+        
+        if self.image_pairs:
+            self.load_cached_analysis()
+            self.check_review_ledger()
+            self.start_duplicate_scan()
+            self.start_risk_scan()
+            current = session.get("current_filename")
+            self.current_index = (filenames.index(current) if current in filenames
+                                  else min(max(session["current_index"], 0), len(self.image_pairs) - 1))
+            self.image_list.setCurrentRow(self.current_index)
+            if self.loaded_filename is None:
+                self.load_current_image_pair()
+            self.apply_view_state(view)
+        self.update_navigation()
+        
+        self.status_label.setText(f"已恢复会话: {os.path.basename(self.original_folder)} "
+                                  f"({len(self.image_pairs)} 对图像)")
+        print(f"已恢复会话: {self.original_folder} | {self.translated_folder}")
+        
+        # 在后台检查文件系统是否与会话一致
+        def validate():
+            problems = session_store.validate_session(session)
+            if generation == self.chapter_generation:
+                self.sessionValidated.emit(generation, problems)
+        
+        threading.Thread(target=validate, daemon=True).start()
+    
+    def apply_view_state(self, view):
+        """恢复两个视图的变换矩阵和滚动位置，没有记录时保持适应窗口"""
+        if view.get("transform") is None:
+            return
+        transform = QTransform(*view["transform"])
+        for v in self.all_views():
+            v.is_syncing = True
+            v.setTransform(transform)
+            v.current_scale = transform.m11()
+            v.is_syncing = False
+        
+        # 等布局完成后再设置滚动条，否则滚动范围还没有更新
+        def apply_scroll():
+            for v, key in ((self.original_view, "original_scroll"), (self.translated_view, "translated_scroll")):
+                v.is_syncing = True
+                v.horizontalScrollBar().setValue(view[key][0])
+                v.verticalScrollBar().setValue(view[key][1])
+                v.is_syncing = False
+            for pane in self.compare_panes:
+                for orientation, bar in (("horizontal", self.original_view.horizontalScrollBar()),
+                                         ("vertical", self.original_view.verticalScrollBar())):
+                    pane["view"].syncScrollBar(orientation, bar.value(), bar.maximum())
+        QTimer.singleShot(0, apply_scroll)
+    
+    def on_session_validated(self, generation, problems):
+        """后台会话校验完成后，如果文件夹内容有变化则提示重新扫描"""
+        if generation != self.chapter_generation:
+            # 校验期间已经打开了其他章节
+            return
+        if not problems:
+            print("会话校验完成，文件夹内容未变化")
+            return
+            
+        for problem in problems:
+            print(f"会话校验: {problem}")
+        self.status_label.setText(f"图像文件夹内容已变化（{len(problems)} 处），建议重新扫描")
+        reply = QMessageBox.question(
+            self, "文件夹内容已变化",
+            f"自上次会话以来，图像文件夹有 {len(problems)} 处变化：\n"
+            + "\n".join(problems[:10])
+            + ("\n..." if len(problems) > 10 else "")
+            + "\n\n是否重新扫描图像对？（审核状态和标注会保留）",
+            QMessageBox.Yes | QMessageBox.No)
+        if reply == QMessageBox.Yes:
+            self.find_image_pairs()
+    
+    def closeEvent(self, event):
+        """关闭窗口时保存会话"""
+        self.chapter_generation += 1  # 忽略还没完成的哈希和会话校验
+        self.risk_generation += 1  # 停止后台差异分析，正在分析的一批完成后线程不再发信号
+        self.duplicate_generation += 1
+        self.disconnect_review_server()
+        self.save_session()
+        self.image_cache.shutdown()
+        share_cache.shutdown()
+        if self.leak_tracker:
+            self.leak_tracker.report()
+            print("\n".join(image_decoders.report()))
+        super().closeEvent(event)
+    
+    def diagnostic_counts(self):
+        """返回场景图元和标注记录的数量，用于内存泄漏诊断"""
+        return {
+            "original_scene_items": len(self.original_scene.items()),
+            "translated_scene_items": len(self.translated_scene.items()),
+            "original_annotations": len(self.original_view.annotations),
+            "translated_annotations": len(self.translated_view.annotations),
+            "original_index": len(self.original_view.annotation_index),
+            "translated_index": len(self.translated_view.annotation_index),
+        }
+    
+    def check_review_ledger(self):
+        """读取本章节的审核记录，在后台计算翻译图像的内容哈希
+        
+        整章的哈希要读取所有翻译图像，在网络文件夹上可能需要很久，不阻塞界面；
+        计算完成前所有页面都按需要审核显示。
+        """
+        self.ledger_path = review_ledger.ledger_path(self.annotation_folder, self.original_folder)
+        self.review_ledger = review_ledger.load_ledger(self.ledger_path)
+        self.page_hashes = {}
+        self.unchanged_pages = set()
+        
+        generation = self.chapter_generation
+        paths = {filename: translated_path for _, translated_path, filename in self.image_pairs}
+        # 后台只读取记录的副本，界面线程可以同时修改记录
+        ledger = {"pages": {filename: dict(record) for filename, record in self.review_ledger["pages"].items()}}
+        def work():
+            hashes = review_ledger.hash_pages(paths, ledger)
+            # 关闭窗口或切换章节后不再发信号
+            if generation == self.chapter_generation:
+                self.hashesReady.emit(generation, hashes)
+        
+        threading.Thread(target=work, daemon=True).start()
+        self.status_label.setText(f"找到 {len(self.image_pairs)} 对匹配的图像，正在检查审核记录…")
+        print(f"审核记录: {self.ledger_path}, 正在计算翻译图像哈希")
+    
+    def on_hashes_ready(self, generation, hashes):
+        """翻译图像哈希计算完成后找出已通过且内容未变化的页面"""
+        if generation != self.chapter_generation or self.review_ledger is None:
+            return
+        # 计算期间通过审核的页面已经有最新的哈希
+        hashes.update(self.page_hashes)
+        self.page_hashes = hashes
+        self.unchanged_pages = review_ledger.unchanged_approved(self.review_ledger, self.page_hashes)
+        # 重复页的审核结果要等哈希才能沿用
+        self.apply_duplicate_carries()
+        
+        for row, (_, _, filename) in enumerate(self.image_pairs):
+            self.update_list_item(row)
+        self.apply_review_filter()
+        
+        changed = len(self.image_pairs) - len(self.unchanged_pages)
+        self.status_label.setText(f"找到 {len(self.image_pairs)} 对匹配的图像，"
+                                  f"其中 {changed} 页需要审核（{len(self.unchanged_pages)} 页已通过且未变化）")
+        print(f"审核记录: {self.ledger_path}, 未变化的已通过页面: {len(self.unchanged_pages)}")
+    
+    def update_list_item(self, row):
+        """根据审核状态和画质检查结果更新图像列表中的条目"""
+        _, _, filename = self.image_pairs[row]
+        record = self.review_ledger["pages"].get(filename, {}) if self.review_ledger else {}
+        carried_from = record.get("carried_from") if filename in self.unchanged_pages else None
+        prefix = ("≈ " if carried_from else "✓ ") if filename in self.unchanged_pages else ""
+        spot_check = self.spot_check_pages.get(filename) if filename not in self.unchanged_pages else None
+        if spot_check:
+            prefix += "? "
+        quality = self.quality_results.get(filename)
+        if quality and quality["issues"]:
+            prefix += "⚠ "
+        suggestions = self.active_suggestions(filename)
+        if suggestions:
+            prefix += "✎ "
+        
+        tips = []
+        if carried_from:
+            tips.append(f"审核结果沿用自重复页: {carried_from}")
+        if spot_check:
+            tips.append(f"重复页 {spot_check} 已通过，但翻译图内容不同，需要抽查")
+        if quality and quality["issues"]:
+            tips.append("画质问题: " + "、".join(quality["issues"]))
+        mismatched = self.mismatched_pages.get(filename)
+        if mismatched:
+            sizes = ["x".join(map(str, size)) if size else "无法读取"
+                     for size in (mismatched["original_size"], mismatched["translated_size"])]
+            tips.append(f"原图 {sizes[0]}，翻译图 {sizes[1]}，只能并排对比")
+        if suggestions:
+            tips.append(f"自动检测建议: {len(suggestions)} 处，最高置信度 {suggestions[0]['confidence']:.0%}")
+        diff = self.diff_results.get(filename)
+        if diff:
+            tips.append(f"差异面积: {diff['area']:.1%}")
+        if tips:
+            tips.append(f"风险分数: {self.page_risk(filename):.2f}")
+        item = self.image_list.item(row)
+        item.setText(prefix + filename)
+        item.setToolTip("\n".join(tips))
+    
+    def comparable_pairs(self):
+        """尺寸相同、可以运行自动检查和叠加对比的图像对"""
+        return [pair for pair in self.image_pairs if pair[2] not in self.mismatched_pages]
+    
+    def add_size_mismatch_results(self):
+        """把尺寸不同的页面作为“分辨率不同”加入画质检查结果，按画质问题或风险排序时排在最前"""
+        self.quality_results.update(quality_check.size_mismatch_results(
+            [(filename, entry["original_size"], entry["translated_size"])
+             for filename, entry in self.mismatched_pages.items()]))
+    
+    def load_cached_analysis(self):
+        """读取缓存中仍然有效的自动检查结果"""
+        pairs = self.comparable_pairs()
+        cache = quality_check.load_cache(
+            quality_check.cache_path(self.annotation_folder, self.original_folder))
+        self.quality_results, _ = quality_check.split_cached(pairs, cache)
+        self.add_size_mismatch_results()
+        
+        self.page_suggestions = {}
+        self.set_suggestions("overflow", overflow_check.cached_overflow_results(
+            pairs, self.annotation_folder, self.original_folder))
+        self.set_suggestions("residue", residue_check.cached_residue_results(
+            pairs, self.annotation_folder, self.original_folder))
+    
+    @staticmethod
+    def suggestion_key(data):
+        """建议标注的唯一键，用于记住已忽略或已采纳的建议"""
+        return f"{data['source']}:{data['kind']}:" + ",".join(str(v) for v in data["rect"])
+    
+    def set_suggestions(self, source, results):
+        """用某个检测的新结果替换该来源之前的建议，results 为 {文件名: [建议]}"""
+        for filename in set(self.page_suggestions) | set(results):
+            kept = [d for d in self.page_suggestions.get(filename, []) if d["source"] != source]
+            kept += results.get(filename, [])
+            if kept:
+                self.page_suggestions[filename] = kept
+            else:
+                self.page_suggestions.pop(filename, None)
+        if self.loaded_filename:
+            self.restore_suggestions(self.loaded_filename)
+    
+    def active_suggestions(self, filename):
+        """返回页面上未被忽略或采纳的建议，按置信度从高到低排列"""
+        dismissed = self.dismissed_suggestions.get(filename, set())
+        active = [d for d in self.page_suggestions.get(filename, []) if self.suggestion_key(d) not in dismissed]
+        active.sort(key=lambda d: d["confidence"], reverse=True)
+        return active
+    
+    def restore_suggestions(self, filename):
+        """在翻译视图中显示页面的建议标注，置信度高的显示在上层"""
+        self.translated_view.clear_suggestions()
+        for data in reversed(self.active_suggestions(filename)):
+            self.translated_view.add_suggestion(data)
+        self.refresh_minimap_markers()
+    
+    def on_suggestion_accepted(self, data):
+        """把建议转为正式标注，可以撤销"""
+        if self.loaded_filename is None:
+            return
+        filename = self.loaded_filename
+        entry = tuple(data["rect"]) + (data["text"],)
+        self.translated_view.add_annotation(QRectF(*data["rect"]), data["text"])
+        index = len(self.translated_view.annotations) - 1
+        key = self.suggestion_key(data)
+        # 撤销时标注被删除，建议重新显示
+        self.history.record("采纳建议标注", filename, [("annotation", "translated", index, None, entry),
+                                                     ("suggestion", key, False, True)])
+        self.update_search_index(filename)
+        self.dismissed_suggestions.setdefault(filename, set()).add(key)
+        self.translated_view.remove_suggestion(data)
+        self.refresh_minimap_markers()
+        self.update_list_item(self.current_index)
+        self.on_annotation_added(data["text"])
+    
+    def on_suggestion_dismissed(self, data):
+        """忽略建议，之后重新检测也不再显示"""
+        if self.loaded_filename is None:
+            return
+        self.dismissed_suggestions.setdefault(self.loaded_filename, set()).add(self.suggestion_key(data))
+        self.translated_view.remove_suggestion(data)
+        self.refresh_minimap_markers()
+        self.update_list_item(self.current_index)
+        self.status_label.setText(f"已忽略建议: {data['text']}")
+    
+    def run_suggestion_check(self, title, source, run_checks):
+        """运行一种产生建议标注的检测，run_checks 为 xxx_check.run_xxx_checks 函数"""
+        if not self.image_pairs:
+            QMessageBox.warning(self, title, "没有图像可检查")
+            return
+            
+        def progress(done, total):
+            self.status_label.setText(f"{title}中: {done}/{total}")
+            QApplication.processEvents()
+        
+        try:
+            results = run_checks(self.comparable_pairs(), self.annotation_folder, self.original_folder,
+                                 progress=progress)
+        except ImportError as e:
+            QMessageBox.warning(self, title, f"{title}需要 numpy、Pillow 以及 OpenCV 或 SciPy: {str(e)}")
+            return
+        
+        self.set_suggestions(source, results)
+        for row in range(len(self.image_pairs)):
+            self.update_list_item(row)
+        if self.sort_mode.currentText() == "风险":
+            self.sort_image_list("风险")
+        
+        pages = sum(1 for items in results.values() if items)
+        self.status_label.setText(f"{title}完成: {pages} 页发现可疑位置（右键建议框可采纳或忽略）")
+        print(f"{title}完成: {len(results)} 页, 可疑页面 {pages}")
+    
+    def run_overflow_check(self):
+        """检测嵌字溢出气泡或被分格/页面裁切，结果作为建议标注显示"""
+        self.run_suggestion_check("排版溢出检查", "overflow", overflow_check.run_overflow_checks)
+    
+    def run_residue_check(self):
+        """检测没有擦干净的原文笔画，结果按置信度作为建议标注显示"""
+        self.run_suggestion_check("清理残留检查", "residue", residue_check.run_residue_checks)
+    
+    def run_quality_check(self):
+        """对本章节所有图像对运行画质检查，只分析有变化的页面"""
+        if not self.image_pairs:
+            QMessageBox.warning(self, "画质检查", "没有图像可检查")
+            return
+            
+        def progress(done, total):
+            self.status_label.setText(f"画质检查中: {done}/{total}")
+            QApplication.processEvents()
+        
+        try:
+            self.quality_results = quality_check.run_quality_checks(
+                self.comparable_pairs(), self.annotation_folder, self.original_folder, progress=progress)
+        except ImportError as e:
+            QMessageBox.warning(self, "画质检查", f"画质检查需要 numpy 和 Pillow: {str(e)}")
+            return
+        self.add_size_mismatch_results()
+        
+        for row in range(len(self.image_pairs)):
+            self.update_list_item(row)
+        if self.sort_mode.currentText() != "文件名":
+            self.sort_image_list(self.sort_mode.currentText())
+        
+        flagged = sum(1 for result in self.quality_results.values() if result["issues"])
+        self.status_label.setText(f"画质检查完成: {flagged} 页可能存在画质下降")
+        print(f"画质检查完成: {len(self.quality_results)} 页, 问题页面 {flagged}")
+    
+    def run_all_checks(self):
+        """运行所有已登记的自动检查，每页的图像只解码一次，各项检查共用中间结果"""
+        if not self.image_pairs:
+            QMessageBox.warning(self, "全部检查", "没有图像可检查")
+            return
+        
+        def progress(done, total):
+            self.status_label.setText(f"自动检查中: {done}/{total}")
+            QApplication.processEvents()
+        
+        try:
+            results = check_scheduler.run_checks(self.comparable_pairs(), self.annotation_folder,
+                                                 self.original_folder, progress=progress)
+        except ImportError as e:
+            QMessageBox.warning(self, "全部检查", f"自动检查需要 numpy、Pillow 以及 OpenCV 或 SciPy: {str(e)}")
+            return
+        
+        self.quality_results = results.get("quality", self.quality_results)
+        self.add_size_mismatch_results()
+        self.diff_results.update(results.get("diff", {}))
+        for source in ("overflow", "residue"):
+            if source in results:
+                self.set_suggestions(source, results[source])
+        for row in range(len(self.image_pairs)):
+            self.update_list_item(row)
+        if self.sort_mode.currentText() != "文件名":
+            self.sort_image_list(self.sort_mode.currentText())
+        
+        flagged = sum(1 for result in self.quality_results.values() if result["issues"])
+        pages = sum(1 for filename in self.page_suggestions if self.active_suggestions(filename))
+        self.status_label.setText(f"全部检查完成: 画质问题 {flagged} 页, 建议标注 {pages} 页")
+        print(f"全部检查完成: {', '.join(sorted(results))}")
+    
+    def sort_image_list(self, mode):
+        """按文件名、画质问题严重程度或风险分数排序图像列表"""
+        if mode == "画质问题":
+            def key(pair):
+                result = self.quality_results.get(pair[2])
+                return (-(result["score"] if result else 0.0), pair[2])
+        elif mode == "风险":
+            def key(pair):
+                return (-self.page_risk(pair[2]), pair[2])
+        else:
+            def key(pair):
+                return pair[2]
+        self.reorder_image_pairs(key)
+    
+    def page_risk(self, filename):
+        """页面的风险分数，已通过且未变化的页面为0"""
+        if filename in self.unchanged_pages:
+            return 0.0
+        return triage.risk_score(self.diff_results.get(filename), self.quality_results.get(filename),
+                                 self.active_suggestions(filename))
+    
+    def start_risk_scan(self):
+        """打开章节时在后台计算每页的差异面积，结果逐页通过信号返回"""
+        self.risk_generation += 1
+        generation = self.risk_generation
+        self.diff_results = {}
+        pairs = self.comparable_pairs()
+        annotation_folder, original_folder = self.annotation_folder, self.original_folder
+        
+        def cancelled():
+            return generation != self.risk_generation
+        
+        def on_result(filename, result):
+            # 关闭窗口后不再向已销毁的窗口发信号
+            if not cancelled():
+                self.riskUpdated.emit(generation, filename, result)
+        
+        def scan():
+            try:
+                triage.run_diff_scan(pairs, annotation_folder, original_folder,
+                                     on_result=on_result, cancelled=cancelled)
+            except ImportError as e:
+                print(f"差异分析需要 numpy 和 Pillow: {str(e)}")
+            except OSError as e:
+                print(f"差异分析失败: {str(e)}")
+            if not cancelled():
+                self.riskScanFinished.emit(generation)
+        
+        threading.Thread(target=scan, daemon=True).start()
+    
+    def start_duplicate_scan(self):
+        """在后台更新本章节在重复页索引中的指纹，并找出可以沿用审核结果的页面"""
+        self.duplicate_generation += 1
+        generation = self.duplicate_generation
+        self.duplicate_index = None
+        self.duplicate_carries = {}
+        self.spot_check_pages = {}
+        pairs = self.comparable_pairs()
+        path = duplicate_index.index_path(self.annotation_folder)
+        chapter = analysis_cache.chapter_name(self.original_folder)
+        
+        def scan():
+            try:
+                index = duplicate_index.load_index(path)
+                index.update_chapter(chapter, pairs)
+            except ImportError as e:
+                print(f"重复页检测需要 Pillow: {str(e)}")
+                return
+            carries = {}
+            for _, _, filename in pairs:
+                source = index.carry_over_source(chapter, filename)
+                if source:
+                    carries[filename] = source
+            # 关闭窗口或切换章节后不再发信号
+            if generation == self.duplicate_generation:
+                self.duplicatesReady.emit(generation, index, carries)
+        
+        threading.Thread(target=scan, daemon=True).start()
+    
+    def on_duplicates_ready(self, generation, index, carries):
+        """把重复页的审核结果和标注沿用到本章节还没有审核的页面"""
+        if generation != self.duplicate_generation:
+            return
+        self.duplicate_index = index
+        self.duplicate_carries = carries
+        self.apply_duplicate_carries()
+    
+    def apply_duplicate_carries(self):
+        """沿用重复页的标注；审核结果只在翻译图内容哈希相同时沿用，否则标记为需要抽查
+        
+        翻译图哈希在后台计算完成后会再次调用。每页的标注只沿用一次（记录在重复页索引中），
+        审核人员删除沿用的标注后不会再次出现。
+        """
+        index = self.duplicate_index
+        if index is None:
+            return
+        chapter = analysis_cache.chapter_name(self.original_folder)
+        approved = []
+        annotated = []
+        self.spot_check_pages = {}
+        for filename, source_key in self.duplicate_carries.items():
+            source = index.pages.get(source_key)
+            if source is None:
+                continue
+            view_has_annotations = filename == self.loaded_filename and (
+                self.original_view.annotations or self.translated_view.annotations)
+            if (source["annotations"] and filename not in self.page_annotations and not view_has_annotations
+                    and not index.annotations_carried(chapter, filename)):
+                index.mark_annotations_carried(chapter, filename, source_key)
+                self.page_annotations[filename] = {view: [list(entry) for entry in source["annotations"].get(view, [])]
+                                                   for view in ("original", "translated")}
+                if filename == self.loaded_filename:
+                    self.restore_annotations(filename)
+                annotated.append(filename)
+            if not source["approved"] or filename in self.unchanged_pages:
+                continue
+            info = self.page_hashes.get(filename)
+            if info and source.get("digest") == info["digest"] and self.review_ledger is not None:
+                review_ledger.approve(self.review_ledger, filename, info)
+                self.review_ledger["pages"][filename]["carried_from"] = source_key
+                self.unchanged_pages.add(filename)
+                approved.append(filename)
+            else:
+                # 缩略图近似不代表内容相同（可能只改了一个字），不自动通过
+                self.spot_check_pages[filename] = source_key
+        
+        if approved:
+            try:
+                review_ledger.save_ledger(self.ledger_path, self.review_ledger)
+            except OSError as e:
+                print(f"保存审核记录时出错: {str(e)}")
+        self.save_duplicate_index()
+        if approved or annotated or self.spot_check_pages:
+            for row in range(len(self.image_pairs)):
+                self.update_list_item(row)
+            self.apply_review_filter()
+            self.status_label.setText(f"重复页: {len(approved)} 页沿用了审核结果，{len(annotated)} 页沿用了标注，"
+                                      f"{len(self.spot_check_pages)} 页需要抽查")
+        print(f"重复页索引: {len(index.pages)} 页, 沿用审核结果 {len(approved)} 页, 沿用标注 {len(annotated)} 页, "
+              f"需要抽查 {len(self.spot_check_pages)} 页")
+    
+    def save_duplicate_index(self):
+        """把本章节的审核结果和标注写入重复页索引"""
+        if self.duplicate_index is None or not self.image_pairs:
+            return
+        chapter = analysis_cache.chapter_name(self.original_folder)
+        for _, _, filename in self.image_pairs:
+            self.duplicate_index.record_review(chapter, filename, filename in self.unchanged_pages,
+                                               self.page_annotations.get(filename),
+                                               self.page_hashes.get(filename, {}).get("digest"))
+        try:
+            duplicate_index.save_index(duplicate_index.index_path(self.annotation_folder), self.duplicate_index)
+        except OSError as e:
+            print(f"保存重复页索引时出错: {str(e)}")
+    
+    def on_risk_updated(self, generation, filename, result):
+        """收到一页差异分析结果，更新列表项，风险排序时稍后重新排序"""
+        if generation != self.risk_generation:
+            return
+        self.diff_results[filename] = result
+        row = self.image_list_row(filename)
+        if row >= 0:
+            self.update_list_item(row)
+        # 结果陆续到达时合并排序，避免列表不停跳动
+        if self.sort_mode.currentText() == "风险" and not self.risk_resort_pending:
+            self.risk_resort_pending = True
+            QTimer.singleShot(500, self.resort_by_risk)
+    
+    def resort_by_risk(self):
+        self.risk_resort_pending = False
+        if self.sort_mode.currentText() == "风险":
+            self.sort_image_list("风险")
+    
+    def on_risk_scan_finished(self, generation):
+        if generation != self.risk_generation:
+            return
+        if self.sort_mode.currentText() == "风险":
+            self.resort_by_risk()
+        print(f"差异分析完成: {len(self.diff_results)} 页")
+    
+    def reorder_image_pairs(self, key):
+        """重新排列图像对和图像列表，保持当前页面不变
+
+        图像列表的行号始终与 image_pairs 中的序号一致。
+        """
+        if not self.image_pairs:
+            return
+        current = self.image_pairs[self.current_index][2] if 0 <= self.current_index < len(self.image_pairs) else None
+        self.image_pairs.sort(key=key)
+        
+        self.image_list.blockSignals(True)
+        self.image_list.clear()
+        for row, (_, _, filename) in enumerate(self.image_pairs):
+            self.image_list.addItem(filename)
+            self.update_list_item(row)
+            if filename == current:
+                self.current_index = row
+        self.image_list.setCurrentRow(self.current_index)
+        self.image_list.blockSignals(False)
+        
+        self.apply_review_filter()
+    
+    def apply_review_filter(self, state=None):
+        """根据“只显示有变化的页面”隐藏已通过且未变化的页面"""
+        changed_only = self.changed_only_checkbox.isChecked()
+        for row, (_, _, filename) in enumerate(self.image_pairs):
+            self.image_list.setRowHidden(row, changed_only and filename in self.unchanged_pages)
+        
+        # 当前页被隐藏时跳到第一个需要审核的页面
+        if 0 <= self.current_index < len(self.image_pairs) and self.image_list.isRowHidden(self.current_index):
+            row = self.find_visible_row(0, 1)
+            if row is not None:
+                self.image_list.setCurrentRow(row)
+        self.update_navigation()
+    
+    def find_visible_row(self, start, step):
+        """从start开始按step方向查找第一个未被隐藏的行"""
+        row = start
+        while 0 <= row < len(self.image_pairs):
+            if not self.image_list.isRowHidden(row):
+                return row
+            row += step
+        return None
+    
+    def approve_current_page(self):
+        """把当前页按当前内容记为已通过审核"""
+        if self.current_index < 0 or self.current_index >= len(self.image_pairs) or self.review_ledger is None:
+            return
+            
+        _, translated_path, filename = self.image_pairs[self.current_index]
+        old_record = self.review_ledger["pages"].get(filename)
+        old_record = dict(old_record) if old_record else None
+        try:
+            info = review_ledger.file_digest(translated_path, self.page_hashes.get(filename))
+            self.page_hashes[filename] = info
+            review_ledger.approve(self.review_ledger, filename, info)
+            review_ledger.save_ledger(self.ledger_path, self.review_ledger)
+        except OSError as e:
+            QMessageBox.warning(self, "保存失败", f"保存审核记录时出错: {str(e)}")
+            return
+        
+        with self.history.group("通过审核", filename):
+            self.history.record("通过审核", filename,
+                                [("approval", old_record, dict(self.review_ledger["pages"][filename]))])
+            # 通过的页面不再需要修改
+            self.modified_checkbox.setChecked(False)
+        self.unchanged_pages.add(filename)
+        self.update_list_item(self.current_index)
+        self.status_label.setText(f"已通过: {filename}")
+        print(f"标记图像为已通过: {filename}")
+        
+        # 自动前往下一个需要审核的页面
+        if self.changed_only_checkbox.isChecked():
+            self.apply_review_filter()
+    
     def on_image_selected(self, row):
         """当在列表中选择图像时调用"""
         if row >= 0 and row < len(self.image_pairs):
@@ -658,6 +3245,85 @@ class ImageComparisonTool(QMainWindow):
             self.load_current_image_pair()
             self.update_navigation()
     
+    def remember_current_annotations(self):
+        """把当前页面的标注保存到每页标注数据中，切换页面时不会丢失"""
+        if self.loaded_filename is None:
+            return
+            
+        data = {
+            "original": self.original_view.annotation_data(),
+            "translated": self.translated_view.annotation_data(),
+        }
+        if data["original"] or data["translated"]:
+            self.page_annotations[self.loaded_filename] = data
+        else:
+            self.page_annotations.pop(self.loaded_filename, None)
+    
+    def restore_annotations(self, filename):
+        """在当前场景中重建指定页面保存的标注"""
+        data = self.page_annotations.get(filename, {})
+        for x, y, w, h, text in data.get("original", []):
+            self.original_view.add_annotation(QRectF(x, y, w, h), text)
+        for x, y, w, h, text in data.get("translated", []):
+            self.translated_view.add_annotation(QRectF(x, y, w, h), text)
+        self.refresh_minimap_markers()
+    
+    def page_thumbnail(self, path, source):
+        """页面的缩略图，连接审核服务器时使用最粗一级的图块"""
+        if isinstance(source, TiledPage):
+            return source.overview(DecodedImageCache.THUMB_SIZE)
+        return self.image_cache.thumbnail(path)
+    
+    def load_minimap(self, original_path, translated_path, page_size):
+        """用缓存的缩略图更新小地图，两张缩略图的差异块标为热点"""
+        original = self.page_thumbnail(original_path, self.original_source)
+        translated = self.page_thumbnail(translated_path, self.translated_source)
+        self.minimap.set_page(translated, page_size, diff_hotspots(original, translated, page_size.width()))
+        self.refresh_minimap_markers()
+        self.minimap_timer.start()
+    
+    def refresh_minimap_markers(self):
+        """在小地图上标出两个视图中的标注（红色）和翻译视图中的建议（橙色）"""
+        markers = [(rect_item.rect(), QColor(255, 0, 0))
+                   for view in (self.original_view, self.translated_view)
+                   for rect_item, _ in view.annotations]
+        markers += [(rect_item.rect(), QColor(255, 140, 0)) for rect_item, _, _ in self.translated_view.suggestions]
+        self.minimap.set_markers(markers)
+    
+    def update_minimap_viewport(self):
+        view = self.translated_view
+        self.minimap.set_viewport(view.mapToScene(view.viewport().rect()).boundingRect())
+    
+    def on_minimap_navigate(self, pos):
+        """把翻译视图的中心移到小地图上点击的位置，其他视图通过视图状态跟随"""
+        self.translated_view.centerOn(pos)
+    
+    def page_source(self, path, filename, side):
+        """当前页面一侧的图像：连接审核服务器时为 TiledPage，否则为解码后的 QPixmap"""
+        if self.remote_tiles is not None:
+            page = self.remote_tiles.page(filename, side)
+            if page is not None:
+                return page
+        return QPixmap.fromImage(self.image_cache.get(path))
+    
+    @staticmethod
+    def add_page_item(scene, source):
+        if isinstance(source, TiledPage):
+            item = TiledPageItem(source)
+            scene.addItem(item)
+            return item
+        return scene.addPixmap(source)
+    
+    def on_tile_loaded(self, filename, side):
+        """图块下载完成后重绘当前页面中用到它的图元和放大镜"""
+        if filename != self.loaded_filename:
+            return
+        item = self.original_pixmap_item if side == "original" else self.translated_pixmap_item
+        for target in (item, self.compare_overlay):
+            if target is not None:
+                target.update()
+        self.loupe.update()
+    
     def load_current_image_pair(self):
         """加载当前选择的图像对"""
         if self.current_index < 0 or self.current_index >= len(self.image_pairs):
@@ -665,37 +3331,57 @@ class ImageComparisonTool(QMainWindow):
             
         original_path, translated_path, filename = self.image_pairs[self.current_index]
         
+        # 切换前保存上一页的标注
+        self.remember_current_annotations()
+        self.loaded_filename = None
+        
         try:
-            # 加载原始图像 - 使用高质量设置
-            original_pixmap = QPixmap(original_path)
+            # 加载原始图像 - 使用高质量设置（相邻页面已在后台解码）
+            original_pixmap = self.page_source(original_path, filename, "original")
             if original_pixmap.isNull():
                 self.status_label.setText(f"无法加载原始图像: {filename}")
                 return
+            
+            # 场景清空时会删除叠加图元
+            self.compare_overlay = None
+            self.swipe_handle = None
+            self.blink_timer.stop()
                 
             self.original_scene.clear()
-            self.original_scene.addPixmap(original_pixmap)
+            self.original_source = original_pixmap
+            self.original_pixmap_item = self.add_page_item(self.original_scene, original_pixmap)
             self.original_scene.setSceneRect(0, 0, original_pixmap.width(), original_pixmap.height())
             
             # 加载翻译图像 - 使用高质量设置
-            translated_pixmap = QPixmap(translated_path)
+            translated_pixmap = self.page_source(translated_path, filename, "translated")
             if translated_pixmap.isNull():
                 self.status_label.setText(f"无法加载翻译图像: {filename}")
                 return
                 
             self.translated_scene.clear()
-            self.translated_scene.addPixmap(translated_pixmap)
+            self.translated_source = translated_pixmap
+            self.translated_pixmap_item = self.add_page_item(self.translated_scene, translated_pixmap)
             self.translated_scene.setSceneRect(0, 0, translated_pixmap.width(), translated_pixmap.height())
             
             # 确保两个视图的场景大小一致
             self.original_view.setSceneRect(self.original_scene.sceneRect())
             self.translated_view.setSceneRect(self.translated_scene.sceneRect())
             
-            # 清空标注列表
-            self.original_view.annotations = []
-            self.translated_view.annotations = []
+            # 清空标注列表并恢复该页之前的标注
+            self.original_view.clear_annotations()
+            self.translated_view.clear_annotations()
+            self.restore_annotations(filename)
+            self.restore_suggestions(filename)
+            self.loaded_filename = filename
+            self.apply_compare_mode()
+            self.loupe.set_sources(original_pixmap, translated_pixmap)
+            self.load_minimap(original_path, translated_path, QSizeF(translated_pixmap.size()))
+            for pane in self.compare_panes:
+                self.load_compare_pane(pane, filename)
             
             # 重置视图
             self.reset_views()
+            self.prefetch_neighbors()
             
             # 更新修改状态复选框
             self.modified_checkbox.setChecked(filename in self.modified_images)
@@ -711,14 +3397,19 @@ class ImageComparisonTool(QMainWindow):
             print(f"原始图像尺寸: {original_pixmap.width()}x{original_pixmap.height()}")
             print(f"翻译图像尺寸: {translated_pixmap.width()}x{translated_pixmap.height()}")
             
+            # 诊断模式下记录本次访问后的内存和对象数量
+            if self.leak_tracker:
+                self.leak_tracker.visit(filename, self.diagnostic_counts())
+            
         except Exception as e:
             self.status_label.setText(f"加载图像时出错: {str(e)}")
             print(f"加载图像时出错: {str(e)}")
     
     def next_image(self):
         """切换到下一对图像"""
-        if self.current_index < len(self.image_pairs) - 1:
-            self.current_index += 1
+        row = self.find_visible_row(self.current_index + 1, 1)
+        if row is not None:
+            self.current_index = row
             self.image_list.setCurrentRow(self.current_index)
             self.load_current_image_pair()
             self.update_navigation()
@@ -726,8 +3417,9 @@ class ImageComparisonTool(QMainWindow):
     
     def prev_image(self):
         """切换到上一对图像"""
-        if self.current_index > 0:
-            self.current_index -= 1
+        row = self.find_visible_row(self.current_index - 1, -1)
+        if row is not None:
+            self.current_index = row
             self.image_list.setCurrentRow(self.current_index)
             self.load_current_image_pair()
             self.update_navigation()
@@ -736,13 +3428,16 @@ class ImageComparisonTool(QMainWindow):
     def update_navigation(self):
         """更新导航按钮状态"""
         has_images = len(self.image_pairs) > 0
-        self.prev_button.setEnabled(has_images and self.current_index > 0)
-        self.next_button.setEnabled(has_images and self.current_index < len(self.image_pairs) - 1)
+        self.prev_button.setEnabled(has_images and self.find_visible_row(self.current_index - 1, -1) is not None)
+        self.next_button.setEnabled(has_images and self.find_visible_row(self.current_index + 1, 1) is not None)
     
     def toggle_annotation(self, checked):
         """切换标注模式"""
         self.original_view.annotation_mode = checked
         self.translated_view.annotation_mode = checked
+        for view in (self.original_view, self.translated_view):
+            view.set_selection([])
+            view.viewport().setCursor(Qt.CrossCursor if checked else Qt.OpenHandCursor)
         
         if checked:
             self.statusBar().showMessage("标注模式：开启 - 绘制矩形以标记问题")
@@ -757,11 +3452,18 @@ class ImageComparisonTool(QMainWindow):
         _, _, filename = self.image_pairs[self.current_index]
         
         if state == Qt.Checked:
-            self.modified_images.add(filename)
-            print(f"标记图像为需要修改: {filename}")
+            if filename not in self.modified_images:
+                self.modified_images.add(filename)
+                if not self.replaying_history:
+                    with self.history.group("标记需要修改", filename):
+                        self.history.record("标记需要修改", filename, [("flag", False, True)])
+                        self.revoke_approval(filename)
+                print(f"标记图像为需要修改: {filename}")
         else:
             if filename in self.modified_images:
                 self.modified_images.remove(filename)
+                if not self.replaying_history:
+                    self.history.record("取消需要修改", filename, [("flag", True, False)])
                 print(f"取消标记图像为需要修改: {filename}")
     
     def export_annotated_images(self):
@@ -776,59 +3478,71 @@ class ImageComparisonTool(QMainWindow):
             
         try:
             # 创建子文件夹
-            needs_modification_folder = os.path.join(export_folder, "需要修改")
-            approved_folder = os.path.join(export_folder, "已通过")
+            os.makedirs(os.path.join(export_folder, "需要修改"), exist_ok=True)
+            os.makedirs(os.path.join(export_folder, "已通过"), exist_ok=True)
             
-            os.makedirs(needs_modification_folder, exist_ok=True)
-            os.makedirs(approved_folder, exist_ok=True)
+            # 当前页的标注也要参与导出
+            self.remember_current_annotations()
             
-            # 保存当前索引以便稍后恢复
-            current = self.current_index
+            # 读取上一次导出的清单，只重新渲染输入发生变化的图像对
+            previous_manifest = load_manifest(export_folder)
+            manifest = {"version": MANIFEST_VERSION, "pairs": {}}
+            written = 0
+            skipped = 0
             
-            # 处理所有图像对
-            for i, (original_path, translated_path, filename) in enumerate(self.image_pairs):
-                # 切换到当前图像对
-                self.current_index = i
-                self.load_current_image_pair()
-                
+            for original_path, translated_path, filename in self.image_pairs:
                 # 确定目标文件夹
-                target_folder = needs_modification_folder if filename in self.modified_images else approved_folder
+                status = "需要修改" if filename in self.modified_images else "已通过"
+                annotations = self.page_annotations.get(filename, {})
+                outputs = [f"{status}/orig_{filename}", f"{status}/{filename}"]
                 
-                # 原始图像 - 使用高质量保存
-                orig_image = QImage(self.original_scene.sceneRect().size().toSize(), QImage.Format_ARGB32)
-                orig_image.fill(Qt.white)
-                painter = QPainter(orig_image)
-                painter.setRenderHint(QPainter.Antialiasing, True)
-                painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
-                self.original_scene.render(painter)
-                painter.end()
-                orig_image.save(os.path.join(target_folder, f"orig_{filename}"), quality=100)
+                previous = previous_manifest["pairs"].get(filename)
+                entry = build_entry(original_path, translated_path, annotations,
+                                    status, outputs, previous)
+                manifest["pairs"][filename] = entry
                 
-                # 翻译图像 - 使用高质量保存
-                trans_image = QImage(self.translated_scene.sceneRect().size().toSize(), QImage.Format_ARGB32)
-                trans_image.fill(Qt.white)
-                painter = QPainter(trans_image)
-                painter.setRenderHint(QPainter.Antialiasing, True)
-                painter.setRenderHint(QPainter.SmoothPixmapTransform, True)
-                self.translated_scene.render(painter)
-                painter.end()
-                trans_image.save(os.path.join(target_folder, filename), quality=100)
+                if entry_unchanged(entry, previous, export_folder):
+                    skipped += 1
+                    continue
+                
+                # 原始图像和翻译图像 - 使用高质量保存
+                for rel_path, source_path, view_name in (
+                        (outputs[0], original_path, "original"),
+                        (outputs[1], translated_path, "translated")):
+                    image = render_annotated_image(source_path, annotations.get(view_name, []))
+                    if image is None:
+                        raise IOError(f"无法加载图像: {source_path}")
+                    image.save(os.path.join(export_folder, rel_path), quality=100)
+                written += 1
             
-            # 恢复当前索引
-            self.current_index = current
-            self.load_current_image_pair()
+            # 删除不再需要的旧输出（例如状态改变后留在另一个文件夹中的图像）
+            removed = 0
+            for rel_path in stale_outputs(previous_manifest, manifest):
+                stale_path = os.path.join(export_folder, rel_path)
+                if os.path.exists(stale_path):
+                    os.remove(stale_path)
+                    removed += 1
+            
+            save_manifest(export_folder, manifest)
+            print(f"导出完成: 重新生成 {written} 对, 跳过未变化 {skipped} 对, 删除过期文件 {removed} 个")
             
             QMessageBox.information(self, "导出完成", 
                 f"已导出 {len(self.image_pairs)} 对图像。\n"
                 f"需要修改: {len(self.modified_images)}\n"
-                f"已通过: {len(self.image_pairs) - len(self.modified_images)}")
+                f"已通过: {len(self.image_pairs) - len(self.modified_images)}\n"
+                f"本次重新生成: {written}，未变化跳过: {skipped}")
                 
         except Exception as e:
             QMessageBox.warning(self, "导出错误", f"导出图像时出错: {str(e)}")
 
 
 if __name__ == "__main__":
+    import startup
+
     app = QApplication(sys.argv)
     window = ImageComparisonTool()
     window.show()
+    # 窗口显示后再在后台预热重量级模块，第一次运行时测量解码后端
+    QTimer.singleShot(0, startup.warm_up_in_background)
+    QTimer.singleShot(0, image_decoders.benchmark_in_background)
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,448 @@
+"""按格式和操作在运行时选择最快的图像解码后端
+
+三个前端原来各自解码：image_comparison_tool/main 用 Qt，test 用 PIL，分析模块用 PIL。
+不同后端在不同格式上的速度差别很大（例如 OpenCV 的 JPEG 灰度解码、PIL 的 JPEG 缩小解码），
+所以所有读取图像的地方都通过这里:
+    decode(path, "full")           全分辨率彩色
+    decode(path, "gray")           全分辨率灰度（分析模块）
+    decode(path, "scaled", size)   长边不超过 size 的缩小图（缩略图、指纹）
+    probe(path)                    只读文件头得到 (宽, 高)
+
+decode 返回像素 {"width", "height", "stride", "mode", "data"}，mode 为 "L"、"RGB"、"RGBA"、
+"RGBX"、"BGR"、"BGRA" 或 "BGRX"（按内存中的字节顺序），data 为拥有数据的缓冲区。
+to_qimage / to_pil 把像素转换为各前端使用的对象。
+
+第一次运行时 run_benchmark 在合成的样张上测量每个可用后端，按 (格式, 操作) 选择最快的，
+结果保存在 ~/.mangaqc/decoders.json；可用的后端变化后重新测量。测量完成前使用 DEFAULT_ORDER。
+环境变量 MANGAQC_DECODER=pil（或 qt、cv2）强制使用某个后端。
+
+    python image_decoders.py            显示当前的选择和测量结果
+    python image_decoders.py --rerun    重新测量
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import importlib.util
+
+import share_cache
+
+BENCHMARK_VERSION = 1
+BENCHMARK_PATH = os.path.join(os.path.expanduser("~"), ".mangaqc", "decoders.json")
+BENCHMARK_SIZE = (1600, 2300)  # 样张尺寸，与常见漫画扫描页相近
+BENCHMARK_RUNS = 3
+FORCE_ENV = "MANGAQC_DECODER"
+
+BACKENDS = ("qt", "pil", "cv2")
+OPERATIONS = ("full", "gray", "scaled", "probe")
+FORMATS = {".png": "png", ".jpg": "jpeg", ".jpeg": "jpeg", ".webp": "webp", ".bmp": "bmp"}
+
+# 没有测量结果时的顺序
+DEFAULT_ORDER = {
+    "full": ("qt", "pil", "cv2"),
+    "gray": ("cv2", "pil", "qt"),
+    "scaled": ("pil", "qt", "cv2"),
+    "probe": ("pil", "qt"),
+}
+
+
+class DecodeError(OSError):
+    pass
+
+
+def image_format(path):
+    return FORMATS.get(os.path.splitext(path)[1].lower(), "other")
+
+
+def pixels(width, height, stride, mode, data):
+    return {"width": width, "height": height, "stride": stride, "mode": mode, "data": data}
+
+
+def fit(width, height, size):
+    """长边缩小到 size 以内的尺寸（不放大）"""
+    scale = min(1.0, size / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+# ---- Qt ----
+
+def qt_gui():
+    """已经加载 PyQt6 的进程（test.py）使用 PyQt6，否则使用 PyQt5"""
+    if "PyQt6.QtGui" in sys.modules:
+        from PyQt6 import QtGui
+        return QtGui
+    try:
+        from PyQt5 import QtGui
+    except ImportError:
+        from PyQt6 import QtGui
+    return QtGui
+
+
+def qt_format(name):
+    QImage = qt_gui().QImage
+    return getattr(QImage, name, None) or getattr(QImage.Format, name, None)
+
+
+def qt_pixels(image, gray=False):
+    """把 QImage 转换为像素（复制一次，像素不依赖 QImage 的生存期）"""
+    if image.isNull():
+        raise DecodeError("Qt 无法解码图像")
+    if gray:
+        image = image.convertToFormat(qt_format("Format_Grayscale8"))
+        mode = "L"
+    else:
+        alpha = image.hasAlphaChannel()
+        image = image.convertToFormat(qt_format("Format_ARGB32" if alpha else "Format_RGB32"))
+        # ARGB32 按 32 位整数存储，小端机器上内存中的字节顺序为 B, G, R, A
+        mode = ("BGRA" if alpha else "BGRX") if sys.byteorder == "little" else ("ARGB" if alpha else "XRGB")
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    return pixels(image.width(), image.height(), image.bytesPerLine(), mode, bits.asstring())
+
+
+def qt_decode(path, op, size=None):
+    reader = qt_gui().QImageReader(path)
+    if op == "probe":
+        dims = reader.size()
+        return (dims.width(), dims.height()) if dims.isValid() else None
+    if op == "scaled":
+        dims = reader.size()
+        if dims.isValid():
+            width, height = fit(dims.width(), dims.height(), size)
+            dims.setWidth(width)
+            dims.setHeight(height)
+            reader.setScaledSize(dims)
+    return qt_pixels(reader.read(), gray=(op == "gray"))
+
+
+# ---- PIL ----
+
+def pil_decode(path, op, size=None):
+    from PIL import Image
+
+    with Image.open(path) as image:
+        if op == "probe":
+            return image.size
+        if op == "gray":
+            # JPEG 可以直接解码亮度通道
+            image.draft("L", image.size)
+            image = image.convert("L")
+        elif op == "scaled":
+            width, height = fit(image.width, image.height, size)
+            image.draft(image.mode, (width, height))
+            image = image.resize((width, height), Image.BOX) if image.size != (width, height) else image
+        else:
+            image.load()
+        if image.mode not in ("L", "RGB", "RGBA"):
+            alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if alpha else "RGB")
+        channels = len(image.mode)
+        return pixels(image.width, image.height, image.width * channels, image.mode, image.tobytes())
+
+
+# ---- OpenCV ----
+
+def cv2_decode(path, op, size=None):
+    import numpy as np
+    import cv2
+
+    if op == "probe":
+        raise DecodeError("OpenCV 不支持只读取文件头")
+    # np.fromfile 支持 Windows 上的中文路径，cv2.imread 不支持
+    data = np.fromfile(path, dtype=np.uint8)
+    if op == "gray":
+        image = cv2.imdecode(data, cv2.IMREAD_GRAYSCALE)
+    elif op == "scaled":
+        header = probe(path)
+        factor = 1
+        if header is not None:
+            while factor < 8 and max(header) / (factor * 2) >= size:
+                factor *= 2
+        flags = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}[factor]
+        image = cv2.imdecode(data, flags)
+        if image is not None:
+            width, height = fit(image.shape[1], image.shape[0], size)
+            if (width, height) != (image.shape[1], image.shape[0]):
+                image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+    else:
+        image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+        if image is not None and image.dtype != np.uint8:
+            image = (image >> 8).astype(np.uint8)
+        if image is not None and image.ndim == 3 and image.shape[2] == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)  # 灰度 + 透明度，很少见
+    if image is None:
+        raise DecodeError("OpenCV 无法解码图像")
+    image = np.ascontiguousarray(image)
+    mode = {2: "L", 3: "BGR", 4: "BGRA"}[image.ndim if image.ndim == 2 else image.shape[2]]
+    return pixels(image.shape[1], image.shape[0], image.strides[0], mode, memoryview(image))
+
+
+DECODERS = {"qt": qt_decode, "pil": pil_decode, "cv2": cv2_decode}
+MODULES = {"qt": ("PyQt5", "PyQt6"), "pil": ("PIL",), "cv2": ("cv2",)}
+
+
+_available = None
+
+
+def available_backends():
+    """能够导入的后端（不真正导入），每个进程只检查一次"""
+    global _available
+    if _available is None:
+        _available = [name for name in BACKENDS
+                      if any(module in sys.modules or importlib.util.find_spec(module) is not None
+                             for module in MODULES[name])]
+    return _available
+
+
+# ---- 选择 ----
+
+_lock = threading.Lock()
+_benchmark = None  # 已读取的测量结果，None 表示还没读取
+usage = {}  # (格式, 操作, 后端) -> [次数, 总耗时秒]
+
+
+def load_benchmark():
+    """读取测量结果，可用后端变化或文件无效时返回 {}"""
+    global _benchmark
+    with _lock:
+        if _benchmark is not None:
+            return _benchmark
+    try:
+        with open(BENCHMARK_PATH, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != BENCHMARK_VERSION or sorted(data["backends"]) != sorted(available_backends()):
+            data = {}
+    except (OSError, ValueError, KeyError):
+        data = {}
+    with _lock:
+        _benchmark = data
+    return data
+
+
+def candidates(fmt, op):
+    """按优先顺序返回可以尝试的后端"""
+    forced = os.environ.get(FORCE_ENV)
+    order = list(DEFAULT_ORDER[op])
+    chosen = load_benchmark().get("choices", {}).get(fmt, {}).get(op)
+    if chosen in order:
+        order.remove(chosen)
+        order.insert(0, chosen)
+    if forced in order:
+        order.remove(forced)
+        order.insert(0, forced)
+    available = available_backends()
+    return [name for name in order if name in available]
+
+
+def run(path, op, size=None):
+    fmt = image_format(path)
+    errors = []
+    for name in candidates(fmt, op):
+        start = time.perf_counter()
+        try:
+            result = DECODERS[name](path, op, size)
+        except Exception as e:  # 各后端抛出的异常类型不同（包括缺少依赖的 ImportError）
+            errors.append(f"{name}: {e}")
+            continue
+        if result is None and op != "probe":
+            continue
+        with _lock:
+            entry = usage.setdefault((fmt, op, name), [0, 0.0])
+            entry[0] += 1
+            entry[1] += time.perf_counter() - start
+        return result
+    if not errors:
+        raise DecodeError(f"没有可用的解码后端: {path}")
+    raise DecodeError(f"无法读取图像 {path}: " + "; ".join(errors))
+
+
+def decode(path, op="full", size=256):
+    """解码图像，网络文件夹中的文件读取本地缓存副本，失败时抛出 DecodeError"""
+    return run(share_cache.local_path(path), op, size)
+
+
+def probe(path):
+    """只读取文件头得到图像尺寸 (宽, 高)，无法读取时返回None"""
+    try:
+        return run(path, "probe")
+    except DecodeError:
+        return None
+
+
+# ---- 转换 ----
+
+def to_qimage(pix):
+    """像素转换为当前 Qt 版本的 QImage（不复制）"""
+    QImage = qt_gui().QImage
+    formats = {"L": "Format_Grayscale8", "RGB": "Format_RGB888", "RGBA": "Format_RGBA8888",
+               "RGBX": "Format_RGBX8888", "BGR": "Format_BGR888",
+               "BGRA": "Format_ARGB32", "BGRX": "Format_RGB32", "ARGB": "Format_ARGB32", "XRGB": "Format_RGB32"}
+    fmt = qt_format(formats[pix["mode"]])
+    if fmt is None:
+        # Qt 5.14 之前没有 BGR888
+        image = QImage(pix["data"], pix["width"], pix["height"], pix["stride"], qt_format("Format_RGB888"))
+        return image.rgbSwapped()
+    image = QImage(pix["data"], pix["width"], pix["height"], pix["stride"], fmt)
+    # QImage 不拥有传入的内存，由包装对象保持数据有效
+    image.pixels = pix["data"]
+    return image
+
+
+def to_pil(pix):
+    """像素转换为 PIL 图像（复制）"""
+    from PIL import Image
+
+    mode, raw = {"L": ("L", "L"), "RGB": ("RGB", "RGB"), "RGBA": ("RGBA", "RGBA"), "RGBX": ("RGB", "RGBX"),
+                 "BGR": ("RGB", "BGR"), "BGRA": ("RGBA", "BGRA"), "BGRX": ("RGB", "BGRX"),
+                 "ARGB": ("RGBA", "ARGB"), "XRGB": ("RGB", "XRGB")}[pix["mode"]]
+    return Image.frombytes(mode, (pix["width"], pix["height"]), bytes(pix["data"]), "raw", raw, pix["stride"], 1)
+
+
+# ---- 测量 ----
+
+def make_samples(folder):
+    """生成各格式的合成样张（白底、网点和黑色文字块），返回 {格式: 路径}"""
+    width, height = BENCHMARK_SIZE
+    samples = {}
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        Image = None
+    if Image is not None:
+        image = Image.effect_noise((width, height), 24).point(lambda v: min(255, v + 150)).convert("RGB")
+        draw = ImageDraw.Draw(image)
+        for i in range(80):
+            x, y = 60 + (i * 137) % (width - 300), 60 + (i * 211) % (height - 200)
+            draw.rectangle((x, y, x + 220, y + 90), fill=(20, 20, 20))
+            draw.ellipse((x + 20, y + 100, x + 200, y + 180), outline=(0, 0, 0), width=3)
+        for fmt, ext in (("png", ".png"), ("jpeg", ".jpg"), ("webp", ".webp"), ("bmp", ".bmp")):
+            path = os.path.join(folder, "sample" + ext)
+            try:
+                image.save(path)
+            except (OSError, KeyError, ValueError):
+                continue
+            samples[fmt] = path
+        return samples
+    try:
+        QtGui = qt_gui()
+    except ImportError:
+        return samples
+    image = QtGui.QImage(width, height, qt_format("Format_RGB32"))
+    image.fill(0xFFF0F0F0)
+    painter = QtGui.QPainter(image)
+    for i in range(80):
+        x, y = 60 + (i * 137) % (width - 300), 60 + (i * 211) % (height - 200)
+        painter.fillRect(x, y, 220, 90, QtGui.QColor(20, 20, 20))
+    painter.end()
+    for fmt, ext in (("png", ".png"), ("jpeg", ".jpg"), ("webp", ".webp"), ("bmp", ".bmp")):
+        path = os.path.join(folder, "sample" + ext)
+        if image.save(path):
+            samples[fmt] = path
+    return samples
+
+
+def time_backend(name, path, op):
+    """最好的一次耗时（毫秒），后端不支持时返回None"""
+    best = None
+    try:
+        for i in range(BENCHMARK_RUNS + 1):
+            start = time.perf_counter()
+            result = DECODERS[name](path, op, 256)
+            elapsed = (time.perf_counter() - start) * 1000.0
+            if result is None:
+                return None
+            if i > 0:  # 第一次包括导入和插件加载
+                best = elapsed if best is None else min(best, elapsed)
+    except Exception:
+        return None
+    return best
+
+
+def run_benchmark(progress=None):
+    """测量所有可用后端并保存选择，返回测量结果"""
+    global _benchmark
+    backends = available_backends()
+    timings = {}
+    choices = {}
+    with tempfile.TemporaryDirectory(prefix="mangaqc-decoders-") as folder:
+        samples = make_samples(folder)
+        for fmt, path in sorted(samples.items()):
+            for op in OPERATIONS:
+                results = {}
+                for name in backends:
+                    elapsed = time_backend(name, path, op)
+                    if elapsed is not None:
+                        results[name] = round(elapsed, 2)
+                    if progress:
+                        progress(fmt, op, name, elapsed)
+                if results:
+                    timings.setdefault(fmt, {})[op] = results
+                    choices.setdefault(fmt, {})[op] = min(results, key=results.get)
+    data = {"version": BENCHMARK_VERSION, "backends": backends, "measured_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "size": list(BENCHMARK_SIZE), "timings": timings, "choices": choices}
+    os.makedirs(os.path.dirname(BENCHMARK_PATH), exist_ok=True)
+    tmp_path = f"{BENCHMARK_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, BENCHMARK_PATH)
+    with _lock:
+        _benchmark = data
+    return data
+
+
+def ensure_benchmark():
+    """没有有效的测量结果时测量一次（第一次运行时）"""
+    if not load_benchmark():
+        run_benchmark()
+
+
+def benchmark_in_background():
+    """界面启动后在后台测量，测量完成前使用默认顺序"""
+    thread = threading.Thread(target=ensure_benchmark, daemon=True)
+    thread.start()
+    return thread
+
+
+def report():
+    """诊断信息：每种格式和操作选择的后端、测量耗时和本进程中的实际使用情况"""
+    data = load_benchmark()
+    lines = [f"可用后端: {', '.join(available_backends()) or '无'}"]
+    if os.environ.get(FORCE_ENV):
+        lines.append(f"强制使用: {os.environ[FORCE_ENV]}（{FORCE_ENV}）")
+    if data:
+        lines.append(f"测量时间: {data['measured_at']}，样张 {data['size'][0]}x{data['size'][1]}")
+        for fmt in sorted(data["timings"]):
+            for op in OPERATIONS:
+                results = data["timings"][fmt].get(op)
+                if not results:
+                    continue
+                detail = ", ".join(f"{name} {ms:.1f}ms" for name, ms in sorted(results.items(), key=lambda r: r[1]))
+                lines.append(f"  {fmt:5s} {op:6s} -> {data['choices'][fmt][op]:4s} ({detail})")
+    else:
+        lines.append("还没有测量结果，使用默认顺序: "
+                     + "; ".join(f"{op} {'/'.join(DEFAULT_ORDER[op])}" for op in OPERATIONS))
+    with _lock:
+        used = sorted(usage.items())
+    if used:
+        lines.append("本次运行:")
+        for (fmt, op, name), (count, seconds) in used:
+            lines.append(f"  {fmt:5s} {op:6s} {name:4s} {count} 次，平均 {seconds / count * 1000.0:.1f}ms")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="图像解码后端的选择和测量")
+    parser.add_argument("--rerun", action="store_true", help="重新测量所有后端")
+    args = parser.parse_args()
+    if args.rerun or not load_benchmark():
+        print("正在测量解码后端...")
+        run_benchmark()
+    print("\n".join(report()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""分析模块共用的 NumPy 图像操作
+
+NumPy、PIL 以及可选的 OpenCV/SciPy 都在函数内部导入，导入本模块本身很快。
+"""
+
+
+def load_gray(path):
+    """读取灰度图像为只读的 uint8 数组
+
+    解码结果保存在跨进程的 pixel_cache 中，之后的分析（包括其他工作进程）直接映射，不再解码。
+    """
+    import numpy as np
+    import pixel_cache
+    import image_decoders
+
+    cached = pixel_cache.get(path, "gray")
+    if cached is not None:
+        width, height, stride, _, pixels = cached
+        return np.frombuffer(pixels, dtype=np.uint8).reshape(height, stride)[:, :width]
+    pix = image_decoders.decode(path, "gray")
+    width, height, stride = pix["width"], pix["height"], pix["stride"]
+    pixel_cache.put(path, "gray", width, height, stride, 0, pix["data"])
+    return np.frombuffer(pix["data"], dtype=np.uint8).reshape(height, stride)[:, :width]
+
+
+def downsample(gray, factor):
+    """按 factor 倍做区域平均缩小，返回 uint8 数组"""
+    if factor <= 1:
+        return gray
+    height, width = gray.shape
+    h, w = height // factor, width // factor
+    blocks = gray[:h * factor, :w * factor].reshape(h, factor, w, factor)
+    return blocks.mean(axis=(1, 3)).astype(gray.dtype)
+
+
+def dilate(mask, radius):
+    """方形结构元素的二值膨胀（可分离，逐行逐列移位求或）"""
+    if radius <= 0:
+        return mask.copy()
+    out = mask.copy()
+    for axis in (0, 1):
+        src = out
+        acc = src.copy()
+        for shift in range(1, radius + 1):
+            if axis == 0:
+                acc[shift:] |= src[:-shift]
+                acc[:-shift] |= src[shift:]
+            else:
+                acc[:, shift:] |= src[:, :-shift]
+                acc[:, :-shift] |= src[:, shift:]
+        out = acc
+    return out
+
+
+def erode(mask, radius):
+    return ~dilate(~mask, radius)
+
+
+def close(mask, radius):
+    """闭运算，填补掩码中的小孔（例如气泡中的文字）"""
+    return erode(dilate(mask, radius), radius)
+
+
+def label_regions(mask):
+    """8 连通区域标记
+
+    返回 (标签图, 统计)，统计为 N x 5 数组，每行是 (x, y, w, h, 面积)，
+    第 0 行是背景，与 OpenCV connectedComponentsWithStats 的约定一致。
+    优先使用 OpenCV，没有时使用 SciPy。
+    """
+    import numpy as np
+
+    try:
+        import cv2
+
+        _, labels, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+        return labels, stats
+    except ImportError:
+        pass
+
+    from scipy import ndimage
+
+    labels, count = ndimage.label(mask, structure=np.ones((3, 3), dtype=bool))
+    stats = np.zeros((count + 1, 5), dtype=np.int64)
+    areas = np.bincount(labels.ravel(), minlength=count + 1)
+    stats[:, 4] = areas
+    for index, slices in enumerate(ndimage.find_objects(labels), start=1):
+        if slices is None:
+            continue
+        rows, cols = slices
+        stats[index, :4] = (cols.start, rows.start, cols.stop - cols.start, rows.stop - rows.start)
+    stats[0, :4] = (0, 0, mask.shape[1], mask.shape[0])
+    stats[0, 4] = areas[0]
+    return labels, stats
+
+
+def component_boxes(mask, min_area, scale=1, padding=0):
+    """返回掩码中面积不小于 min_area 的连通区域外接框 [(x, y, w, h, 面积)]
+
+    坐标乘以 scale 还原到原图尺寸，并向外扩展 padding 像素。
+    """
+    _, stats = label_regions(mask)
+    boxes = []
+    for x, y, w, h, area in stats[1:]:
+        if area < min_area:
+            continue
+        boxes.append((int(x * scale - padding), int(y * scale - padding),
+                      int(w * scale + 2 * padding), int(h * scale + 2 * padding), int(area)))
+    return boxes
@@ -0,0 +1,68 @@
+import os
+
+import share_cache
+import image_decoders
+
+# 支持的图像格式
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.webp')
+
+
+def list_images(folder):
+    """列出文件夹中的所有图像文件名（网络文件夹使用缓存的目录清单）"""
+    return [f for f in share_cache.list_names(folder) if f.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def matching_filenames(original_folder, translated_folder):
+    """找出两个文件夹中文件名相同的图像，按文件名排序"""
+    return sorted(set(list_images(original_folder)) & set(list_images(translated_folder)))
+
+
+def pair_images(original_folder, translated_folder, image_size=image_decoders.probe):
+    """按文件名配对，并且只保留两张图像尺寸相同的图像对
+
+    image_size(路径) 返回 (宽, 高)，读取失败时返回None。
+    返回 ([(原图路径, 翻译图路径, 文件名, (宽, 高))], [(文件名, 原图尺寸, 翻译图尺寸)])，
+    后者是尺寸不同而被跳过的图像。
+    """
+    pairs = []
+    mismatched = []
+    for filename in matching_filenames(original_folder, translated_folder):
+        original_path = os.path.join(original_folder, filename)
+        translated_path = os.path.join(translated_folder, filename)
+        original_size = image_size(original_path)
+        translated_size = image_size(translated_path)
+        if original_size is not None and original_size == translated_size:
+            pairs.append((original_path, translated_path, filename, original_size))
+        else:
+            mismatched.append((filename, original_size, translated_size))
+    return pairs, mismatched
+
+
+def find_chapters(original_root, translated_root):
+    """返回 [(章节相对路径, 原图文件夹, 翻译图文件夹)]
+
+    原图根目录下每个包含图像的文件夹视为一个章节，翻译根目录下相同相对路径的文件夹与之配对。
+    返回的文件夹都是绝对路径，写入会话和报告后与工作目录无关。
+    """
+    original_root = os.path.abspath(original_root)
+    translated_root = os.path.abspath(translated_root)
+    chapters = []
+    for folder, dirs, _ in os.walk(original_root):
+        dirs.sort()
+        # 跳过标注文件夹和缓存
+        dirs[:] = [d for d in dirs if d != "标注" and not d.startswith(".")]
+        relative = os.path.relpath(folder, original_root)
+        translated_folder = os.path.normpath(os.path.join(translated_root, relative))
+        if os.path.isdir(translated_folder) and list_images(folder) and list_images(translated_folder):
+            chapters.append((relative, folder, translated_folder))
+    return chapters
+
+
+def folder_key(folder):
+    """比较和查找文件夹用的规范形式：绝对路径，Windows 上统一大小写和分隔符（与会话文件名的规则相同）"""
+    return os.path.normcase(os.path.abspath(folder))
+
+
+def default_annotation_folder(original_folder):
+    """与界面相同的默认标注文件夹"""
+    return os.path.join(os.path.dirname(os.path.normpath(original_folder)), "标注")
@@ -0,0 +1,431 @@
+"""交互延迟回归测试：在 offscreen 平台上回放合成的输入事件并统计耗时
+
+用法:
+    python latency_harness.py --app tool --original 原图文件夹 --translated 翻译文件夹
+    python latency_harness.py --app all --generate 6 --threshold event.wheel:p95=30
+    python latency_harness.py --app tool --share-throttle 30,40   # 把文件夹当作慢速网络共享
+
+--app tool    测试 image_comparison_tool.ImageComparisonTool (PyQt5)
+--app viewer  测试 test.MainWindow (PyQt6)
+--app all     分别在子进程中测试两者（两个Qt版本不能在同一进程中加载）
+
+统计的指标:
+    event.<动作>   每个合成事件的处理耗时（sendEvent 返回前）
+    paint.<动作>   事件之后处理挂起的绘制所用的时间
+    <方法名>       被测方法每次调用的耗时，例如 wheelEvent、syncScrollBar、
+                   update_pixmap、load_current_image_pair、paintEvent
+超过 --threshold 给出的阈值，或阈值中的指标没有出现在任何结果中（例如拼写错误）时以退出码 1 结束。
+
+每次运行使用新的临时文件夹保存会话、像素缓存、共享缓存和解码后端测量结果，
+测量的总是解码而不是上次运行留下的缓存。被测窗口的后台差异分析和重复页检测不运行，
+回放结束后关闭窗口。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+# 必须在导入 Qt 之前设置
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# 默认回放脚本：缩放、拖动平移、翻页
+DEFAULT_SCRIPT = [
+    {"action": "wheel", "delta": 120, "count": 15},
+    {"action": "drag", "dx": -400, "dy": -600, "steps": 30},
+    {"action": "wheel", "delta": -120, "count": 15},
+    {"action": "flip", "direction": "next", "count": 3},
+    {"action": "wheel", "delta": 120, "count": 10},
+    {"action": "drag", "dx": 300, "dy": 500, "steps": 30},
+    {"action": "flip", "direction": "prev", "count": 3},
+]
+
+
+def percentile(values, pct):
+    """最近秩法计算百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples):
+    """把每个指标的耗时列表汇总为百分位统计（毫秒）"""
+    summary = {}
+    for name, values in sorted(samples.items()):
+        summary[name] = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p90": percentile(values, 90),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values) if values else 0.0,
+        }
+    return summary
+
+
+def parse_thresholds(items):
+    """解析 指标:百分位=毫秒 形式的阈值，例如 event.wheel:p95=30"""
+    thresholds = []
+    for item in items or []:
+        try:
+            metric, rest = item.split(":", 1)
+            stat, limit = rest.split("=", 1)
+            thresholds.append((metric, stat, float(limit)))
+        except ValueError:
+            raise SystemExit(f"无法解析阈值: {item}（格式应为 指标:p95=毫秒）")
+    return thresholds
+
+
+def check_thresholds(summary, thresholds):
+    """返回超过阈值的说明列表（本前端没有的指标跳过，由 unknown_metrics 检查）"""
+    failures = []
+    for metric, stat, limit in thresholds:
+        if metric not in summary:
+            continue
+        value = summary[metric].get(stat)
+        if value is None:
+            failures.append(f"{metric}: 未知的统计量 {stat}")
+        elif value > limit:
+            failures.append(f"{metric} {stat} = {value:.2f} ms > {limit:.2f} ms")
+    return failures
+
+
+def unknown_metrics(results, thresholds):
+    """返回没有出现在任何前端结果中的阈值指标，通常是拼写错误"""
+    seen = set()
+    for summary in results.values():
+        seen.update(summary)
+    return sorted({metric for metric, _, _ in thresholds if metric not in seen})
+
+
+def isolate_caches(work_folder):
+    """会话、缓存和解码后端测量结果都放在临时文件夹中，不读取也不覆盖用户自己的"""
+    import session_store
+    import pixel_cache
+    import share_cache
+    import image_decoders
+
+    session_store.SESSION_DIR = os.path.join(work_folder, "sessions")
+    pixel_cache.CACHE_ROOT = os.path.join(work_folder, "pixel_cache")
+    share_cache.CACHE_ROOT = os.path.join(work_folder, "share_cache")
+    image_decoders.BENCHMARK_PATH = os.path.join(work_folder, "decoders.json")
+    # 和正式运行一样先选择解码后端，测量本身不计入指标
+    image_decoders.ensure_benchmark()
+
+
+def instrument(cls, name, samples, base=None):
+    """替换类上的方法，记录每次调用的耗时
+
+    必须在创建实例之前调用，sip 才会把新的 Python 方法当作虚函数重写。
+    base 用于类本身没有定义、只从 Qt 基类继承的方法（例如 paintEvent）。
+    """
+    original = getattr(base or cls, name)
+
+    def timed(self, *args):
+        start = time.perf_counter()
+        try:
+            return original(self, *args)
+        finally:
+            samples.setdefault(name, []).append((time.perf_counter() - start) * 1000.0)
+
+    timed.__name__ = name
+    setattr(cls, name, timed)
+
+
+def generate_chapter(count, folder, qt):
+    """生成合成章节：count 对大尺寸页面，用于没有真实数据的 CI 环境"""
+    QtGui, QtCore = qt.QtGui, qt.QtCore
+    original_folder = os.path.join(folder, "原图")
+    translated_folder = os.path.join(folder, "翻译")
+    os.makedirs(original_folder, exist_ok=True)
+    os.makedirs(translated_folder, exist_ok=True)
+    fmt = getattr(QtGui.QImage, "Format_RGB32", None) or QtGui.QImage.Format.Format_RGB32
+    for i in range(count):
+        for target, shade in ((original_folder, 0), (translated_folder, 40)):
+            image = QtGui.QImage(2400, 3400, fmt)
+            image.fill(QtGui.QColor(250, 250, 250))
+            painter = QtGui.QPainter(image)
+            for j in range(60):
+                painter.fillRect(QtCore.QRect(100 + (j * 137) % 2000, 100 + (j * 211) % 3000, 180, 90),
+                                 QtGui.QColor(20 + shade, 20, 20))
+            painter.end()
+            image.save(os.path.join(target, f"{i + 1:03d}.png"))
+    return original_folder, translated_folder
+
+
+class QtBinding:
+    """统一访问 PyQt5 / PyQt6 中的常用类和枚举"""
+
+    def __init__(self, name):
+        if name == "PyQt5":
+            from PyQt5 import QtCore, QtGui, QtWidgets
+        else:
+            from PyQt6 import QtCore, QtGui, QtWidgets
+        self.name = name
+        self.QtCore, self.QtGui, self.QtWidgets = QtCore, QtGui, QtWidgets
+        qt = QtCore.Qt
+        buttons = getattr(qt, "MouseButton", qt)
+        self.left = buttons.LeftButton
+        self.middle = buttons.MiddleButton
+        self.no_button = buttons.NoButton
+        self.no_modifier = getattr(qt, "KeyboardModifier", qt).NoModifier
+        self.no_phase = getattr(qt, "ScrollPhase", qt).NoScrollPhase
+        event_type = getattr(QtCore.QEvent, "Type", QtCore.QEvent)
+        self.press = event_type.MouseButtonPress
+        self.move = event_type.MouseMove
+        self.release = event_type.MouseButtonRelease
+
+    def wheel_event(self, widget, delta):
+        QtCore = self.QtCore
+        pos = QtCore.QPointF(widget.width() / 2, widget.height() / 2)
+        global_pos = QtCore.QPointF(widget.mapToGlobal(pos.toPoint()))
+        return self.QtGui.QWheelEvent(pos, global_pos, QtCore.QPoint(0, 0), QtCore.QPoint(0, delta),
+                                      self.no_button, self.no_modifier, self.no_phase, False)
+
+    def mouse_event(self, widget, kind, pos, button, buttons):
+        global_pos = self.QtCore.QPointF(widget.mapToGlobal(pos.toPoint()))
+        return self.QtGui.QMouseEvent(kind, pos, global_pos, button, buttons, self.no_modifier)
+
+
+class Harness:
+    """回放脚本并记录耗时的通用部分"""
+
+    def __init__(self, qt):
+        self.qt = qt
+        self.samples = {}
+
+    def record(self, metric, start):
+        self.samples.setdefault(metric, []).append((time.perf_counter() - start) * 1000.0)
+
+    def send(self, action, widget, event):
+        """发送一个事件，分别记录事件处理时间和随后的绘制时间"""
+        app = self.qt.QtWidgets.QApplication.instance()
+        start = time.perf_counter()
+        self.qt.QtWidgets.QApplication.sendEvent(widget, event)
+        self.record(f"event.{action}", start)
+        start = time.perf_counter()
+        app.processEvents()
+        self.record(f"paint.{action}", start)
+
+    def click(self, button_widget):
+        QtCore = self.qt.QtCore
+        pos = QtCore.QPointF(button_widget.width() / 2, button_widget.height() / 2)
+        self.send("flip", button_widget,
+                  self.qt.mouse_event(button_widget, self.qt.press, pos, self.qt.left, self.qt.left))
+        self.send("flip", button_widget,
+                  self.qt.mouse_event(button_widget, self.qt.release, pos, self.qt.left, self.qt.no_button))
+
+    def drag(self, widget, dx, dy, steps, button):
+        QtCore = self.qt.QtCore
+        start = QtCore.QPointF(widget.width() / 2, widget.height() / 2)
+        self.send("drag", widget, self.qt.mouse_event(widget, self.qt.press, start, button, button))
+        for i in range(1, steps + 1):
+            pos = QtCore.QPointF(start.x() + dx * i / steps, start.y() + dy * i / steps)
+            self.send("drag", widget, self.qt.mouse_event(widget, self.qt.move, pos, self.qt.no_button, button))
+        end = QtCore.QPointF(start.x() + dx, start.y() + dy)
+        self.send("drag", widget, self.qt.mouse_event(widget, self.qt.release, end, button, self.qt.no_button))
+
+    def close(self):
+        self.window.close()
+        self.app.processEvents()
+
+    def run_script(self, script):
+        for step in script:
+            action = step["action"]
+            for _ in range(step.get("count", 1)):
+                if action == "wheel":
+                    widget = self.wheel_target()
+                    self.send("wheel", widget, self.qt.wheel_event(widget, step.get("delta", 120)))
+                elif action == "drag":
+                    self.drag(self.drag_target(), step.get("dx", 0), step.get("dy", 0),
+                              step.get("steps", 20), self.drag_button())
+                elif action == "flip":
+                    self.click(self.flip_button(step.get("direction", "next")))
+                else:
+                    raise SystemExit(f"未知动作: {action}")
+
+
+class ToolHarness(Harness):
+    """ImageComparisonTool (PyQt5)"""
+
+    def __init__(self, original_folder, translated_folder, work_folder):
+        super().__init__(QtBinding("PyQt5"))
+        import image_comparison_tool as tool_module
+
+        view_cls = tool_module.SyncedGraphicsView
+        instrument(view_cls, "wheelEvent", self.samples)
+        instrument(view_cls, "syncScrollBar", self.samples)
+        instrument(view_cls, "paintEvent", self.samples, base=self.qt.QtWidgets.QGraphicsView)
+        instrument(tool_module.ImageComparisonTool, "load_current_image_pair", self.samples)
+
+        self.app = self.qt.QtWidgets.QApplication.instance() or self.qt.QtWidgets.QApplication(sys.argv)
+        self.window = tool_module.ImageComparisonTool()
+        # 后台差异分析和重复页检测会占用 CPU 并干扰测量
+        self.window.start_risk_scan = lambda: None
+        self.window.start_duplicate_scan = lambda: None
+        self.window.resize(1600, 1000)
+        self.window.show()
+        self.app.processEvents()
+
+        self.window.original_folder = original_folder
+        self.window.translated_folder = translated_folder
+        self.window.annotation_folder = os.path.join(work_folder, "标注")
+        self.window.find_image_pairs()
+        # 等后台的翻译图哈希完成，加载章节本身的耗时不计入交互指标
+        deadline = time.monotonic() + 30.0
+        while not self.window.page_hashes and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.01)
+        self.app.processEvents()
+        self.samples.clear()
+
+    def wheel_target(self):
+        return self.window.original_view.viewport()
+
+    def drag_target(self):
+        return self.window.original_view.viewport()
+
+    def drag_button(self):
+        return self.qt.left
+
+    def flip_button(self, direction):
+        return self.window.next_button if direction == "next" else self.window.prev_button
+
+
+class ViewerHarness(Harness):
+    """test.py 中的 MainWindow (PyQt6)"""
+
+    def __init__(self, original_folder, translated_folder, work_folder):
+        super().__init__(QtBinding("PyQt6"))
+        import test as viewer_module
+
+        viewer_cls = viewer_module.ImageViewer
+        instrument(viewer_cls, "wheelEvent", self.samples)
+        instrument(viewer_cls, "update_pixmap", self.samples)
+        instrument(viewer_cls, "paintEvent", self.samples)
+        instrument(viewer_module.MainWindow, "show_current", self.samples)
+
+        self.app = self.qt.QtWidgets.QApplication.instance() or self.qt.QtWidgets.QApplication(sys.argv)
+        self.window = viewer_module.MainWindow()
+        self.window.resize(1600, 1000)
+        self.window.show()
+        self.app.processEvents()
+
+        self.window.source_path.setText(original_folder)
+        self.window.target_path.setText(translated_folder)
+        self.window.load_images()
+        self.app.processEvents()
+        self.samples.clear()
+
+    def wheel_target(self):
+        return self.window.viewer1
+
+    def drag_target(self):
+        return self.window.viewer1
+
+    def drag_button(self):
+        return self.qt.middle
+
+    def flip_button(self, direction):
+        return self.window.next_btn if direction == "next" else self.window.prev_btn
+
+
+def run_app(app_name, args):
+    """在当前进程中测试一个前端，返回汇总结果"""
+    harness_cls = ToolHarness if app_name == "tool" else ViewerHarness
+    binding = "PyQt5" if app_name == "tool" else "PyQt6"
+    work_folder = tempfile.mkdtemp(prefix="mangaqc_latency_")
+    isolate_caches(work_folder)
+
+    original_folder, translated_folder = args.original, args.translated
+    if not original_folder:
+        qt = QtBinding(binding)
+        app = qt.QtWidgets.QApplication.instance() or qt.QtWidgets.QApplication(sys.argv)
+        original_folder, translated_folder = generate_chapter(args.generate, work_folder, qt)
+
+    harness = harness_cls(original_folder, translated_folder, work_folder)
+    script = DEFAULT_SCRIPT
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+    try:
+        for _ in range(args.repeat):
+            harness.run_script(script)
+        return summarize(harness.samples)
+    finally:
+        harness.close()
+
+
+def print_summary(app_name, summary):
+    print(f"\n== {app_name} ==")
+    print(f"{'指标':<32}{'次数':>6}{'p50':>9}{'p90':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)")
+    for name, stats in summary.items():
+        print(f"{name:<32}{stats['count']:>6}{stats['p50']:>9.2f}{stats['p90']:>9.2f}"
+              f"{stats['p95']:>9.2f}{stats['p99']:>9.2f}{stats['max']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放合成输入事件，统计缩放、平移、翻页的延迟")
+    parser.add_argument("--app", choices=["tool", "viewer", "all"], default="all")
+    parser.add_argument("--original", help="原图文件夹")
+    parser.add_argument("--translated", help="翻译图文件夹")
+    parser.add_argument("--generate", type=int, default=6, help="未指定文件夹时生成的合成页数")
+    parser.add_argument("--script", help="JSON 回放脚本，默认使用内置脚本")
+    parser.add_argument("--repeat", type=int, default=1, help="脚本重复次数")
+    parser.add_argument("--threshold", action="append", help="阈值，例如 event.wheel:p95=30，可多次指定")
+    parser.add_argument("--json", help="把结果写入 JSON 文件")
+    parser.add_argument("--share-throttle", metavar="延迟毫秒,MB每秒",
+                        help="模拟网络共享：按给定延迟和带宽读取图像文件夹（见 share_cache.py）")
+    args = parser.parse_args()
+
+    if bool(args.original) != bool(args.translated):
+        parser.error("--original 和 --translated 需要同时指定")
+    if args.share_throttle:
+        # 子进程继承环境变量
+        os.environ["MANGAQC_SHARE_THROTTLE"] = args.share_throttle
+
+    results = {}
+    if args.app == "all":
+        # 每个前端在独立的子进程中运行
+        for app_name in ("tool", "viewer"):
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+                result_path = f.name
+            command = [sys.executable, os.path.abspath(__file__), "--app", app_name,
+                       "--generate", str(args.generate), "--repeat", str(args.repeat), "--json", result_path]
+            if args.original:
+                command += ["--original", args.original, "--translated", args.translated]
+            if args.script:
+                command += ["--script", args.script]
+            completed = subprocess.run(command, stdout=subprocess.DEVNULL)
+            if completed.returncode != 0:
+                print(f"{app_name} 运行失败 (退出码 {completed.returncode})")
+                sys.exit(2)
+            with open(result_path, "r", encoding="utf-8") as f:
+                results[app_name] = json.load(f)[app_name]
+            os.remove(result_path)
+    else:
+        results[args.app] = run_app(args.app, args)
+
+    thresholds = parse_thresholds(args.threshold)
+    failures = [f"未知指标: {metric}（没有出现在结果中）" for metric in unknown_metrics(results, thresholds)]
+    for app_name, summary in results.items():
+        print_summary(app_name, summary)
+        failures += [f"{app_name}: {failure}" for failure in check_thresholds(summary, thresholds)]
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if failures:
+        print("\n超过阈值:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
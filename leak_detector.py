@@ -0,0 +1,317 @@
+"""长时间翻页的内存泄漏检测
+
+诊断模式：设置环境变量 MANGAQC_LEAKCHECK=1 后启动 image_comparison_tool.py 或 test.py，
+每次页面加载完成都会记录 Python 分配（tracemalloc）、进程内存和 Qt/PIL 对象数量，
+关闭窗口时打印报告。
+
+浸泡测试（可用于 CI）:
+    python leak_detector.py --app tool --cycles 10
+    python leak_detector.py --app viewer --original 原图 --translated 翻译 --json leak.json
+反复访问同一页面后内存或对象数量持续增长时以退出码 1 结束。
+浸泡测试先完整往返翻页一次并等待后台预取结束，解码缓存填满之后才开始记录，
+缓存本身的占用不算作增长。
+"""
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+# 统计数量的对象类型（按类型名匹配，同时适用于 PyQt5/PyQt6/PIL）
+WATCHED_TYPES = ("QPixmap", "QImage", "QGraphicsPixmapItem", "QGraphicsRectItem",
+                 "QGraphicsTextItem", "QGraphicsScene", "Image", "ImageQt")
+# 只统计非空对象并累计像素字节数的类型
+PIXEL_TYPES = ("QPixmap", "QImage")
+
+# 按分配所在的行统计，只需要保存最近一帧
+TRACE_FRAMES = 1
+
+# 同一页面允许的进程内存（RSS）增长，C++ 对象和像素数据不经过 tracemalloc，
+# 但进程内存本身波动较大，所以阈值比 Python 分配宽
+NATIVE_THRESHOLD_BYTES = 32 * 1024 * 1024
+
+# 忽略检测工具自身的分配
+IGNORED_FILES = (tracemalloc.__file__, __file__)
+
+
+def tracker_from_env():
+    """环境变量 MANGAQC_LEAKCHECK=1 时返回一个 LeakTracker，否则返回None"""
+    if os.environ.get("MANGAQC_LEAKCHECK") == "1":
+        return LeakTracker()
+    return None
+
+
+def wrapper_deleted(obj):
+    """Qt 包装对象对应的 C++ 对象已经被删除时返回 True"""
+    package = type(obj).__module__.split(".")[0]
+    sip = sys.modules.get(f"{package}.sip")
+    try:
+        return bool(sip and sip.isdeleted(obj))
+    except TypeError:
+        return False
+
+
+def count_objects():
+    """统计被关注类型的存活对象数量
+
+    gc 只能看到 Python 包装对象：C++ 对象已经删除的包装不计入，
+    QPixmap/QImage 只统计非空的并累计像素字节数（"QPixmap 字节" 等）。
+    由场景持有、没有 Python 包装的图元由调用方通过 extra_counts 传入场景图元数量，
+    其余 C++ 分配反映在进程内存（native_memory）中。
+    """
+    counts = dict.fromkeys(WATCHED_TYPES, 0)
+    for name in PIXEL_TYPES:
+        counts[f"{name} 字节"] = 0
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        if name not in WATCHED_TYPES:
+            continue
+        if name.startswith("Q") and wrapper_deleted(obj):
+            continue
+        if name in PIXEL_TYPES:
+            if obj.isNull():
+                continue
+            counts[f"{name} 字节"] += obj.width() * obj.height() * obj.depth() // 8
+        counts[name] += 1
+    return counts
+
+
+def native_memory():
+    """返回进程当前占用的物理内存字节数，无法获取时返回None"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (field, ctypes.c_size_t) for field in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                    "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage",
+                    "PagefileUsage", "PeakPagefileUsage")]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if not ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return None
+        return counters.WorkingSetSize
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class LeakTracker:
+    """按页面记录每次访问后的内存和对象数量
+
+    每个页面的前 warmup_visits 次访问可能会建立缓存，之后的第一次访问作为基线，
+    再之后的访问与基线比较。只保存基线和最近一次的快照。
+    缓存在翻完所有页面之后才稳定时（浸泡测试），先完整翻一遍再调用 reset。
+    """
+
+    def __init__(self, threshold_bytes=1024 * 1024, native_threshold_bytes=NATIVE_THRESHOLD_BYTES,
+                 warmup_visits=1):
+        self.threshold_bytes = threshold_bytes
+        self.native_threshold_bytes = native_threshold_bytes
+        self.warmup_visits = warmup_visits
+        self.visits = {}  # 页面 -> [{"memory", "native", "counts"}]
+        self.baselines = {}  # 页面 -> 基线快照
+        self.latest = {}  # 页面 -> 最近一次快照
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACE_FRAMES)
+
+    def reset(self, warmup_visits=0):
+        """丢弃已有的记录，预热已经完成时之后的第一次访问就作为基线"""
+        self.warmup_visits = warmup_visits
+        self.visits.clear()
+        self.baselines.clear()
+        self.latest.clear()
+
+    def visit(self, page, extra_counts=None):
+        """页面加载完成后调用，记录当前内存和对象数量"""
+        gc.collect()
+        counts = count_objects()
+        counts.update(extra_counts or {})
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, path) for path in IGNORED_FILES])
+        # 与分配位置使用同一份快照，不计入检测工具自身保存的快照和记录
+        memory = sum(trace.size for trace in snapshot.traces)
+
+        visits = self.visits.setdefault(page, [])
+        visits.append({"memory": memory, "native": native_memory(), "counts": counts})
+        if len(visits) == self.warmup_visits + 1:
+            self.baselines[page] = snapshot
+        elif len(visits) > self.warmup_visits + 1:
+            self.latest[page] = snapshot
+
+    def findings(self):
+        """返回检测到的增长问题列表"""
+        results = []
+        for page, visits in self.visits.items():
+            if len(visits) < self.warmup_visits + 2:
+                continue
+            baseline, last = visits[self.warmup_visits], visits[-1]
+            memory_growth = last["memory"] - baseline["memory"]
+            # 进程内存在缓存（Qt 内部缓存、映射的像素缓存）填满之前还会上升一段时间后持平，
+            # 只有后一半访问中仍在增长才算泄漏
+            middle = visits[(self.warmup_visits + len(visits) - 1) // 2]
+            native_growth = None
+            if last["native"] is not None and middle["native"] is not None:
+                native_growth = last["native"] - middle["native"]
+            count_growth = {name: last["counts"][name] - baseline["counts"].get(name, 0)
+                            for name in last["counts"]
+                            if last["counts"][name] > baseline["counts"].get(name, 0)}
+            native_leaked = native_growth is not None and native_growth > self.native_threshold_bytes
+            if memory_growth <= self.threshold_bytes and not native_leaked and not count_growth:
+                continue
+
+            sites = []
+            if page in self.baselines and page in self.latest:
+                # 按分配所在的行（最近一帧）汇总
+                stats = self.latest[page].compare_to(self.baselines[page], "lineno")
+                for stat in stats[:10]:
+                    if stat.size_diff <= 0:
+                        continue
+                    frame = stat.traceback[0]
+                    sites.append({"site": f"{frame.filename}:{frame.lineno}",
+                                  "size_diff": stat.size_diff, "count_diff": stat.count_diff})
+            results.append({
+                "page": page,
+                "visits": len(visits),
+                "memory_growth": memory_growth,
+                "native_growth": native_growth,
+                "count_growth": count_growth,
+                "sites": sites,
+            })
+        return results
+
+    def report(self):
+        """打印检测报告，返回是否发现问题"""
+        findings = self.findings()
+        total_visits = sum(len(v) for v in self.visits.values())
+        print(f"\n== 内存泄漏检测: {len(self.visits)} 个页面, {total_visits} 次访问 ==")
+        if not findings:
+            print("未发现重复访问同一页面时的内存或对象增长")
+            return False
+        for finding in findings:
+            native = ""
+            if finding["native_growth"] is not None:
+                native = f", 后一半访问的进程内存增长 {finding['native_growth'] / 1024:.1f} KB"
+            print(f"页面 {finding['page']}: 访问 {finding['visits']} 次, "
+                  f"Python 内存增长 {finding['memory_growth'] / 1024:.1f} KB{native}")
+            for name, growth in finding["count_growth"].items():
+                print(f"    {name}: +{growth}")
+            for site in finding["sites"]:
+                print(f"    {site['site']}  +{site['size_diff'] / 1024:.1f} KB ({site['count_diff']:+d} 块)")
+        return True
+
+
+def settle(app, window, timeout=30.0):
+    """处理事件直到后台预取和缩略图解码全部结束"""
+    cache = getattr(window, "image_cache", None)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        app.processEvents()
+        if cache is None:
+            break
+        with cache.lock:
+            busy = bool(cache.pending)
+        if not busy:
+            break
+        time.sleep(0.05)
+    app.processEvents()
+
+
+def soak(args):
+    """在 offscreen 平台上反复前后翻页，返回 LeakTracker"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from latency_harness import QtBinding, generate_chapter
+
+    work_folder = tempfile.mkdtemp(prefix="mangaqc_leak_")
+    qt = QtBinding("PyQt5" if args.app == "tool" else "PyQt6")
+    app = qt.QtWidgets.QApplication.instance() or qt.QtWidgets.QApplication(sys.argv)
+
+    original_folder, translated_folder = args.original, args.translated
+    if not original_folder:
+        original_folder, translated_folder = generate_chapter(args.generate, work_folder, qt)
+
+    tracker = LeakTracker(threshold_bytes=args.threshold_kb * 1024,
+                          native_threshold_bytes=args.native_threshold_mb * 1024 * 1024)
+    if args.app == "tool":
+        import session_store
+        import image_comparison_tool
+
+        session_store.SESSION_DIR = os.path.join(work_folder, "sessions")
+        window = image_comparison_tool.ImageComparisonTool()
+        window.leak_tracker = tracker
+        window.show()
+        app.processEvents()
+        window.original_folder = original_folder
+        window.translated_folder = translated_folder
+        window.annotation_folder = os.path.join(work_folder, "标注")
+        window.find_image_pairs()
+        page_count = len(window.image_pairs)
+    else:
+        import test as viewer_module
+
+        window = viewer_module.MainWindow()
+        window.leak_tracker = tracker
+        window.show()
+        app.processEvents()
+        window.source_path.setText(original_folder)
+        window.target_path.setText(translated_folder)
+        window.load_images()
+        page_count = len(window.image_files)
+
+    def cycle():
+        for _ in range(page_count - 1):
+            window.next_image()
+            app.processEvents()
+        for _ in range(page_count - 1):
+            window.prev_image()
+            app.processEvents()
+
+    # 预热：每页都解码并进入缓存、后台预取结束后再开始记录
+    cycle()
+    settle(app, window)
+    tracker.reset()
+    for _ in range(args.cycles):
+        cycle()
+    settle(app, window)
+    # 报告由 main 打印，不让 closeEvent 再打印一次
+    window.leak_tracker = None
+    window.close()
+    return tracker
+
+
+def main():
+    parser = argparse.ArgumentParser(description="反复翻页并检测内存和对象数量的增长")
+    parser.add_argument("--app", choices=["tool", "viewer"], default="tool")
+    parser.add_argument("--original", help="原图文件夹")
+    parser.add_argument("--translated", help="翻译图文件夹")
+    parser.add_argument("--generate", type=int, default=4, help="未指定文件夹时生成的合成页数")
+    parser.add_argument("--cycles", type=int, default=10, help="前后翻页的往返次数")
+    parser.add_argument("--threshold-kb", type=int, default=1024, help="同一页面允许的内存增长 (KB)")
+    parser.add_argument("--native-threshold-mb", type=int, default=NATIVE_THRESHOLD_BYTES // 1024 ** 2,
+                        help="同一页面允许的进程内存增长 (MB)")
+    parser.add_argument("--json", help="把检测结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    if bool(args.original) != bool(args.translated):
+        parser.error("--original 和 --translated 需要同时指定")
+
+    tracker = soak(args)
+    leaked = tracker.report()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"visits": tracker.visits, "findings": tracker.findings()}, f,
+                      ensure_ascii=False, indent=2)
+    sys.exit(1 if leaked else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""系列 → 章节 → 页面的资料库索引（SQLite）
+
+记录每页的路径、大小、修改时间、翻译图哈希、审核状态和自动检查发现的问题数量，
+以及所有标注文字的全文索引（annotation_search）。
+索引是增量的：大小和修改时间未变的页面不重新读取图像，只刷新审核状态和问题数量
+（都来自章节已有的 JSON 文件，读取很快）。
+
+资料库浏览器根据索引中的尺寸和文件状态直接构造会话打开章节，不需要重新扫描文件夹。
+章节按 folder_key 列（image_pairing.folder_key 规范化的原图文件夹）查找，
+界面中对话框返回的路径（例如 Windows 上的正斜杠）也能找到对应的章节。
+“需要修改”、“已通过”等查询走索引，跨系列也只需要几毫秒。
+
+sqlite3 连接不能跨线程使用，后台索引线程需要自己调用 connect()。
+"""
+import os
+import time
+import sqlite3
+
+import analysis_cache
+import annotation_search
+import image_decoders
+import review_ledger
+import session_store
+import quality_check
+import overflow_check
+import residue_check
+from export_manifest import file_digest
+from image_pairing import matching_filenames, find_chapters, default_annotation_folder, folder_key
+
+LIBRARY_PATH = os.path.join(os.path.expanduser("~"), ".mangaqc", "library.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS series (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    original_root TEXT NOT NULL UNIQUE,
+    translated_root TEXT NOT NULL,
+    indexed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS chapters (
+    id INTEGER PRIMARY KEY,
+    series_id INTEGER NOT NULL REFERENCES series(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    original_folder TEXT NOT NULL UNIQUE,
+    translated_folder TEXT NOT NULL,
+    annotation_folder TEXT NOT NULL,
+    indexed_at TEXT,
+    folder_key TEXT
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    chapter_id INTEGER NOT NULL REFERENCES chapters(id) ON DELETE CASCADE,
+    filename TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    original_size INTEGER NOT NULL,
+    original_mtime INTEGER NOT NULL,
+    translated_size INTEGER NOT NULL,
+    translated_mtime INTEGER NOT NULL,
+    digest TEXT,
+    approved INTEGER NOT NULL DEFAULT 0,
+    needs_fix INTEGER NOT NULL DEFAULT 0,
+    issue_count INTEGER NOT NULL DEFAULT 0,
+    quality_score REAL,
+    UNIQUE (chapter_id, filename)
+);
+CREATE INDEX IF NOT EXISTS pages_needs_fix ON pages (needs_fix) WHERE needs_fix = 1;
+CREATE INDEX IF NOT EXISTS pages_issues ON pages (issue_count) WHERE issue_count > 0;
+CREATE INDEX IF NOT EXISTS chapters_series ON chapters (series_id);
+"""
+
+
+def connect(path=None):
+    """打开资料库，不存在时创建"""
+    path = path or LIBRARY_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    # WAL 模式下后台索引写入时界面仍然可以查询
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(SCHEMA)
+    conn.executescript(annotation_search.SCHEMA)
+    migrate(conn)
+    return conn
+
+
+def migrate(conn):
+    """旧版资料库的章节表没有 folder_key 列，补上并填入规范化的文件夹"""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(chapters)")}
+    if "folder_key" not in columns:
+        conn.execute("ALTER TABLE chapters ADD COLUMN folder_key TEXT")
+    missing = conn.execute("SELECT id, original_folder FROM chapters WHERE folder_key IS NULL").fetchall()
+    if missing:
+        conn.executemany("UPDATE chapters SET folder_key = ? WHERE id = ?",
+                         [(folder_key(row["original_folder"]), row["id"]) for row in missing])
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS chapters_folder_key ON chapters (folder_key)")
+    conn.commit()
+
+
+def find_chapter(conn, original_folder):
+    """按原图文件夹查找章节（路径的写法和大小写不同也能找到），没有时返回None"""
+    return conn.execute("SELECT * FROM chapters WHERE folder_key = ?", (folder_key(original_folder),)).fetchone()
+
+
+def now():
+    return time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def add_series(conn, original_root, translated_root, name=None):
+    """登记一个系列，已存在时更新翻译根目录，返回系列 id"""
+    original_root = os.path.abspath(original_root)
+    name = name or os.path.basename(os.path.normpath(original_root))
+    conn.execute("INSERT INTO series (name, original_root, translated_root) VALUES (?, ?, ?) "
+                 "ON CONFLICT (original_root) DO UPDATE SET translated_root = excluded.translated_root",
+                 (name, original_root, os.path.abspath(translated_root)))
+    conn.commit()
+    return conn.execute("SELECT id FROM series WHERE original_root = ?", (original_root,)).fetchone()["id"]
+
+
+def chapter_issue_counts(annotation_folder, original_folder, pairs):
+    """从各项检查的结果缓存中统计每页的问题数量和画质分数，只使用仍然有效的缓存"""
+    counts = {}
+    scores = {}
+    quality = quality_check.load_cache(quality_check.cache_path(annotation_folder, original_folder))
+    for filename, result in analysis_cache.split_cached(pairs, quality)[0].items():
+        counts[filename] = counts.get(filename, 0) + len(result["issues"])
+        scores[filename] = result["score"]
+    for module, version in ((overflow_check, overflow_check.OVERFLOW_VERSION),
+                            (residue_check, residue_check.RESIDUE_VERSION)):
+        cache = analysis_cache.load_results(module.cache_path(annotation_folder, original_folder), version)
+        for filename, result in analysis_cache.split_cached(pairs, cache)[0].items():
+            counts[filename] = counts.get(filename, 0) + len(result)
+    return counts, scores
+
+
+def index_chapter(conn, series_id, name, original_folder, translated_folder, image_size=image_decoders.probe):
+    """增量索引一个章节，返回 (页数, 重新读取的页数)"""
+    annotation_folder = default_annotation_folder(original_folder)
+    conn.execute("INSERT INTO chapters (series_id, name, original_folder, translated_folder, annotation_folder, "
+                 "folder_key) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (original_folder) DO UPDATE SET "
+                 "translated_folder = excluded.translated_folder, annotation_folder = excluded.annotation_folder, "
+                 "folder_key = excluded.folder_key",
+                 (series_id, name, original_folder, translated_folder, annotation_folder, folder_key(original_folder)))
+    chapter_id = find_chapter(conn, original_folder)["id"]
+    known = {row["filename"]: row for row in conn.execute("SELECT * FROM pages WHERE chapter_id = ?", (chapter_id,))}
+
+    # 会话和审核记录是界面维护的审核状态
+    session_path = session_store.session_path(original_folder, translated_folder)
+    session = session_store.load_session(session_path) or {}
+    needs_fix = set(session.get("modified_images", []))
+    ledger = review_ledger.load_ledger(review_ledger.ledger_path(annotation_folder, original_folder))
+
+    pages = []
+    reread = 0
+    for filename in matching_filenames(original_folder, translated_folder):
+        original_path = os.path.join(original_folder, filename)
+        translated_path = os.path.join(translated_folder, filename)
+        try:
+            original_stat = session_store.file_stat(original_path)
+            translated_stat = session_store.file_stat(translated_path)
+        except OSError:
+            continue
+        row = known.get(filename)
+        if (row and row["original_size"] == original_stat["size"] and row["original_mtime"] == original_stat["mtime"]
+                and row["translated_size"] == translated_stat["size"]
+                and row["translated_mtime"] == translated_stat["mtime"]):
+            width, height, digest = row["width"], row["height"], row["digest"]
+        else:
+            # 与 find_image_pairs 相同: 尺寸不同的图像不配对
+            size = image_size(original_path)
+            if size is None or size != image_size(translated_path):
+                continue
+            width, height = size
+            record = ledger["pages"].get(filename)
+            try:
+                digest = file_digest(translated_path, record)["digest"]
+            except OSError:
+                continue
+            reread += 1
+        record = ledger["pages"].get(filename) or {}
+        approved = bool(record.get("approved") and record.get("digest") == digest)
+        pages.append([filename, width, height, original_stat, translated_stat, digest, approved,
+                      filename in needs_fix, (original_path, translated_path, filename)])
+
+    counts, scores = chapter_issue_counts(annotation_folder, original_folder, [page[-1] for page in pages])
+    present = {page[0] for page in pages}
+    conn.executemany("DELETE FROM pages WHERE chapter_id = ? AND filename = ?",
+                     [(chapter_id, filename) for filename in known if filename not in present])
+    conn.executemany(
+        "INSERT INTO pages (chapter_id, filename, width, height, original_size, original_mtime, translated_size, "
+        "translated_mtime, digest, approved, needs_fix, issue_count, quality_score) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (chapter_id, filename) DO UPDATE SET "
+        "width = excluded.width, height = excluded.height, original_size = excluded.original_size, "
+        "original_mtime = excluded.original_mtime, translated_size = excluded.translated_size, "
+        "translated_mtime = excluded.translated_mtime, digest = excluded.digest, approved = excluded.approved, "
+        "needs_fix = excluded.needs_fix, issue_count = excluded.issue_count, quality_score = excluded.quality_score",
+        [(chapter_id, filename, width, height, o["size"], o["mtime"], t["size"], t["mtime"], digest,
+          int(approved), int(fix), counts.get(filename, 0), scores.get(filename))
+         for filename, width, height, o, t, digest, approved, fix, _ in pages])
+    annotation_search.index_session(conn, chapter_id, session, annotation_search.session_mtime(session_path))
+    conn.execute("UPDATE chapters SET indexed_at = ? WHERE id = ?", (now(), chapter_id))
+    conn.commit()
+    return len(pages), reread
+
+
+def index_series(conn, series_id, image_size=image_decoders.probe, progress=None):
+    """增量索引一个系列的所有章节，删除已经不存在的章节"""
+    series = conn.execute("SELECT * FROM series WHERE id = ?", (series_id,)).fetchone()
+    chapters = find_chapters(series["original_root"], series["translated_root"])
+    for number, (name, original_folder, translated_folder) in enumerate(chapters, start=1):
+        pages, reread = index_chapter(conn, series_id, name, original_folder, translated_folder, image_size)
+        if progress:
+            progress(f"{series['name']} {number}/{len(chapters)}: {name} ({pages} 页, 重新读取 {reread} 页)")
+    folders = [folder_key(original_folder) for _, original_folder, _ in chapters]
+    conn.execute(f"DELETE FROM chapters WHERE series_id = ? AND folder_key NOT IN "
+                 f"({', '.join('?' * len(folders))})", [series_id] + folders)
+    conn.execute("UPDATE series SET indexed_at = ? WHERE id = ?", (now(), series_id))
+    conn.commit()
+
+
+def update_chapter_status(conn, original_folder, needs_fix, approved):
+    """界面保存会话时同步一个章节的审核状态，needs_fix/approved 为文件名集合"""
+    row = find_chapter(conn, original_folder)
+    if row is None:
+        return
+    conn.execute("UPDATE pages SET needs_fix = 0, approved = 0 WHERE chapter_id = ?", (row["id"],))
+    conn.executemany("UPDATE pages SET needs_fix = 1 WHERE chapter_id = ? AND filename = ?",
+                     [(row["id"], filename) for filename in needs_fix])
+    conn.executemany("UPDATE pages SET approved = 1 WHERE chapter_id = ? AND filename = ?",
+                     [(row["id"], filename) for filename in approved])
+    conn.commit()
+
+
+def list_series(conn):
+    return conn.execute("SELECT * FROM series ORDER BY name").fetchall()
+
+
+def list_chapters(conn, series_id):
+    """章节列表以及页数、需要修改、已通过和有问题的页数"""
+    return conn.execute(
+        "SELECT c.*, COUNT(p.id) AS pages, COALESCE(SUM(p.needs_fix), 0) AS needs_fix, "
+        "COALESCE(SUM(p.approved), 0) AS approved, COALESCE(SUM(p.issue_count > 0), 0) AS flagged "
+        "FROM chapters c LEFT JOIN pages p ON p.chapter_id = c.id "
+        "WHERE c.series_id = ? GROUP BY c.id ORDER BY c.name", (series_id,)).fetchall()
+
+
+def find_pages(conn, series_id=None, needs_fix=None, approved=None, with_issues=False):
+    """按审核状态查询页面，返回带章节信息的行"""
+    conditions = []
+    params = []
+    if series_id is not None:
+        conditions.append("c.series_id = ?")
+        params.append(series_id)
+    if needs_fix is not None:
+        conditions.append("p.needs_fix = ?")
+        params.append(int(needs_fix))
+    if approved is not None:
+        conditions.append("p.approved = ?")
+        params.append(int(approved))
+    if with_issues:
+        conditions.append("p.issue_count > 0")
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return conn.execute(
+        "SELECT p.*, c.name AS chapter, c.original_folder, c.translated_folder, s.name AS series "
+        f"FROM pages p JOIN chapters c ON c.id = p.chapter_id JOIN series s ON s.id = c.series_id {where} "
+        "ORDER BY s.name, c.name, p.filename", params).fetchall()
+
+
+def chapter_session(conn, original_folder):
+    """根据索引构造可以直接打开的会话，章节已有会话时使用已有会话"""
+    chapter = find_chapter(conn, original_folder)
+    if chapter is None:
+        return None
+    existing = session_store.load_session(session_store.session_path(chapter["original_folder"],
+                                                                     chapter["translated_folder"]))
+    if existing:
+        return existing
+    pages = conn.execute("SELECT * FROM pages WHERE chapter_id = ? ORDER BY filename", (chapter["id"],)).fetchall()
+    pairs = [{"filename": p["filename"], "size": [p["width"], p["height"]],
+              "original": {"size": p["original_size"], "mtime": p["original_mtime"]},
+              "translated": {"size": p["translated_size"], "mtime": p["translated_mtime"]}}
+             for p in pages]
+    return session_store.new_session(chapter["original_folder"], chapter["translated_folder"],
+                                     chapter["annotation_folder"], pairs,
+                                     [p["filename"] for p in pages if p["needs_fix"]])
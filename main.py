@@ -10,7 +10,6 @@ from PyQt5.QtWidgets import (
 )
 from PyQt5.QtGui import QPixmap, QImage, QPainter, QColor, QPen
 from PyQt5.QtCore import Qt, QPoint
-import cv2
 
 class ImageCompareView(QGraphicsView):
     def __init__(self):
@@ -23,7 +22,12 @@ class ImageCompareView(QGraphicsView):
         self.setDragMode(QGraphicsView.ScrollHandDrag)
 
     def load_image(self, path):
-        image = QImage(path)
+        import image_decoders
+
+        try:
+            image = image_decoders.to_qimage(image_decoders.decode(path, "full"))
+        except image_decoders.DecodeError:
+            image = QImage()
         self.pixmap_item.setPixmap(QPixmap.fromImage(image))
         self.setSceneRect(self.scene.itemsBoundingRect())
 
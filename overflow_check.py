@@ -0,0 +1,142 @@
+"""排版溢出和文字裁切检测
+
+1. 在原图中找出气泡：明亮、封闭、大小适中且不接触页面边缘的连通区域，
+   闭运算填补其中的原文。接触页面边缘的大片明亮区域视为分格之间的留白。
+2. 翻译图中原本明亮、现在变暗的像素视为新增的笔画（嵌字）。
+3. 紧挨着气泡内嵌字、却落在气泡边框之外的新增笔画视为溢出；
+   落在分格留白中或碰到页面边缘的新增笔画视为被分格或页面裁切。
+
+所有计算在 2 倍缩小的图像上进行。原图的气泡/留白掩码按原图文件状态缓存，
+修正翻译图后重新运行时不需要重新计算。
+"""
+import os
+
+import analysis_cache
+from image_ops import dilate, close, label_regions, component_boxes
+
+OVERFLOW_VERSION = 1
+
+SCALE = 2  # 分析时的缩小倍数
+BRIGHT = 200  # 原图中视为气泡内部/留白的亮度
+INK = 110  # 翻译图中视为笔画的亮度
+MIN_BALLOON_AREA = 600  # 气泡最小面积（缩小后的像素）
+MAX_BALLOON_FRACTION = 0.15  # 气泡最大面积占页面的比例
+MIN_FILL_RATIO = 0.3  # 气泡面积占外接框的最小比例，排除细长的留白
+TEXT_CLOSE_RADIUS = 4  # 填补气泡中文字的闭运算半径
+BORDER_RING = 6  # 气泡边框外侧检查的宽度
+MIN_OVERFLOW_PIXELS = 8  # 小于此面积的越界笔画忽略
+
+KIND_OVERFLOW = "文字溢出气泡"
+KIND_GUTTER = "文字越出分格"
+KIND_PAGE_EDGE = "文字被页面裁切"
+
+
+def balloon_masks(original):
+    """从缩小后的原图计算气泡掩码和分格留白掩码"""
+    import numpy as np
+
+    bright = original > BRIGHT
+    labels, stats = label_regions(bright)
+    height, width = bright.shape
+    max_area = MAX_BALLOON_FRACTION * height * width
+
+    x, y, w, h, area = (stats[1:, i] for i in range(5))
+    touches_edge = (x == 0) | (y == 0) | (x + w >= width) | (y + h >= height)
+    fill_ratio = area / np.maximum(w * h, 1)
+    is_balloon = (~touches_edge & (area >= MIN_BALLOON_AREA) & (area <= max_area)
+                  & (fill_ratio >= MIN_FILL_RATIO))
+    is_gutter = touches_edge & (area > max_area)
+
+    # 标签0是背景，在查找表前补一个False
+    balloon_lut = np.concatenate(([False], is_balloon))
+    gutter_lut = np.concatenate(([False], is_gutter))
+    balloons = close(balloon_lut[labels], TEXT_CLOSE_RADIUS)
+    return balloons, gutter_lut[labels]
+
+
+def cached_balloon_masks(original, original_path, original_stat, cache_folder):
+    """读取或计算原图的气泡/留白掩码，original 为缩小后的原图"""
+    name = os.path.basename(original_path)
+    key = analysis_cache.stats_key(original_stat, OVERFLOW_VERSION)
+    masks = analysis_cache.load_masks(cache_folder, name, key) if cache_folder else None
+    if masks is not None:
+        return masks["balloons"], masks["gutters"]
+    balloons, gutters = balloon_masks(original)
+    if cache_folder:
+        analysis_cache.save_masks(cache_folder, name, key, balloons=balloons, gutters=gutters)
+    return balloons, gutters
+
+
+def find_overflow(original, translated, balloons, gutters):
+    """返回 [(类型, x, y, w, h, 置信度)]，坐标为原图尺寸"""
+    import numpy as np
+
+    height = min(original.shape[0], translated.shape[0])
+    width = min(original.shape[1], translated.shape[1])
+    original, translated = original[:height, :width], translated[:height, :width]
+    balloons, gutters = balloons[:height, :width], gutters[:height, :width]
+
+    new_ink = (translated < INK) & (original > BRIGHT - 20)
+    inside_ink = new_ink & balloons
+    if not inside_ink.any() and not (new_ink & gutters).any():
+        return []
+
+    ring = dilate(balloons, BORDER_RING) & ~balloons
+    near_text = dilate(inside_ink, BORDER_RING)
+    overflow = new_ink & ring & near_text
+
+    page_edge = np.zeros_like(new_ink)
+    page_edge[[0, -1], :] = True
+    page_edge[:, [0, -1]] = True
+    clipped_edge = new_ink & dilate(page_edge, 1)
+    in_gutter = new_ink & gutters & ~clipped_edge
+
+    findings = []
+    for kind, mask in ((KIND_OVERFLOW, overflow), (KIND_GUTTER, in_gutter), (KIND_PAGE_EDGE, clipped_edge)):
+        # 先膨胀把相邻的笔画合成一组，再统计外接框
+        grouped = dilate(mask, 3) if mask.any() else mask
+        for x, y, w, h, _ in component_boxes(grouped, 1, scale=SCALE, padding=8):
+            box = (slice(max(y // SCALE, 0), (y + h) // SCALE), slice(max(x // SCALE, 0), (x + w) // SCALE))
+            pixels = int(mask[box].sum())
+            if pixels < MIN_OVERFLOW_PIXELS:
+                continue
+            findings.append((kind, max(x, 0), max(y, 0), w, h, min(1.0, pixels / 200.0)))
+    return findings
+
+
+def run_check(inputs):
+    """检测一对图像（在工作进程中运行），返回建议标注列表"""
+    balloons, gutters = inputs["balloon_masks"]
+    findings = find_overflow(inputs["original_half"], inputs["translated_half"], balloons, gutters)
+    return [{"source": "overflow", "kind": kind, "rect": [x, y, w, h],
+             "confidence": round(confidence, 3), "text": kind}
+            for kind, x, y, w, h, confidence in findings]
+
+
+def cache_path(annotation_folder, original_folder):
+    return analysis_cache.chapter_cache_path(annotation_folder, original_folder, "排版检查缓存")
+
+
+CHECK = {
+    "name": "overflow",
+    "version": OVERFLOW_VERSION,
+    "inputs": ("original_half", "translated_half", "balloon_masks"),
+    "requires": [("cv2", "scipy")],  # 连通区域标记
+    "run": run_check,
+    "cache_path": cache_path,
+}
+
+
+def run_overflow_checks(pairs, annotation_folder, original_folder, workers=None, progress=None):
+    """对章节运行排版溢出检测，返回 {文件名: 建议标注列表}"""
+    import check_scheduler
+
+    return check_scheduler.run_checks(pairs, annotation_folder, original_folder, ["overflow"],
+                                      workers=workers, progress=progress)["overflow"]
+
+
+def cached_overflow_results(pairs, annotation_folder, original_folder):
+    """只读取缓存中仍然有效的检测结果"""
+    cache = analysis_cache.load_results(cache_path(annotation_folder, original_folder), OVERFLOW_VERSION)
+    results, _ = analysis_cache.split_cached(pairs, cache)
+    return results
@@ -0,0 +1,186 @@
+"""跨进程、跨会话共用的解码像素缓存
+
+PNG/WebP 解码是翻页和分析中最慢的一步，而界面、分析工作进程、导出每次启动都要重新解码。
+这里把解码后的像素按原始布局写入磁盘文件，任何 MangaQC 进程都可以直接 mmap 使用，
+不需要解码也不需要复制（数据由操作系统的页缓存按需读入，多个进程共用同一份物理内存）。
+
+文件布局: 64 字节文件头 + 逐行像素
+    文件头 = 魔数 "MQPX", 版本, 宽, 高, 每行字节数, 像素格式, 像素数据长度
+像素格式的含义由变体决定:
+    "qt"   QImage.Format 的值（界面使用）
+    "gray" 0，表示 uint8 灰度（分析模块使用）
+
+文件名由原文件的绝对路径、大小、修改时间和变体的哈希组成，原文件修改后自然失效，
+旧的缓存按最久未使用淘汰。写入先写临时文件再 os.replace，读取时校验文件头和长度，
+所以多个进程同时读写也只会看到完整的文件；Windows 上正在被映射的文件无法替换或删除，
+这时跳过，下次再处理。
+"""
+import os
+import mmap
+import time
+import struct
+import hashlib
+import threading
+
+import share_cache
+
+CACHE_ROOT = os.path.join(os.path.expanduser("~"), ".mangaqc", "pixel_cache")
+MAX_CACHE_BYTES = 6 * 1024 ** 3
+CACHE_VERSION = 1
+MAGIC = b"MQPX"
+HEADER = struct.Struct("<4sIIIIIQ")  # 魔数, 版本, 宽, 高, 每行字节数, 像素格式, 数据长度
+HEADER_SIZE = 64  # 像素数据从 64 字节处开始，保证对齐
+TOUCH_INTERVAL = 60.0  # 记录使用时间的最小间隔（秒），避免每次读取都写文件元数据
+
+
+class PixelCache:
+    """磁盘上的解码像素缓存，可以在多个线程和进程中使用"""
+
+    def __init__(self, root=CACHE_ROOT, max_bytes=MAX_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.total_bytes = None  # 第一次写入时扫描目录
+        self.lock = threading.Lock()
+
+    def cache_path(self, path, variant):
+        """返回缓存文件路径，原文件不存在时抛出 OSError"""
+        size, mtime = share_cache.stat(path)
+        identity = f"{os.path.abspath(path)}\n{size}\n{mtime}\n{variant}\n{CACHE_VERSION}"
+        digest = hashlib.blake2b(identity.encode("utf-8"), digest_size=16).hexdigest()
+        return os.path.join(self.root, digest[:2], f"{digest}.{variant}.px")
+
+    def get(self, path, variant):
+        """返回 (宽, 高, 每行字节数, 像素格式, 像素 memoryview)，没有缓存时返回 None
+
+        memoryview 引用只读的内存映射，只要还有对象引用它映射就一直有效。
+        """
+        try:
+            cached = self.cache_path(path, variant)
+            with open(cached, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        magic, version, width, height, stride, fmt, length = HEADER.unpack_from(mapping, 0)
+        if magic != MAGIC or version != CACHE_VERSION or len(mapping) != HEADER_SIZE + length:
+            # 其他版本留下的或者损坏的文件
+            mapping.close()
+            self.remove(cached)
+            return None
+        self.touch(cached)
+        return width, height, stride, fmt, memoryview(mapping)[HEADER_SIZE:]
+
+    def put(self, path, variant, width, height, stride, fmt, data):
+        """写入一页的像素（data 为支持缓冲区协议的对象），失败时静默跳过"""
+        try:
+            cached = self.cache_path(path, variant)
+        except OSError:
+            return
+        data = memoryview(data).cast("B")
+        if len(data) != stride * height:
+            return
+        folder = os.path.dirname(cached)
+        tmp_path = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                header = HEADER.pack(MAGIC, CACHE_VERSION, width, height, stride, fmt, len(data))
+                f.write(header.ljust(HEADER_SIZE, b"\0"))
+                f.write(data)
+            os.replace(tmp_path, cached)
+        except OSError:
+            # 另一个进程已经写入并正在映射同一个文件（Windows），内容相同，不需要覆盖
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self.added(HEADER_SIZE + len(data))
+
+    def touch(self, cached):
+        """记录使用时间（文件修改时间），淘汰时其他进程也能看到"""
+        now = time.time()
+        try:
+            if now - os.stat(cached).st_mtime > TOUCH_INTERVAL:
+                os.utime(cached, (now, now))
+        except OSError:
+            pass
+
+    def remove(self, cached):
+        try:
+            size = os.stat(cached).st_size
+            os.remove(cached)
+        except OSError:
+            return False
+        with self.lock:
+            if self.total_bytes is not None:
+                self.total_bytes -= size
+        return True
+
+    def files(self):
+        """返回 [(修改时间, 大小, 路径)]"""
+        found = []
+        try:
+            folders = [entry.path for entry in os.scandir(self.root) if entry.is_dir()]
+        except OSError:
+            return found
+        for folder in folders:
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        found.append((stat.st_mtime, stat.st_size, entry.path))
+            except OSError:
+                continue
+        return found
+
+    def added(self, nbytes):
+        with self.lock:
+            scan = self.total_bytes is None or self.total_bytes + nbytes > self.max_bytes
+            if self.total_bytes is not None:
+                self.total_bytes += nbytes
+        if scan:
+            self.evict()
+
+    def evict(self):
+        """重新扫描目录（包含其他进程写入的文件），总大小超过上限时删除最久未使用的文件"""
+        files = self.files()
+        total = sum(size for _, size, _ in files)
+        if total > self.max_bytes:
+            now = time.time()
+            for mtime, size, cached in sorted(files):
+                if total <= self.max_bytes * 0.9:
+                    break
+                # 还在写入的临时文件只删除很久以前留下的
+                if cached.endswith(".tmp") and now - mtime < 3600:
+                    continue
+                try:
+                    os.remove(cached)
+                except OSError:
+                    continue
+                total -= size
+        with self.lock:
+            self.total_bytes = total
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """进程内共用的 PixelCache，位置取第一次使用时的 CACHE_ROOT"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = PixelCache(CACHE_ROOT)
+        return _default
+
+
+def get(path, variant):
+    return default_cache().get(path, variant)
+
+
+def put(path, variant, width, height, stride, fmt, data):
+    default_cache().put(path, variant, width, height, stride, fmt, data)
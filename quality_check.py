@@ -0,0 +1,178 @@
+"""原图/翻译图的画质回归检查：清晰度、压缩块效应、直方图和色阶
+
+所有指标都用 NumPy 向量化计算。清晰度和块效应在全分辨率下的若干采样图块上计算
+（缩小后这两种信号会消失），直方图和色阶在 4 倍缩小的图像上计算。
+灰度图和缩小图由 check_scheduler 提供，与其他检查共用。
+尺寸不同的图像不会被配对，由 size_mismatch_results 单独给出“分辨率不同”的结果。
+"""
+import analysis_cache
+
+# 指标算法变化时提高版本号，旧的缓存会自动失效
+QUALITY_VERSION = 2
+
+# 采样图块的大小和每个方向上的数量（图块起点对齐到8像素，与JPEG分块一致）
+TILE_SIZE = 256
+TILE_GRID = 4
+HISTOGRAM_BINS = 64
+# 只比较中间的百分位：嵌字会改变最暗和最亮的少量像素（文字、气泡），不代表色阶偏移
+TONE_PERCENTILES = (25, 50, 75)
+
+# 判定为画质下降的阈值
+DEFAULT_THRESHOLDS = {
+    "sharpness_ratio": 0.6,     # 翻译图/原图的清晰度中位比值低于此值
+    "blockiness_increase": 0.15,  # 块效应比原图增加超过此值
+    "histogram_distance": 0.15,   # 直方图差异（总变差距离）超过此值
+    "tone_shift": 12.0,           # 色阶百分位的最大偏移（灰度级）超过此值
+}
+
+# 每项超过阈值的指标对风险分数的最大贡献，避免单个极端值压过其他问题
+MAX_METRIC_SCORE = 3.0
+# 尺寸不同（例如翻译图被缩小）的页面无法比较各项指标，按所有指标都封顶计分，排在最前
+SIZE_MISMATCH_SCORE = MAX_METRIC_SCORE * len(DEFAULT_THRESHOLDS)
+
+ISSUE_NAMES = {
+    "sharpness_ratio": "清晰度下降",
+    "blockiness_increase": "压缩块效应",
+    "histogram_distance": "直方图变化",
+    "tone_shift": "色阶偏移",
+}
+
+
+def cache_path(annotation_folder, original_folder):
+    """每个章节一个画质检查缓存文件"""
+    return analysis_cache.chapter_cache_path(annotation_folder, original_folder, "画质缓存")
+
+
+def load_cache(path):
+    return analysis_cache.load_results(path, QUALITY_VERSION)
+
+
+def save_cache(path, cache):
+    analysis_cache.save_results(path, cache)
+
+
+split_cached = analysis_cache.split_cached
+
+
+def tile_origins(height, width):
+    """在图像上均匀分布的采样图块左上角坐标，对齐到8像素"""
+    rows = max(1, min(TILE_GRID, height // TILE_SIZE))
+    cols = max(1, min(TILE_GRID, width // TILE_SIZE))
+    origins = []
+    for r in range(rows):
+        for c in range(cols):
+            y = (r * max(height - TILE_SIZE, 0) // max(rows - 1, 1)) // 8 * 8
+            x = (c * max(width - TILE_SIZE, 0) // max(cols - 1, 1)) // 8 * 8
+            origins.append((y, x))
+    return origins
+
+
+def laplacian_variance(tile):
+    """拉普拉斯响应的方差，越大越清晰"""
+    lap = (tile[1:-1, :-2] + tile[1:-1, 2:] + tile[:-2, 1:-1] + tile[2:, 1:-1]
+           - 4.0 * tile[1:-1, 1:-1])
+    return float(lap.var())
+
+
+def blockiness(tile):
+    """8x8 分块边界处的梯度相对块内梯度的增幅，0 表示没有块效应"""
+    import numpy as np
+
+    scores = []
+    for diff in (np.abs(np.diff(tile, axis=1)), np.abs(np.diff(tile, axis=0)).T):
+        if diff.shape[1] < 16:
+            continue
+        boundary = np.zeros(diff.shape[1], dtype=bool)
+        boundary[7::8] = True
+        inside = float(diff[:, ~boundary].mean())
+        edge = float(diff[:, boundary].mean())
+        scores.append(edge / inside - 1.0 if inside > 1e-3 else 0.0)
+    return max(0.0, sum(scores) / len(scores)) if scores else 0.0
+
+
+def image_metrics(gray, small):
+    """根据全分辨率灰度图和 4 倍缩小图计算画质指标"""
+    import numpy as np
+
+    gray = gray.astype(np.float32)
+    height, width = gray.shape
+    tiles = [gray[y:y + TILE_SIZE, x:x + TILE_SIZE] for y, x in tile_origins(height, width)]
+
+    histogram, _ = np.histogram(small, bins=HISTOGRAM_BINS, range=(0, 256))
+    return {
+        "size": [width, height],
+        "tile_sharpness": [laplacian_variance(t) for t in tiles],
+        "blockiness": float(np.mean([blockiness(t) for t in tiles])),
+        "histogram": (histogram / max(histogram.sum(), 1)).tolist(),
+        "tone": np.percentile(small, TONE_PERCENTILES).tolist(),
+    }
+
+
+def compare_metrics(original, translated, thresholds=None):
+    """比较一对图像的指标，返回 (问题列表, 风险分数, 差异值)"""
+    thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+
+    # 只比较原图中有纹理的图块，空白区域的比值没有意义
+    ratios = sorted(t / o for o, t in zip(original["tile_sharpness"], translated["tile_sharpness"]) if o > 10.0)
+    values = {
+        "sharpness_ratio": ratios[len(ratios) // 2] if ratios else 1.0,
+        "blockiness_increase": translated["blockiness"] - original["blockiness"],
+        "histogram_distance": 0.5 * sum(abs(a - b) for a, b in zip(original["histogram"], translated["histogram"])),
+        "tone_shift": max(abs(a - b) for a, b in zip(original["tone"], translated["tone"])),
+    }
+
+    issues = []
+    score = 0.0
+    for key, limit in thresholds.items():
+        value = values[key]
+        if key == "sharpness_ratio":
+            exceeded = value < limit
+            excess = (limit - value) / limit
+        else:
+            exceeded = value > limit
+            excess = (value - limit) / limit
+        if exceeded:
+            issues.append(ISSUE_NAMES[key])
+            score += min(1.0 + excess, MAX_METRIC_SCORE)
+    return issues, score, values
+
+
+def size_mismatch_results(mismatched):
+    """pair_images 因尺寸不同跳过的页面（例如翻译图被缩小）的检查结果，{文件名: 结果}
+
+    mismatched 为 [(文件名, 原图尺寸, 翻译图尺寸)]（尺寸为 (宽, 高) 或列表），无法读取尺寸的页面不在结果中。
+    """
+    results = {}
+    for filename, original_size, translated_size in mismatched:
+        if original_size is None or translated_size is None:
+            continue
+        results[filename] = {"issues": ["分辨率不同"], "score": SIZE_MISMATCH_SCORE, "values": {},
+                             "original": {"size": list(original_size)},
+                             "translated": {"size": list(translated_size)}}
+    return results
+
+
+def run_check(inputs):
+    """比较一对图像的画质（在工作进程中运行）"""
+    original = image_metrics(inputs["original_gray"], inputs["original_quarter"])
+    translated = image_metrics(inputs["translated_gray"], inputs["translated_quarter"])
+    issues, score, values = compare_metrics(original, translated)
+    return {"issues": issues, "score": score, "values": values,
+            "original": original, "translated": translated}
+
+
+CHECK = {
+    "name": "quality",
+    "version": QUALITY_VERSION,
+    "inputs": ("original_gray", "translated_gray", "original_quarter", "translated_quarter"),
+    "run": run_check,
+    "cache_path": cache_path,
+}
+
+
+def run_quality_checks(pairs, annotation_folder, original_folder, workers=None, progress=None):
+    """对章节中的所有图像对运行画质检查，只分析有变化的页面，返回 {文件名: 结果}"""
+    import check_scheduler
+
+    return check_scheduler.run_checks(pairs, annotation_folder, original_folder, ["quality"],
+                                      workers=workers, progress=progress)["quality"]
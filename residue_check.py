@@ -0,0 +1,121 @@
+"""清理残留检测：嵌字前没有擦干净的原文笔画
+
+1. 原图中气泡内的暗像素视为原文笔画（气泡掩码与排版溢出检测共用同一份缓存）。
+2. 翻译图中仍然和原图几乎一样暗的笔画像素视为“保留下来的笔画”，
+   变亮的笔画像素视为“已擦除的笔画”。
+3. 把相邻的保留笔画合成一组。周围大部分原文已被擦除、自身面积很小的组
+   就是清理残留；整个气泡都没有动过（例如有意保留的原文）则不报告。
+
+置信度由周围的擦除比例、残留和背景的对比度以及残留大小共同决定，
+结果按置信度从高到低排列。笔画很细，所以在全分辨率下比较。
+"""
+import analysis_cache
+import overflow_check
+from image_ops import dilate, label_regions
+
+RESIDUE_VERSION = 1
+
+STROKE = 110  # 视为笔画的亮度
+MATCH_TOLERANCE = 40  # 翻译图与原图亮度差在此范围内视为笔画保留
+ERASED = 180  # 原文笔画位置在翻译图中亮于此值视为已擦除
+GROUP_RADIUS = 6  # 合并相邻残留笔画的膨胀半径
+MIN_RESIDUE_PIXELS = 6  # 小于此面积的残留忽略（噪点）
+MAX_RESIDUE_PIXELS = 600  # 大于此面积的不是残留，而是没有清理的整段文字
+MIN_ERASED_RATIO = 0.6  # 周围原文笔画中至少有这么多已被擦除
+MIN_CONFIDENCE = 0.2
+
+KIND_RESIDUE = "清理残留"
+
+
+def upsample_mask(mask, factor, shape):
+    """把缩小后的掩码放大回 shape 大小，不足的部分补False"""
+    import numpy as np
+
+    full = np.zeros(shape, dtype=bool)
+    large = mask.repeat(factor, axis=0).repeat(factor, axis=1)[:shape[0], :shape[1]]
+    full[:large.shape[0], :large.shape[1]] = large
+    return full
+
+
+def find_residue(original, translated, balloons):
+    """返回按置信度排序的 [(x, y, w, h, 置信度)]，original/translated 为全分辨率 uint8"""
+    import numpy as np
+
+    height = min(original.shape[0], translated.shape[0])
+    width = min(original.shape[1], translated.shape[1])
+    original, translated = original[:height, :width], translated[:height, :width]
+    balloons = upsample_mask(balloons, overflow_check.SCALE, (height, width))
+
+    strokes = (original < STROKE) & balloons
+    if not strokes.any():
+        return []
+    original_i = original.astype(np.int16)
+    translated_i = translated.astype(np.int16)
+    survived = strokes & (translated < STROKE) & (np.abs(translated_i - original_i) < MATCH_TOLERANCE)
+    erased = strokes & (translated > ERASED)
+    if not survived.any() or not erased.any():
+        return []
+
+    labels, stats = label_regions(dilate(survived, GROUP_RADIUS))
+    count = len(stats)
+    flat = labels.ravel()
+    survived_count = np.bincount(flat, weights=survived.ravel(), minlength=count)
+    # 用膨胀后的组统计周围被擦除的笔画
+    erased_count = np.bincount(flat, weights=erased.ravel(), minlength=count)
+    residue_sum = np.bincount(flat, weights=(translated_i * survived).ravel(), minlength=count)
+    background = float(np.median(translated[balloons & ~strokes])) if (balloons & ~strokes).any() else 255.0
+
+    findings = []
+    for index in range(1, count):
+        pixels = survived_count[index]
+        if not MIN_RESIDUE_PIXELS <= pixels <= MAX_RESIDUE_PIXELS:
+            continue
+        erased_ratio = erased_count[index] / (erased_count[index] + pixels)
+        if erased_ratio < MIN_ERASED_RATIO:
+            continue
+        contrast = max(0.0, background - residue_sum[index] / pixels) / 255.0
+        size_factor = min(1.0, pixels / 40.0)
+        confidence = erased_ratio * min(1.0, contrast * 1.5) * (0.5 + 0.5 * size_factor)
+        if confidence < MIN_CONFIDENCE:
+            continue
+        x, y, w, h, _ = (int(v) for v in stats[index])
+        findings.append((x, y, w, h, round(float(confidence), 3)))
+    findings.sort(key=lambda f: f[4], reverse=True)
+    return findings
+
+
+def run_check(inputs):
+    """检测一对图像（在工作进程中运行），返回按置信度排序的建议标注列表"""
+    balloons, _ = inputs["balloon_masks"]
+    return [{"source": "residue", "kind": KIND_RESIDUE, "rect": [x, y, w, h],
+             "confidence": confidence, "text": KIND_RESIDUE}
+            for x, y, w, h, confidence in find_residue(inputs["original_gray"], inputs["translated_gray"], balloons)]
+
+
+def cache_path(annotation_folder, original_folder):
+    return analysis_cache.chapter_cache_path(annotation_folder, original_folder, "残留检查缓存")
+
+
+CHECK = {
+    "name": "residue",
+    "version": RESIDUE_VERSION,
+    "inputs": ("original_gray", "translated_gray", "balloon_masks"),
+    "requires": [("cv2", "scipy")],  # 连通区域标记
+    "run": run_check,
+    "cache_path": cache_path,
+}
+
+
+def run_residue_checks(pairs, annotation_folder, original_folder, workers=None, progress=None):
+    """对章节并行运行清理残留检测，返回 {文件名: 建议标注列表}"""
+    import check_scheduler
+
+    return check_scheduler.run_checks(pairs, annotation_folder, original_folder, ["residue"],
+                                      workers=workers, progress=progress)["residue"]
+
+
+def cached_residue_results(pairs, annotation_folder, original_folder):
+    """只读取缓存中仍然有效的检测结果"""
+    cache = analysis_cache.load_results(cache_path(annotation_folder, original_folder), RESIDUE_VERSION)
+    results, _ = analysis_cache.split_cached(pairs, cache)
+    return results
@@ -0,0 +1,186 @@
+"""审核服务器（review_server）的客户端
+
+界面连接服务器时先把章节的原始文件下载到本地镜像文件夹（只下载有变化的文件），
+画质检查和导出使用镜像中的原文件；页面显示使用服务器生成的图块金字塔，
+只下载和解码当前缩放级别下可见的图块，不在每台机器上解码整页。
+图块以文件状态为键缓存在镜像文件夹中，内容不会变化。
+标注通过共享标注存储与其他审核人员同步。
+"""
+import os
+import json
+import shutil
+import getpass
+import threading
+import urllib.request
+from urllib.parse import quote
+
+import shared_annotations
+
+TIMEOUT = 10
+MIRROR_ROOT = os.path.join(os.path.expanduser("~"), ".mangaqc", "remote")
+MANIFEST_NAME = "镜像清单.json"
+
+
+class ReviewClient:
+    def __init__(self, base_url, chapter=None, author=None):
+        self.base_url = base_url.rstrip("/")
+        self.chapter = chapter
+        self.author = author or getpass.getuser()
+        self.store = shared_annotations.AnnotationStore()  # 本地副本，seq 为已拉取到的位置
+        self.page_stats = {}  # 文件名 -> {"original": 文件状态, "translated": 文件状态}
+        self.infos = {}  # (文件名, 视图, 状态键) -> 图块金字塔信息
+        self.lock = threading.Lock()
+
+    def url(self, *parts, query=""):
+        path = "/".join(quote(str(part), safe="") for part in parts)
+        return f"{self.base_url}/api/chapters/{path}".rstrip("/") + query
+
+    def request(self, url, data=None, timeout=TIMEOUT):
+        body = None if data is None else json.dumps(data, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"} if body else {})
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            return response.read()
+
+    def get_json(self, *parts, query=""):
+        return json.loads(self.request(self.url(*parts, query=query)).decode("utf-8"))
+
+    def chapters(self):
+        return self.get_json()
+
+    def pages(self):
+        pages = self.get_json(self.chapter, "pages")
+        with self.lock:
+            self.page_stats = {page["filename"]: {side: page[side] for side in ("original", "translated")}
+                               for page in pages}
+        return pages
+
+    def page_info(self, filename, side):
+        """图块金字塔信息 {"tile_size", "levels": [[宽, 高], ...]}"""
+        return self.get_json(self.chapter, "pages", filename, side)
+
+    def tile(self, filename, side, level, col, row):
+        return self.request(self.url(self.chapter, "pages", filename, side, level, f"{col}_{row}.png"))
+
+    def tile_folder(self, filename, side):
+        """页面图块的本地缓存目录，以 pages() 得到的文件状态为键；不知道状态时返回None"""
+        with self.lock:
+            stat = self.page_stats.get(filename, {}).get(side)
+        if stat is None:
+            return None
+        return os.path.join(mirror_folder(self.base_url, self.chapter), "tiles", side, filename,
+                            f"{stat['size']}_{stat['mtime']}")
+
+    def cached_page_info(self, filename, side):
+        """带缓存的图块金字塔信息，第一次使用时删除该页旧版本的图块"""
+        folder = self.tile_folder(filename, side)
+        with self.lock:
+            info = self.infos.get((filename, side, folder))
+        if info is not None:
+            return info
+        info_path = folder and os.path.join(folder, "info.json")
+        try:
+            with open(info_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (TypeError, OSError, ValueError):
+            info = self.page_info(filename, side)
+            if folder:
+                base = os.path.dirname(folder)
+                if os.path.isdir(base):
+                    for name in os.listdir(base):
+                        if name != os.path.basename(folder):
+                            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+                write_atomic(info_path, json.dumps(info).encode("utf-8"))
+        with self.lock:
+            self.infos[(filename, side, folder)] = info
+        return info
+
+    def cached_tile(self, filename, side, level, col, row):
+        """图块的 PNG 数据，先查本地缓存，没有时下载并写入缓存"""
+        folder = self.tile_folder(filename, side)
+        path = folder and os.path.join(folder, str(level), f"{col}_{row}.png")
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except (TypeError, OSError):
+            pass
+        data = self.tile(filename, side, level, col, row)
+        if path:
+            try:
+                write_atomic(path, data)
+            except OSError:
+                pass
+        return data
+
+    def original_file(self, filename, side):
+        return self.request(self.url(self.chapter, "pages", filename, side, "file"), timeout=60)
+
+    def pull(self):
+        """拉取上次之后其他人（和自己）提交的记录，返回改变了本地副本的记录"""
+        data = self.get_json(self.chapter, "annotations", query=f"?since={self.store.seq}")
+        return self.store.merge(data["records"])
+
+    def push_page(self, filename, page):
+        """把本地编辑后的页面标注作为增删记录提交，返回提交的记录数"""
+        changes = self.store.diff_page(filename, page, self.author)
+        if changes:
+            # 服务器分配序号后下次拉取时会再收到这些记录，合并是幂等的
+            self.request(self.url(self.chapter, "annotations"), {"records": changes})
+            self.store.merge(changes)
+        return len(changes)
+
+
+def write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def mirror_folder(base_url, chapter):
+    host = base_url.split("://", 1)[-1].rstrip("/").replace(":", "_").replace("/", "_")
+    return os.path.join(MIRROR_ROOT, host, *chapter.split("/"))
+
+
+def mirror_chapter(client, progress=None):
+    """把章节的原始文件下载到本地镜像，只下载服务器上有变化的文件
+
+    返回 (原图文件夹, 翻译文件夹)。progress(已完成, 总数) 在每页后调用。
+    """
+    root = mirror_folder(client.base_url, client.chapter)
+    folders = {side: os.path.join(root, side) for side in ("original", "translated")}
+    for folder in folders.values():
+        os.makedirs(folder, exist_ok=True)
+    manifest_path = os.path.join(root, MANIFEST_NAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    pages = client.pages()
+    wanted = {page["filename"] for page in pages}
+    for side, folder in folders.items():
+        for filename in os.listdir(folder):
+            if filename not in wanted:
+                os.remove(os.path.join(folder, filename))
+
+    for done, page in enumerate(pages, 1):
+        filename = page["filename"]
+        for side, folder in folders.items():
+            path = os.path.join(folder, filename)
+            if manifest.get(side, {}).get(filename) == page[side] and os.path.exists(path):
+                continue
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(client.original_file(filename, side))
+            os.replace(tmp_path, path)
+            manifest.setdefault(side, {})[filename] = page[side]
+        if progress:
+            progress(done, len(pages))
+
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+    return folders["original"], folders["translated"]
@@ -0,0 +1,86 @@
+from collections import deque
+from contextlib import contextmanager
+
+# 最多保留的历史记录条数
+HISTORY_LIMIT = 10000
+
+
+class ReviewHistory:
+    """整个章节的撤销/重做历史
+
+    每条记录为 (说明, 文件名, 增量元组)，只保存变化前后的少量数据，
+    不保存图像快照，上千次操作后占用的内存仍然很小。增量的格式：
+
+    ("annotation", 视图名, 序号, 旧数据, 新数据)  旧数据为None表示添加，新数据为None表示删除
+    ("flag", 旧值, 新值)                          “需要修改”标记
+    ("approval", 旧记录, 新记录)                   审核记录中该页的条目，None表示没有条目
+    ("suggestion", 建议键, 旧值, 新值)              建议是否已采纳或忽略（不再显示）
+
+    增量的具体应用由界面负责，这个类只管理记录的顺序。
+    """
+
+    def __init__(self, limit=HISTORY_LIMIT):
+        self.undo_stack = deque(maxlen=limit)
+        self.redo_stack = []
+        self._group = None
+
+    def __len__(self):
+        return len(self.undo_stack)
+
+    def record(self, label, filename, deltas):
+        """记录一次操作，新的操作会清空重做记录"""
+        deltas = tuple(deltas)
+        if not deltas:
+            return
+        if self._group is not None:
+            self._group["deltas"].extend(deltas)
+            return
+        self.undo_stack.append((label, filename, deltas))
+        self.redo_stack.clear()
+
+    @contextmanager
+    def group(self, label, filename):
+        """把多个操作合并为一条记录，例如“通过本页”同时修改审核记录和标记"""
+        if self._group is not None:
+            yield
+            return
+        self._group = {"deltas": []}
+        try:
+            yield
+        finally:
+            deltas = self._group["deltas"]
+            self._group = None
+            self.record(label, filename, deltas)
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def pop_undo(self):
+        """取出最近一条记录用于撤销，没有时返回None"""
+        if not self.undo_stack:
+            return None
+        entry = self.undo_stack.pop()
+        self.redo_stack.append(entry)
+        return entry
+
+    def pop_redo(self):
+        """取出最近撤销的一条记录用于重做，没有时返回None"""
+        if not self.redo_stack:
+            return None
+        entry = self.redo_stack.pop()
+        self.undo_stack.append(entry)
+        return entry
+
+    def discard_page(self, filename):
+        """删除某页的记录，例如其他审核人员修改了该页的标注后，记录中的序号已经失效"""
+        self.undo_stack = deque((entry for entry in self.undo_stack if entry[1] != filename),
+                                maxlen=self.undo_stack.maxlen)
+        self.redo_stack = [entry for entry in self.redo_stack if entry[1] != filename]
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self._group = None
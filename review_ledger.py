@@ -0,0 +1,89 @@
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from export_manifest import file_digest
+
+LEDGER_VERSION = 1
+
+# hashlib 在处理大块数据时会释放 GIL，线程池即可并行计算
+HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+def ledger_path(annotation_folder, original_folder):
+    """每个章节一个审核记录文件，按原图文件夹名区分章节
+
+    原图在修订轮次之间不会变化，所以即使汉化组把修订版放到新的文件夹，
+    也能找到之前的审核记录。
+    """
+    chapter = os.path.basename(os.path.normpath(original_folder))
+    return os.path.join(annotation_folder, f"{chapter}_审核记录.json")
+
+
+def load_ledger(path):
+    """读取审核记录，不存在或损坏时返回空记录"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            ledger = json.load(f)
+    except (OSError, ValueError):
+        return {"version": LEDGER_VERSION, "pages": {}}
+
+    if ledger.get("version") != LEDGER_VERSION:
+        return {"version": LEDGER_VERSION, "pages": {}}
+    ledger.setdefault("pages", {})
+    return ledger
+
+
+def save_ledger(path, ledger):
+    """原子地写入审核记录"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(ledger, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def hash_pages(paths, ledger):
+    """并行计算翻译图像的内容哈希
+
+    paths 为 {文件名: 路径}，返回 {文件名: {"size", "mtime", "digest"}}。
+    大小和修改时间未变的文件直接复用记录中的哈希。读取失败的文件不出现在结果中。
+    """
+    pages = ledger["pages"]
+
+    def work(item):
+        filename, path = item
+        try:
+            return filename, file_digest(path, pages.get(filename))
+        except OSError:
+            return filename, None
+
+    with ThreadPoolExecutor(max_workers=HASH_WORKERS) as executor:
+        results = executor.map(work, paths.items())
+        return {filename: info for filename, info in results if info is not None}
+
+
+def unchanged_approved(ledger, hashes):
+    """返回已经通过审核且内容没有变化的文件名集合"""
+    unchanged = set()
+    for filename, info in hashes.items():
+        record = ledger["pages"].get(filename)
+        if record and record.get("approved") and record.get("digest") == info["digest"]:
+            unchanged.add(filename)
+    return unchanged
+
+
+def approve(ledger, filename, info):
+    """记录某页在当前内容下已通过审核"""
+    record = dict(info)
+    record["approved"] = True
+    record["approved_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    ledger["pages"][filename] = record
+
+
+def revoke(ledger, filename):
+    """撤销某页的通过记录"""
+    record = ledger["pages"].get(filename)
+    if record:
+        record["approved"] = False
@@ -0,0 +1,299 @@
+"""局域网多人审核服务器
+
+在一台机器上运行，其他审核人员通过 HTTP 读取同一批章节:
+
+    python review_server.py 原图根目录 翻译根目录 --host 0.0.0.0 --port 8765
+
+- 图像按多分辨率分块（图块金字塔）提供。每页第一次被请求（或后台预生成）时解码一次，
+  生成所有级别的图块并缓存在章节的标注文件夹中，之后所有人的请求都直接读缓存。
+  缓存以文件大小和修改时间为键，翻译图修改后自动重新生成。
+- 界面客户端按当前缩放只下载和显示可见的图块，不在每台机器上解码整页。
+- 原始文件也可以直接下载，客户端用它在本地建立章节镜像，画质检查看到的像素与原文件完全相同。
+- 标注存放在每个章节的共享标注存储中（shared_annotations），多个客户端可以同时提交，
+  按“最后写入者胜”的规则合并，没有冲突。
+
+接口（章节名和文件名需要 URL 编码，章节名中的 / 编码为 %2F）:
+    GET  /api/chapters
+    GET  /api/chapters/<章节>/pages
+    GET  /api/chapters/<章节>/pages/<文件名>/<original|translated>            图块金字塔信息
+    GET  /api/chapters/<章节>/pages/<文件名>/<original|translated>/file       原始文件
+    GET  /api/chapters/<章节>/pages/<文件名>/<original|translated>/<级别>.png  整个级别
+    GET  /api/chapters/<章节>/pages/<文件名>/<original|translated>/<级别>/<列>_<行>.png
+    GET  /api/chapters/<章节>/annotations?since=<序号>
+    POST /api/chapters/<章节>/annotations   {"records": [...]}
+
+serve(..., port=0) 在随机端口启动，可以完全在 localhost 上测试。
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import unquote, urlsplit, parse_qs
+
+import analysis_cache
+import image_decoders
+import session_store
+import shared_annotations
+from image_pairing import pair_images, find_chapters, default_annotation_folder
+
+TILE_VERSION = 1
+TILE_SIZE = 512
+SIDES = ("original", "translated")
+DEFAULT_PORT = 8765
+
+
+def pyramid_levels(width, height):
+    """每一级的尺寸，第0级为原图，之后每级缩小一半，直到能放进一个图块"""
+    levels = [(width, height)]
+    while max(width, height) > TILE_SIZE:
+        width, height = max(1, (width + 1) // 2), max(1, (height + 1) // 2)
+        levels.append((width, height))
+    return levels
+
+
+def build_pyramid(path, folder):
+    """解码一次图像，写入所有级别的整图和图块，最后写入 info.json 表示完成"""
+    from PIL import Image
+
+    os.makedirs(folder, exist_ok=True)
+    image = image_decoders.to_pil(image_decoders.decode(path, "full"))
+    levels = pyramid_levels(*image.size)
+    current = image
+    for level, (width, height) in enumerate(levels):
+        if level > 0:
+            current = current.resize((width, height), Image.BOX)
+        current.save(os.path.join(folder, f"{level}.png"), compress_level=1)
+        level_folder = os.path.join(folder, str(level))
+        os.makedirs(level_folder, exist_ok=True)
+        for row in range(0, height, TILE_SIZE):
+            for col in range(0, width, TILE_SIZE):
+                tile = current.crop((col, row, min(col + TILE_SIZE, width), min(row + TILE_SIZE, height)))
+                tile.save(os.path.join(level_folder, f"{col // TILE_SIZE}_{row // TILE_SIZE}.png"),
+                          compress_level=1)
+
+    info = {"tile_size": TILE_SIZE, "levels": [list(size) for size in levels]}
+    tmp_path = os.path.join(folder, f"info.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    os.replace(tmp_path, os.path.join(folder, "info.json"))
+    return info
+
+
+class Chapter:
+    """服务器上的一个章节：图像对、图块缓存和共享标注"""
+
+    def __init__(self, name, original_folder, translated_folder):
+        self.name = name
+        self.original_folder = original_folder
+        self.translated_folder = translated_folder
+        self.annotation_folder = default_annotation_folder(original_folder)
+        pairs, _ = pair_images(original_folder, translated_folder)
+        self.pages = {filename: {"original": o, "translated": t, "size": list(size)}
+                      for o, t, filename, size in pairs}
+        self.order = [filename for _, _, filename, _ in pairs]
+        self.store = shared_annotations.AnnotationStore(
+            shared_annotations.store_path(self.annotation_folder, original_folder))
+        self.locks = {}
+        self.locks_lock = threading.Lock()
+
+    def page_list(self):
+        pages = []
+        for filename in self.order:
+            page = self.pages[filename]
+            try:
+                stats = {side: session_store.file_stat(page[side]) for side in SIDES}
+            except OSError:
+                continue
+            pages.append(dict(stats, filename=filename, size=page["size"]))
+        return pages
+
+    def pyramid(self, filename, side):
+        """返回 (图块目录, 金字塔信息)，缓存不存在时生成；同一页同时只生成一次"""
+        path = self.pages[filename][side]
+        stat = session_store.file_stat(path)
+        key = analysis_cache.stats_key(stat, TILE_VERSION)
+        base = os.path.join(analysis_cache.mask_dir(self.annotation_folder, self.original_folder, "tiles"),
+                            side, filename)
+        folder = os.path.join(base, key)
+        info_path = os.path.join(folder, "info.json")
+
+        with self.locks_lock:
+            lock = self.locks.setdefault((filename, side), threading.Lock())
+        with lock:
+            try:
+                with open(info_path, "r", encoding="utf-8") as f:
+                    return folder, json.load(f)
+            except (OSError, ValueError):
+                pass
+            # 删除旧版本的图块
+            if os.path.isdir(base):
+                for name in os.listdir(base):
+                    if name != key:
+                        shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+            return folder, build_pyramid(path, folder)
+
+    def pregenerate(self, executor):
+        """在后台生成整个章节的图块，之后所有客户端的请求都不需要再解码"""
+        return [executor.submit(self.pyramid, filename, side) for filename in self.order for side in SIDES]
+
+
+class ReviewServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, chapters):
+        self.chapters = {chapter.name: chapter for chapter in chapters}
+        super().__init__(address, ReviewHandler)
+
+
+class ReviewHandler(BaseHTTPRequestHandler):
+    server_version = "MangaQCReview/1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_file(self, path, content_type, immutable=False):
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except OSError:
+            self.send_json({"error": "not found"}, 404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if immutable:
+            # 图块目录以文件状态为键，内容不会变化
+            self.send_header("Cache-Control", "max-age=31536000, immutable")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def route(self):
+        """返回 (/api/chapters/ 之后的路径部分, 查询参数)，其他路径返回 None"""
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        if parts[:2] != ["api", "chapters"]:
+            return None
+        return parts[2:], parse_qs(url.query)
+
+    def do_GET(self):
+        routed = self.route()
+        if routed is None:
+            self.send_json({"error": "not found"}, 404)
+            return
+        parts, query = routed
+        chapters = self.server.chapters
+        if not parts:
+            self.send_json([{"name": c.name, "pages": len(c.order)} for c in chapters.values()])
+            return
+        chapter = chapters.get(parts[0])
+        if chapter is None:
+            self.send_json({"error": "unknown chapter"}, 404)
+            return
+        rest = parts[1:]
+        try:
+            if rest == ["pages"]:
+                self.send_json(chapter.page_list())
+            elif rest == ["annotations"]:
+                since = int(query.get("since", ["0"])[0])
+                self.send_json({"seq": chapter.store.seq, "records": chapter.store.since(since)})
+            elif len(rest) >= 3 and rest[0] == "pages" and rest[1] in chapter.pages and rest[2] in SIDES:
+                self.get_page(chapter, rest[1], rest[2], rest[3:])
+            else:
+                self.send_json({"error": "not found"}, 404)
+        except (OSError, ValueError) as e:
+            self.send_json({"error": str(e)}, 500)
+
+    def get_page(self, chapter, filename, side, rest):
+        if rest == ["file"]:
+            self.send_file(chapter.pages[filename][side], "application/octet-stream")
+            return
+        folder, info = chapter.pyramid(filename, side)
+        if not rest:
+            self.send_json(info)
+        elif len(rest) == 1 and rest[0].endswith(".png"):
+            self.send_file(os.path.join(folder, os.path.basename(rest[0])), "image/png", immutable=True)
+        elif len(rest) == 2 and rest[1].endswith(".png"):
+            self.send_file(os.path.join(folder, os.path.basename(rest[0]), os.path.basename(rest[1])),
+                           "image/png", immutable=True)
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        routed = self.route()
+        if routed is None or len(routed[0]) != 2 or routed[0][1] != "annotations":
+            self.send_json({"error": "not found"}, 404)
+            return
+        chapter = self.server.chapters.get(routed[0][0])
+        if chapter is None:
+            self.send_json({"error": "unknown chapter"}, 404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            records = json.loads(self.rfile.read(length).decode("utf-8"))["records"]
+            accepted = chapter.store.merge(records, assign_seq=True)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json({"error": f"无效的标注记录: {e}"}, 400)
+            return
+        if accepted:
+            try:
+                chapter.store.save()
+            except OSError as e:
+                # 记录已经合并到内存中，下次保存时一起写入
+                print(f"保存共享标注失败: {e}")
+        self.send_json({"accepted": len(accepted), "seq": chapter.store.seq})
+
+
+def serve(chapters, host="127.0.0.1", port=DEFAULT_PORT, pregenerate_workers=None):
+    """启动服务器（在后台线程中处理请求），返回服务器对象
+
+    chapters 为 [(章节名, 原图文件夹, 翻译文件夹)]。pregenerate_workers 不为 None 时
+    在后台线程池中预先生成所有图块。用 server.shutdown() 停止。
+    """
+    server = ReviewServer((host, port), [Chapter(*chapter) for chapter in chapters])
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    if pregenerate_workers is not None:
+        executor = ThreadPoolExecutor(max_workers=pregenerate_workers, thread_name_prefix="tiles")
+        for chapter in server.chapters.values():
+            chapter.pregenerate(executor)
+        executor.shutdown(wait=False)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="局域网多人审核服务器")
+    parser.add_argument("original_root", help="原图根目录（每个子文件夹一个章节，或本身就是一个章节）")
+    parser.add_argument("translated_root", help="翻译图根目录，章节文件夹的相对路径与原图相同")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，局域网共享时使用 0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="预生成图块的线程数")
+    parser.add_argument("--no-pregenerate", action="store_true", help="不预生成图块，第一次请求时再生成")
+    args = parser.parse_args()
+
+    chapters = find_chapters(args.original_root, args.translated_root)
+    if not chapters:
+        print("没有找到可以配对的章节")
+        sys.exit(1)
+
+    server = serve(chapters, args.host, args.port, None if args.no_pregenerate else args.workers)
+    print(f"审核服务器已启动: http://{args.host}:{server.server_address[1]}/api/chapters "
+          f"({len(chapters)} 个章节)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import json
+import time
+import hashlib
+
+import share_cache
+from image_pairing import matching_filenames
+
+SESSION_VERSION = 1
+
+# 会话文件保存在用户目录下，每个原图/翻译图文件夹组合一个文件
+SESSION_DIR = os.path.join(os.path.expanduser("~"), ".mangaqc", "sessions")
+
+
+def session_path(original_folder, translated_folder):
+    """根据章节的两个文件夹得到会话文件路径"""
+    key = "\n".join(os.path.normcase(os.path.abspath(p)) for p in (original_folder, translated_folder))
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+    chapter = os.path.basename(os.path.normpath(original_folder))
+    return os.path.join(SESSION_DIR, f"{chapter}_{digest}.json")
+
+
+def latest_session_path():
+    """返回最近保存的会话文件，没有时返回None"""
+    try:
+        names = [f for f in os.listdir(SESSION_DIR) if f.endswith(".json")]
+    except OSError:
+        return None
+    if not names:
+        return None
+    paths = [os.path.join(SESSION_DIR, f) for f in names]
+    return max(paths, key=os.path.getmtime)
+
+
+def load_session(path):
+    """读取会话文件，不存在、损坏或版本不同时返回None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if session.get("version") != SESSION_VERSION:
+        return None
+    return session
+
+
+def save_session(session):
+    """原子地写入会话文件"""
+    session["version"] = SESSION_VERSION
+    session["saved_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    path = session_path(session["original_folder"], session["translated_folder"])
+    os.makedirs(SESSION_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(session, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def new_session(original_folder, translated_folder, annotation_folder, pairs, modified_images=(), mismatched=()):
+    """不经过界面构造一个可以打开的会话
+
+    pairs 为 [{"filename", "size", "original", "translated"}]，mismatched 为 mismatched_entry 的结果列表。
+    视图状态为空，打开时适应窗口。
+    """
+    return {
+        "original_folder": original_folder,
+        "translated_folder": translated_folder,
+        "annotation_folder": annotation_folder,
+        "pairs": pairs,
+        "mismatched": list(mismatched),
+        "current_index": 0,
+        "modified_images": sorted(modified_images),
+        "page_annotations": {},
+        "dismissed_suggestions": {},
+        "view": {"transform": None, "original_scroll": [0, 0], "translated_scroll": [0, 0],
+                 "quality_mode": "高质量", "min_zoom_index": 0, "changed_only": True},
+    }
+
+
+def file_stat(path):
+    """返回用于检查文件是否变化的大小和修改时间（网络文件夹查目录清单，不逐个访问文件）"""
+    size, mtime = share_cache.stat(path)
+    return {"size": size, "mtime": mtime}
+
+
+def mismatched_entry(original_folder, translated_folder, filename, original_size, translated_size):
+    """尺寸不同而没有配对的图像在会话中的记录
+
+    校验会话时这些图像不算新增图像，文件变化（例如重新导出为正确尺寸）时提示重新扫描。
+    """
+    entry = {"filename": filename,
+             "original_size": list(original_size) if original_size else None,
+             "translated_size": list(translated_size) if translated_size else None}
+    for key, folder in (("original", original_folder), ("translated", translated_folder)):
+        try:
+            entry[key] = file_stat(os.path.join(folder, filename))
+        except OSError:
+            entry[key] = None
+    return entry
+
+
+def validate_session(session):
+    """检查会话中记录的图像对与文件系统是否一致
+
+    返回问题描述列表，列表为空表示会话仍然有效。这个函数只读文件系统，
+    可以在后台线程中运行。
+    """
+    original_folder = session["original_folder"]
+    translated_folder = session["translated_folder"]
+    if not os.path.isdir(original_folder) or not os.path.isdir(translated_folder):
+        return ["图像文件夹不存在"]
+
+    problems = []
+    recorded = {pair["filename"]: pair for pair in session["pairs"]}
+    recorded.update((entry["filename"], entry) for entry in session.get("mismatched", []))
+    try:
+        current = set(matching_filenames(original_folder, translated_folder))
+    except OSError as e:
+        return [f"无法读取图像文件夹: {e}"]
+
+    for filename in sorted(current - set(recorded)):
+        problems.append(f"新增图像: {filename}")
+    for filename in sorted(set(recorded) - current):
+        problems.append(f"图像已删除: {filename}")
+
+    for filename in sorted(current & set(recorded)):
+        pair = recorded[filename]
+        for key, folder in (("original", original_folder), ("translated", translated_folder)):
+            try:
+                stat = file_stat(os.path.join(folder, filename))
+            except OSError:
+                problems.append(f"无法读取图像: {filename}")
+                break
+            if stat != pair.get(key):
+                problems.append(f"图像已修改: {filename}")
+                break
+    return problems
@@ -0,0 +1,347 @@
+"""网络共享文件夹（NAS/SMB/NFS）的读取层
+
+通过 SMB 逐个 os.stat 和读取图像，每次往返都要几十毫秒，翻页可能要等好几秒。
+对网络文件夹:
+- 目录只列一次（os.scandir 同时得到文件大小和修改时间），之后的 file_stat 都查这份清单，
+  清单超过 LISTING_TTL 秒后下次使用时重新列出
+- 图像用大块顺序读取复制到本地磁盘缓存，以后所有读取（界面解码、工作进程的分析）都读本地副本
+- 翻页时在后台按顺序预读后面几页，翻到时文件已经在本地
+本地文件夹不经过缓存，直接使用原路径。
+
+本地缓存文件名包含原路径的哈希、文件大小和修改时间，文件在共享上被修改后自然失效；
+多个进程可以同时使用同一个缓存目录（先写临时文件再 os.replace）。
+总大小超过上限时删除最久没有使用的副本。
+
+把环境变量 MANGAQC_SHARE_THROTTLE 设为 "延迟毫秒,MB每秒"（例如 "30,40"）时，
+所有文件夹都当作网络文件夹，并按给定的延迟和带宽限制列目录和读取，
+可以用本地文件夹模拟慢速共享来测试（例如配合 latency_harness.py）。
+"""
+import os
+import sys
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_ROOT = os.path.join(os.path.expanduser("~"), ".mangaqc", "share_cache")
+MAX_CACHE_BYTES = 8 * 1024 ** 3
+BLOCK_SIZE = 8 * 1024 * 1024  # 每次从共享读取的块大小
+LISTING_TTL = 30.0  # 目录清单的有效时间（秒）
+READ_AHEAD = 6  # 向后预读的页数
+
+THROTTLE_ENV = "MANGAQC_SHARE_THROTTLE"
+NETWORK_FILESYSTEMS = {"cifs", "smb3", "smbfs", "nfs", "nfs4", "afpfs", "fuse.sshfs", "davfs", "9p"}
+
+
+def parse_throttle(value):
+    """解析 "延迟毫秒,MB每秒"，返回 (延迟秒, 字节每秒)，未设置或格式错误时返回None"""
+    try:
+        latency, rate = value.split(",")
+        return float(latency) / 1000.0, float(rate) * 1024 * 1024
+    except (AttributeError, ValueError):
+        return None
+
+
+def mount_types():
+    """Linux 上返回 [(挂载点, 文件系统类型)]，按挂载点长度从长到短排列"""
+    try:
+        with open("/proc/mounts", "r", encoding="utf-8") as f:
+            mounts = [line.split()[1:3] for line in f if len(line.split()) >= 3]
+    except OSError:
+        return []
+    mounts = [(point.replace("\\040", " "), fstype) for point, fstype in mounts]
+    return sorted(mounts, key=lambda m: len(m[0]), reverse=True)
+
+
+def is_network_folder(folder):
+    """判断文件夹是否在网络共享上"""
+    folder = os.path.abspath(folder)
+    if sys.platform == "win32":
+        if folder.startswith("\\\\"):
+            return True
+        import ctypes
+
+        drive = os.path.splitdrive(folder)[0] + "\\"
+        return ctypes.windll.kernel32.GetDriveTypeW(drive) == 4  # DRIVE_REMOTE
+    folder = os.path.realpath(folder)
+    for point, fstype in mount_types():
+        if folder == point or folder.startswith(point.rstrip("/") + "/"):
+            return fstype in NETWORK_FILESYSTEMS
+    return False
+
+
+class ShareCache:
+    """目录清单、本地磁盘缓存和后台预读，可以在多个线程中使用"""
+
+    def __init__(self, root=CACHE_ROOT, max_bytes=MAX_CACHE_BYTES, throttle=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.throttle = throttle if throttle is not None else parse_throttle(os.environ.get(THROTTLE_ENV))
+        self.remote = {}  # 文件夹 -> 是否网络文件夹
+        self.listings = {}  # 文件夹 -> (列出时间, {文件名: (大小, 修改时间)})
+        self.entries = None  # 缓存文件名 -> (大小, 最后使用时间)，第一次使用时扫描缓存目录
+        self.total_bytes = 0
+        self.fetching = {}  # 缓存文件名 -> 正在复制的 Future
+        self.generation = 0  # 每次预读加一，旧的预读任务不再执行
+        self.lock = threading.Lock()
+        # 共享上并发读取通常比顺序读取慢，预读只用一个线程
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="read-ahead")
+
+    def wait(self, nbytes=0):
+        """模拟慢速共享的延迟和带宽"""
+        if self.throttle:
+            latency, rate = self.throttle
+            time.sleep(latency + nbytes / rate)
+
+    def is_remote(self, folder):
+        folder = os.path.normpath(folder)
+        with self.lock:
+            remote = self.remote.get(folder)
+        if remote is None:
+            remote = bool(self.throttle) or is_network_folder(folder)
+            with self.lock:
+                self.remote[folder] = remote
+        return remote
+
+    def listing(self, folder, refresh=False):
+        """返回 {文件名: (大小, 修改时间)}，网络文件夹在有效期内只列一次"""
+        folder = os.path.normpath(folder)
+        with self.lock:
+            cached = self.listings.get(folder)
+        if cached is not None and not refresh and time.monotonic() - cached[0] < LISTING_TTL:
+            return cached[1]
+        self.wait()
+        files = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    continue
+        with self.lock:
+            self.listings[folder] = (time.monotonic(), files)
+        return files
+
+    def invalidate(self, folder=None):
+        """丢弃目录清单，下次使用时重新列出"""
+        with self.lock:
+            if folder is None:
+                self.listings.clear()
+            else:
+                self.listings.pop(os.path.normpath(folder), None)
+
+    def list_names(self, folder):
+        if self.is_remote(folder):
+            return list(self.listing(folder))
+        return os.listdir(folder)
+
+    def stat(self, path):
+        """返回 (大小, 修改时间)，网络文件夹查目录清单，文件不存在时抛出 FileNotFoundError"""
+        folder, filename = os.path.split(path)
+        if not self.is_remote(folder):
+            stat = os.stat(path)
+            return stat.st_size, stat.st_mtime_ns
+        stat = self.listing(folder).get(filename)
+        if stat is None:
+            raise FileNotFoundError(path)
+        return stat
+
+    def cache_name(self, path, size, mtime):
+        digest = hashlib.blake2b(os.path.abspath(path).encode("utf-8"), digest_size=10).hexdigest()
+        return f"{digest}_{size}_{mtime}{os.path.splitext(path)[1].lower()}"
+
+    def local_path(self, path):
+        """返回可以直接读取的本地路径：本地文件原样返回，网络文件返回缓存副本（没有时先复制）"""
+        folder = os.path.dirname(path)
+        if not self.is_remote(folder):
+            return path
+        try:
+            name = self.cache_name(path, *self.stat(path))
+        except OSError:
+            return path
+        self.scan_cache()
+        with self.lock:
+            future = self.fetching.get(name)
+            hit = name in self.entries
+        if future is not None:
+            try:
+                return future.result()
+            except OSError:
+                return path
+        # 另一个线程可能刚刚淘汰了这个副本，这时重新复制
+        if hit and self.touch(name):
+            return os.path.join(self.root, name)
+        try:
+            return self.fetch(path, name)
+        except OSError:
+            return path
+
+    def read_ahead(self, paths):
+        """在后台按顺序把网络文件复制到本地缓存，新的调用会取消之前还没开始的预读"""
+        with self.lock:
+            self.generation += 1
+            generation = self.generation
+        for path in paths:
+            if self.is_remote(os.path.dirname(path)):
+                self.executor.submit(self.read_ahead_one, path, generation)
+
+    def read_ahead_one(self, path, generation):
+        with self.lock:
+            if generation != self.generation:
+                return
+        self.local_path(path)
+
+    def fetch(self, path, name):
+        """用大块顺序读取把文件复制到缓存，返回缓存路径"""
+        from concurrent.futures import Future
+
+        future = Future()
+        tmp_path = os.path.join(self.root, f"{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with self.lock:
+            running = self.fetching.get(name)
+            if running is None:
+                self.fetching[name] = future
+        if running is not None:
+            return running.result()
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(path, "rb", buffering=0) as source:
+                stat = os.fstat(source.fileno())
+                self.wait()
+                with open(tmp_path, "wb") as target:
+                    while True:
+                        block = source.read(BLOCK_SIZE)
+                        if not block:
+                            break
+                        self.wait(len(block))
+                        target.write(block)
+            # 列出目录之后文件又被修改时以实际打开的文件为准
+            actual = self.cache_name(path, stat.st_size, stat.st_mtime_ns)
+            cached = os.path.join(self.root, actual)
+            os.replace(tmp_path, cached)
+            folder, filename = os.path.split(os.path.normpath(path))
+            with self.lock:
+                listing = self.listings.get(folder)
+                if listing is not None:
+                    listing[1][filename] = (stat.st_size, stat.st_mtime_ns)
+                prefix = actual.split("_", 1)[0] + "_"
+                for old in [n for n in self.entries if n.startswith(prefix) and n != actual]:
+                    self.remove(old)
+                if actual not in self.entries:
+                    self.total_bytes += stat.st_size
+                self.entries[actual] = (stat.st_size, time.time())
+            self.evict()
+            future.set_result(cached)
+            return cached
+        except OSError as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.fetching.pop(name, None)
+
+    def scan_cache(self):
+        """第一次使用时读取缓存目录中已有的副本（可能由其他进程或上次运行留下）"""
+        with self.lock:
+            if self.entries is not None:
+                return
+        entries = {}
+        try:
+            with os.scandir(self.root) as items:
+                for item in items:
+                    if item.name.endswith(".tmp"):
+                        continue
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    entries[item.name] = (stat.st_size, stat.st_mtime)
+        except OSError:
+            pass
+        with self.lock:
+            if self.entries is None:
+                self.entries = entries
+                self.total_bytes = sum(size for size, _ in entries.values())
+
+    def touch(self, name):
+        """记录使用时间（写入文件修改时间，其他进程也能看到），副本已被淘汰时返回False"""
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is None:
+                return False
+            self.entries[name] = (entry[0], now)
+        try:
+            os.utime(os.path.join(self.root, name), (now, now))
+        except OSError:
+            pass
+        return True
+
+    def remove(self, name):
+        """删除一个副本（调用时持有锁）；其他进程正在读取而删除失败时留到下次"""
+        try:
+            os.remove(os.path.join(self.root, name))
+        except FileNotFoundError:
+            pass
+        except OSError:
+            return
+        size, _ = self.entries.pop(name)
+        self.total_bytes -= size
+
+    def evict(self):
+        """总大小超过上限时删除最久没有使用的副本"""
+        with self.lock:
+            if self.total_bytes <= self.max_bytes:
+                return
+            for name in sorted(self.entries, key=lambda n: self.entries[n][1]):
+                if self.total_bytes <= self.max_bytes * 0.9:
+                    break
+                if name not in self.fetching:
+                    self.remove(name)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_cache():
+    """进程内共用的 ShareCache，位置取第一次使用时的 CACHE_ROOT"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ShareCache(CACHE_ROOT)
+        return _default
+
+
+def list_names(folder):
+    return default_cache().list_names(folder)
+
+
+def stat(path):
+    return default_cache().stat(path)
+
+
+def local_path(path):
+    return default_cache().local_path(path)
+
+
+def read_ahead(paths):
+    default_cache().read_ahead(paths)
+
+
+def invalidate(folder=None):
+    default_cache().invalidate(folder)
+
+
+def shutdown():
+    if _default is not None:
+        _default.shutdown()
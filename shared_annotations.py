@@ -0,0 +1,141 @@
+"""多人同时审核时共享的标注存储
+
+每条标注是一条记录:
+    {"id", "filename", "view", "rect": [x, y, w, h], "text", "author", "clock", "deleted"}
+id 由页面、视图、位置和文字决定，两个人添加了完全相同的标注会合并为一条。
+修改标注等于删除旧记录（保留 deleted=True 的墓碑）并添加新记录。
+
+合并规则是“最后写入者胜”：同一 id 的两条记录中 (clock, author) 较大的保留。
+clock 是 Lamport 时钟，客户端每次修改时取见过的最大值加一。
+这个规则满足交换律、结合律和幂等性，所以记录以任何顺序、重复多少次到达，
+所有副本最终都一致，不会出现冲突。
+
+服务器给每条被接受的记录分配递增的序号 seq，客户端只需要拉取上次之后的记录。
+"""
+import os
+import json
+import hashlib
+import threading
+
+STORE_VERSION = 1
+
+FIELDS = ("id", "filename", "view", "rect", "text", "author", "clock", "deleted", "seq")
+
+
+def store_path(annotation_folder, original_folder):
+    chapter = os.path.basename(os.path.normpath(original_folder))
+    return os.path.join(annotation_folder, f"{chapter}_共享标注.json")
+
+
+def record_id(filename, view, rect, text):
+    payload = json.dumps([filename, view, [round(v, 2) for v in rect], text], ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=12).hexdigest()
+
+
+def newer(a, b):
+    """a 是否应该覆盖 b"""
+    return (a["clock"], a["author"], a["deleted"]) > (b["clock"], b["author"], b["deleted"])
+
+
+class AnnotationStore:
+    """一个章节的标注记录副本，可以在多个线程中使用"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.records = {}  # id -> 记录
+        self.clock = 0  # 见过的最大 Lamport 时钟
+        self.seq = 0  # 最后分配的序号（只在服务器上有意义）
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # 保证较早的快照不会覆盖较新的快照
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != STORE_VERSION:
+            return
+        self.records = {record["id"]: record for record in data["records"]}
+        self.clock = max((record["clock"] for record in self.records.values()), default=0)
+        self.seq = data.get("seq", max((record.get("seq", 0) for record in self.records.values()), default=0))
+
+    def save(self):
+        """原子地写入磁盘，多个线程同时保存时依次写入"""
+        if not self.path:
+            return
+        with self.save_lock:
+            with self.lock:
+                data = {"version": STORE_VERSION, "seq": self.seq, "records": list(self.records.values())}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+    def merge(self, records, assign_seq=False):
+        """合并收到的记录，返回被接受（改变了副本）的记录列表"""
+        accepted = []
+        with self.lock:
+            for record in records:
+                record = {key: record[key] for key in FIELDS if key in record}
+                current = self.records.get(record["id"])
+                self.clock = max(self.clock, record["clock"])
+                if not assign_seq and "seq" in record:
+                    # 客户端拉取到的位置，自己已经合并过的记录也要前进
+                    self.seq = max(self.seq, record["seq"])
+                if current is not None and not newer(record, current):
+                    if record.get("seq", 0) > current.get("seq", 0) and not assign_seq:
+                        current["seq"] = record["seq"]
+                    continue
+                if assign_seq:
+                    self.seq += 1
+                    record["seq"] = self.seq
+                self.records[record["id"]] = record
+                accepted.append(record)
+        return accepted
+
+    def since(self, seq):
+        """序号大于 seq 的记录"""
+        with self.lock:
+            return sorted((r for r in self.records.values() if r.get("seq", 0) > seq), key=lambda r: r["seq"])
+
+    def page_annotations(self, filename):
+        """页面上仍然有效的标注，{"original": [(x, y, w, h, 文字)], "translated": [...]}，按添加顺序排列"""
+        with self.lock:
+            live = sorted((r for r in self.records.values() if r["filename"] == filename and not r["deleted"]),
+                          key=lambda r: (r["clock"], r["id"]))
+        page = {"original": [], "translated": []}
+        for record in live:
+            page.setdefault(record["view"], []).append(tuple(record["rect"]) + (record["text"],))
+        return page
+
+    def diff_page(self, filename, page, author):
+        """把本地编辑后的页面标注转换为记录：新出现的标注添加，消失的标注删除"""
+        current = {}
+        with self.lock:
+            for record in self.records.values():
+                if record["filename"] == filename and not record["deleted"]:
+                    current[record["id"]] = record
+        wanted = {}
+        for view, items in page.items():
+            for x, y, w, h, text in items:
+                rect = [x, y, w, h]
+                wanted[record_id(filename, view, rect, text)] = (view, rect, text)
+
+        changes = []
+        with self.lock:
+            for rid, (view, rect, text) in wanted.items():
+                if rid not in current:
+                    self.clock += 1
+                    changes.append({"id": rid, "filename": filename, "view": view, "rect": rect, "text": text,
+                                    "author": author, "clock": self.clock, "deleted": False})
+            for rid, record in current.items():
+                if rid not in wanted:
+                    self.clock += 1
+                    tombstone = dict(record, author=author, clock=self.clock, deleted=True)
+                    tombstone.pop("seq", None)
+                    changes.append(tombstone)
+        return changes
@@ -0,0 +1,84 @@
+"""启动优化：后台预热重量级模块，以及导入耗时报告
+
+用法: python startup.py [模块名 ...]
+默认报告 image_comparison_tool、main、test 三个入口的导入耗时。
+"""
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+import threading
+
+# 启动时不导入、在窗口显示后于后台预热的重量级模块
+HEAVY_MODULES = ("numpy", "cv2", "PIL.Image", "PIL.ImageDraw", "PIL.ImageFont")
+
+# 后台预热中每个模块的导入耗时（秒），导入失败的模块不记录
+warm_up_times = {}
+
+
+def warm_up(modules=HEAVY_MODULES):
+    """依次导入模块，缺少的可选依赖直接跳过"""
+    for name in modules:
+        if name in sys.modules:
+            continue
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        warm_up_times[name] = time.perf_counter() - start
+
+
+def warm_up_in_background(modules=HEAVY_MODULES):
+    """在后台线程中预热模块，第一次真正用到时就不需要再等待导入"""
+    thread = threading.Thread(target=warm_up, args=(modules,), daemon=True)
+    thread.start()
+    return thread
+
+
+def import_time_report(module):
+    """在新的解释器中导入模块并收集 -X importtime 的输出
+
+    返回 [(累计耗时微秒, 自身耗时微秒, 模块名), ...]，按累计耗时从大到小排序。
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(parts[0]), int(parts[1])
+        except ValueError:
+            continue  # 表头
+        rows.append((cumulative_us, self_us, parts[2].strip()))
+    if result.returncode != 0:
+        print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"导入 {module} 失败")
+    rows.sort(reverse=True)
+    return rows
+
+
+def print_report(module, top=20):
+    """打印模块导入耗时排行"""
+    rows = import_time_report(module)
+    if not rows:
+        return
+    print(f"\n== {module}: 共 {rows[0][0] / 1000:.1f} ms ==")
+    print(f"{'累计(ms)':>10} {'自身(ms)':>10}  模块")
+    for cumulative_us, self_us, name in rows[:top]:
+        print(f"{cumulative_us / 1000:>10.1f} {self_us / 1000:>10.1f}  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="显示各入口模块的启动导入耗时")
+    parser.add_argument("modules", nargs="*", default=["image_comparison_tool", "main", "test"])
+    parser.add_argument("--top", type=int, default=20, help="每个模块显示的条目数")
+    args = parser.parse_args()
+    for module in args.modules:
+        print_report(module, args.top)
+
+
+if __name__ == "__main__":
+    main()
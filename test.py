@@ -1,7 +1,11 @@
 import sys
 import os
 from PyQt6 import QtCore, QtWidgets, QtGui
-from PIL import Image, ImageDraw, ImageFont, ImageQt
+
+import image_decoders
+from leak_detector import tracker_from_env
+
+# PIL 在第一次加载图像时才导入，窗口可以先显示出来
 
 
 class ImageViewer(QtWidgets.QLabel):
@@ -19,22 +23,27 @@ class ImageViewer(QtWidgets.QLabel):
         self.drag_start_scroll = QtCore.QPoint()  # 新增：拖动起始滚动位置
         self.start_point = QtCore.QPoint()
         self.end_point = QtCore.QPoint()
-        self.annotations = []
+        self.image = None
+        self.annotations = []  # [((x1, y1, x2, y2), 文本)]，使用原图坐标
+        self.redo_annotations = []  # 撤销后可以重做的标注
         self.linked_viewer = None  # 新增：用于链接另一个ImageViewer
 
     def set_linked_viewer(self, viewer):  # 新增方法
         self.linked_viewer = viewer
 
     def load_image(self, path):
-        image = Image.open(path).convert("RGBA")
+        image = image_decoders.to_pil(image_decoders.decode(path, "full")).convert("RGBA")
         self.original_size = image.size
-        self.original_image = image.copy()  # 新增：保存原始图像
-        self.image = image.copy()
+        # 标注只在显示和导出时绘制，原图不需要复制
+        self.image = image
         self.annotations = []  # 清除旧的标注
+        self.redo_annotations = []
         self.scale_factor = 1.0  # 重置缩放比例
         self.update_pixmap()  # 加载图像时仍然居中显示
 
     def update_pixmap(self, skip_center=False):
+        from PIL import Image, ImageQt
+
         resized_image = self.image.resize(
             (
                 int(self.original_size[0] * self.scale_factor),
@@ -42,6 +51,8 @@ class ImageViewer(QtWidgets.QLabel):
             ),
             Image.Resampling.LANCZOS,
         )
+        # 在缩放后的新图像上绘制标注，不修改原图
+        self.draw_annotations(resized_image, self.scale_factor)
         qimage = ImageQt.ImageQt(resized_image)
         self.pixmap = QtGui.QPixmap.fromImage(qimage)
         self.setPixmap(self.pixmap)
@@ -281,7 +292,15 @@ class ImageViewer(QtWidgets.QLabel):
                 self, "问题描述", "请输入问题描述："
             )
             if ok and text:
-                self.annotations.append((rect, text))
+                # 转换为原图坐标保存，缩放后位置保持不变
+                box = (
+                    rect.left() / self.scale_factor,
+                    rect.top() / self.scale_factor,
+                    rect.right() / self.scale_factor,
+                    rect.bottom() / self.scale_factor,
+                )
+                self.annotations.append((box, text))
+                self.redo_annotations = []
                 self.redraw_annotations()
         elif event.button() == QtCore.Qt.MouseButton.MiddleButton and self.dragging:
             # 结束拖动
@@ -300,16 +319,28 @@ class ImageViewer(QtWidgets.QLabel):
             self.setCursor(QtCore.Qt.CursorShape.ArrowCursor)
         super().leaveEvent(event)
 
-    def redraw_annotations(self):
-        draw = ImageDraw.Draw(self.image)
+    def draw_annotations(self, image, scale):
+        """在给定图像上绘制所有标注，scale为该图像相对原图的缩放比例"""
+        if not self.annotations:
+            return
+        from PIL import ImageDraw, ImageFont
+
+        draw = ImageDraw.Draw(image)
         font = ImageFont.load_default()
-        for rect, text in self.annotations:
-            x1 = rect.topLeft().x() / self.scale_factor
-            y1 = rect.topLeft().y() / self.scale_factor
-            x2 = rect.bottomRight().x() / self.scale_factor
-            y2 = rect.bottomRight().y() / self.scale_factor
+        for (x1, y1, x2, y2), text in self.annotations:
+            x1, y1, x2, y2 = x1 * scale, y1 * scale, x2 * scale, y2 * scale
             draw.rectangle([x1, y1, x2, y2], outline="red", width=3)
             draw.text((x1, y1 - 15), text, fill="red", font=font)
+
+    def annotated_image(self):
+        """返回带标注的原尺寸图像，用于导出"""
+        if not self.annotations:
+            return self.image
+        image = self.image.copy()
+        self.draw_annotations(image, 1.0)
+        return image
+
+    def redraw_annotations(self):
         self.update_pixmap(skip_center=True)  # 修改：跳过居中
 
     def paintEvent(self, event):
@@ -331,31 +362,25 @@ class ImageViewer(QtWidgets.QLabel):
             and event.modifiers() == QtCore.Qt.KeyboardModifier.ControlModifier
         ):
             self.undo_last_annotation()
+        elif event.matches(QtGui.QKeySequence.StandardKey.Redo):
+            self.redo_last_annotation()
         else:
             super().keyPressEvent(event)
 
     def undo_last_annotation(self):
         """撤销最后一个标注"""
         if self.annotations:
-            self.annotations.pop()  # 移除最后一个标注
+            self.redo_annotations.append(self.annotations.pop())  # 移除最后一个标注
             self.redraw_all_annotations()  # 重新绘制所有标注
 
-    def redraw_all_annotations(self):
-        """重新绘制所有标注（从原始图像开始）"""
-        if hasattr(self, "original_image"):
-            # 重新从原始图像开始
-            self.image = self.original_image.copy()
+    def redo_last_annotation(self):
+        """重做最后一个撤销的标注"""
+        if self.redo_annotations:
+            self.annotations.append(self.redo_annotations.pop())
+            self.redraw_all_annotations()
 
-        # 重新绘制所有剩余的标注
-        draw = ImageDraw.Draw(self.image)
-        font = ImageFont.load_default()
-        for rect, text in self.annotations:
-            x1 = rect.topLeft().x() / self.scale_factor
-            y1 = rect.topLeft().y() / self.scale_factor
-            x2 = rect.bottomRight().x() / self.scale_factor
-            y2 = rect.bottomRight().y() / self.scale_factor
-            draw.rectangle([x1, y1, x2, y2], outline="red", width=3)
-            draw.text((x1, y1 - 15), text, fill="red", font=font)
+    def redraw_all_annotations(self):
+        """重新绘制所有标注（标注在显示时绘制到缩放后的图像上）"""
         self.update_pixmap(skip_center=True)
 
 
@@ -451,6 +476,7 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.image_files = []
         self.current_index = 0
+        self.leak_tracker = tracker_from_env()  # 内存泄漏诊断模式
 
     def select_folder(self, line_edit):
         folder = QtWidgets.QFileDialog.getExistingDirectory(self, "选择文件夹")
@@ -479,6 +505,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self.viewer1.load_image(src)
         self.viewer2.load_image(tgt)
         self.update_nav_buttons()
+        if self.leak_tracker:
+            self.leak_tracker.visit(os.path.basename(src), {
+                "annotations": len(self.viewer1.annotations) + len(self.viewer2.annotations),
+            })
+
+    def closeEvent(self, event):
+        if self.leak_tracker:
+            self.leak_tracker.report()
+            print("\n".join(image_decoders.report()))
+        super().closeEvent(event)
 
     def update_nav_buttons(self):
         self.prev_btn.setEnabled(self.current_index > 0)
@@ -526,8 +562,10 @@ class MainWindow(QtWidgets.QMainWindow):
                     return
 
             try:
+                from PIL import Image
+
                 # 处理图像格式转换
-                image_to_save = viewer.image
+                image_to_save = viewer.annotated_image()
                 file_ext = ext.lower()
 
                 # 如果是 JPEG 格式且图像是 RGBA 模式，需要转换为 RGB
@@ -549,7 +587,13 @@ class MainWindow(QtWidgets.QMainWindow):
 
 
 if __name__ == "__main__":
+    import startup
+
     app = QtWidgets.QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    # 窗口显示后在后台预热 PIL
+    QtCore.QTimer.singleShot(0, lambda: startup.warm_up_in_background(
+        ("PIL.Image", "PIL.ImageDraw", "PIL.ImageFont", "PIL.ImageQt")))
+    QtCore.QTimer.singleShot(0, image_decoders.benchmark_in_background)
     sys.exit(app.exec())
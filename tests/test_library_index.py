@@ -0,0 +1,51 @@
+"""资料库按规范化的原图文件夹查找章节"""
+import os
+import sqlite3
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import annotation_search
+import library_index
+
+
+@pytest.fixture
+def library(tmp_path):
+    for side in ("raw", "tl"):
+        folder = tmp_path / side / "第1话"
+        folder.mkdir(parents=True)
+        Image.new("RGB", (200, 300), (255, 255, 255)).save(str(folder / "01.png"))
+    conn = library_index.connect(str(tmp_path / "library.sqlite3"))
+    series_id = library_index.add_series(conn, str(tmp_path / "raw"), str(tmp_path / "tl"))
+    library_index.index_series(conn, series_id)
+    yield conn, str(tmp_path / "raw" / "第1话")
+    conn.close()
+
+
+def test_differently_written_folder_finds_the_chapter(library):
+    conn, folder = library
+    # 对话框返回的路径可能带多余的分隔符或 “.”，Windows 上还可能是正斜杠
+    spelled = os.path.join(os.path.dirname(folder), ".", os.path.basename(folder)) + os.sep
+    library_index.update_chapter_status(conn, spelled, {"01.png"}, set())
+    assert [row["filename"] for row in library_index.find_pages(conn, needs_fix=True)] == ["01.png"]
+
+    page = {"original": [(1, 2, 3, 4, "漏翻")], "translated": []}
+    assert annotation_search.update_page(conn, spelled, "01.png", page)
+    assert [row["text"] for row in annotation_search.search(conn, "漏翻")] == ["漏翻"]
+    assert library_index.chapter_session(conn, spelled)["original_folder"] == folder
+
+
+def test_old_library_gets_folder_keys(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    old = sqlite3.connect(path)
+    old.executescript(library_index.SCHEMA.replace(",\n    folder_key TEXT", ""))
+    old.execute("INSERT INTO series (name, original_root, translated_root) VALUES ('s', '/a', '/b')")
+    old.execute("INSERT INTO chapters (series_id, name, original_folder, translated_folder, annotation_folder) "
+                "VALUES (1, 'c', '/a/c', '/b/c', '/a/标注')")
+    old.commit()
+    old.close()
+
+    conn = library_index.connect(path)
+    assert library_index.find_chapter(conn, "/a/./c/")["name"] == "c"
+    conn.close()
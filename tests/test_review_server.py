@@ -0,0 +1,90 @@
+"""在 localhost 上启动审核服务器，两个客户端同时提交标注并读取图块"""
+import os
+import io
+import threading
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import review_client
+import review_server
+
+PAGE_SIZE = (1200, 700)  # 第0级 3x2 个图块，第2级 1 个图块
+
+
+def make_chapter(root, pages=2):
+    folders = []
+    for side in ("original", "translated"):
+        folder = os.path.join(root, side)
+        os.makedirs(folder)
+        for index in range(pages):
+            color = (index * 60, 200, 100 if side == "original" else 140)
+            Image.new("RGB", PAGE_SIZE, color).save(os.path.join(folder, f"{index:03d}.png"))
+        folders.append(folder)
+    return folders
+
+
+@pytest.fixture
+def base_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(review_client, "MIRROR_ROOT", str(tmp_path / "remote"))
+    original, translated = make_chapter(str(tmp_path / "第1话"))
+    server = review_server.serve([("第1话", original, translated)], port=0)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_two_clients_merge_annotations(base_url):
+    alice = review_client.ReviewClient(base_url, "第1话", author="alice")
+    bob = review_client.ReviewClient(base_url, "第1话", author="bob")
+    shared = (10, 10, 50, 20, "漏翻")
+    pages = {
+        alice: {"original": [], "translated": [shared, (100, 100, 40, 40, "字体")]},
+        bob: {"original": [(5, 5, 10, 10, "裁切")], "translated": [shared]},
+    }
+
+    def push(client):
+        for _ in range(5):
+            client.push_page("000.png", pages[client])
+
+    threads = [threading.Thread(target=push, args=(client,)) for client in pages]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    alice.pull()
+    bob.pull()
+
+    merged = alice.store.page_annotations("000.png")
+    assert merged == bob.store.page_annotations("000.png")
+    assert sorted(merged["translated"]) == sorted([shared, (100, 100, 40, 40, "字体")])
+    assert merged["original"] == [(5, 5, 10, 10, "裁切")]
+
+    # 删除也会同步到另一个客户端
+    alice.push_page("000.png", {"original": merged["original"], "translated": [shared]})
+    bob.pull()
+    assert bob.store.page_annotations("000.png")["translated"] == [shared]
+
+
+def test_two_clients_fetch_tiles(base_url):
+    clients = [review_client.ReviewClient(base_url, "第1话", author=name) for name in ("alice", "bob")]
+    for client in clients:
+        client.pages()
+
+    infos = [client.cached_page_info("001.png", "translated") for client in clients]
+    assert infos[0] == infos[1]
+    assert infos[0]["levels"] == [list(PAGE_SIZE), [600, 350], [300, 175]]
+
+    tiles = [client.cached_tile("001.png", "translated", 0, 2, 1) for client in clients]
+    assert tiles[0] == tiles[1]
+    tile = Image.open(io.BytesIO(tiles[0]))
+    assert tile.size == (PAGE_SIZE[0] - 1024, PAGE_SIZE[1] - 512)
+    assert tile.getpixel((0, 0))[:3] == (60, 200, 140)
+
+    # 第二次读取来自本地缓存
+    folder = clients[0].tile_folder("001.png", "translated")
+    assert os.path.exists(os.path.join(folder, "0", "2_1.png"))
+    assert os.path.exists(os.path.join(folder, "info.json"))
+    overview = Image.open(io.BytesIO(clients[1].cached_tile("001.png", "translated", 2, 0, 0)))
+    assert overview.size == (300, 175)
@@ -0,0 +1,47 @@
+"""会话校验：尺寸不同而没有配对的图像不算新增图像"""
+import os
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import session_store
+from image_pairing import pair_images
+
+
+def make_chapter(root):
+    folders = []
+    for side, sizes in (("original", [(200, 300), (200, 300)]), ("translated", [(200, 300), (100, 150)])):
+        folder = os.path.join(root, side)
+        os.makedirs(folder)
+        for index, size in enumerate(sizes):
+            Image.new("RGB", size, (index * 80, 0, 0)).save(os.path.join(folder, f"{index:02d}.png"))
+        folders.append(folder)
+    return folders
+
+
+def chapter_session(original, translated):
+    pairs, mismatched = pair_images(original, translated)
+    pages = [{"filename": filename, "size": list(size),
+              "original": session_store.file_stat(o), "translated": session_store.file_stat(t)}
+             for o, t, filename, size in pairs]
+    entries = [session_store.mismatched_entry(original, translated, *page) for page in mismatched]
+    return session_store.new_session(original, translated, os.path.join(original, "标注"), pages,
+                                     mismatched=entries)
+
+
+def test_mismatched_page_is_not_reported_as_new(tmp_path):
+    original, translated = make_chapter(str(tmp_path))
+    session = chapter_session(original, translated)
+    assert [entry["filename"] for entry in session["mismatched"]] == ["01.png"]
+    assert session_store.validate_session(session) == []
+
+
+def test_reexported_mismatched_page_is_reported(tmp_path):
+    original, translated = make_chapter(str(tmp_path))
+    session = chapter_session(original, translated)
+    path = os.path.join(translated, "01.png")
+    Image.new("RGB", (200, 300), (0, 0, 0)).save(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5 * 10 ** 9))
+    assert session_store.validate_session(session) == ["图像已修改: 01.png"]
@@ -0,0 +1,127 @@
+"""用 MANGAQC_SHARE_THROTTLE 把本地文件夹当作慢速共享，检查目录清单、本地副本和后台预读"""
+import os
+import time
+
+import pytest
+
+import share_cache
+
+LATENCY_MS = 20
+
+
+@pytest.fixture
+def share(tmp_path, monkeypatch):
+    monkeypatch.setenv(share_cache.THROTTLE_ENV, f"{LATENCY_MS},50")
+    folder = tmp_path / "share"
+    folder.mkdir()
+    for index in range(4):
+        (folder / f"{index:03d}.png").write_bytes(bytes([index]) * (1000 + index))
+    cache = share_cache.ShareCache(root=str(tmp_path / "cache"))
+    # 统计从“共享”读取的数据块
+    reads = []
+    wait = cache.wait
+
+    def counting_wait(nbytes=0):
+        if nbytes:
+            reads.append(nbytes)
+        wait(nbytes)
+
+    cache.wait = counting_wait
+    yield cache, str(folder), reads
+    cache.shutdown()
+
+
+def test_throttle_makes_every_folder_remote(share):
+    cache, folder, _ = share
+    assert cache.throttle == (LATENCY_MS / 1000.0, 50 * 1024 * 1024)
+    assert cache.is_remote(folder)
+
+
+def test_listing_is_reused_until_invalidated(share, monkeypatch):
+    cache, folder, _ = share
+    start = time.monotonic()
+    assert cache.stat(os.path.join(folder, "001.png"))[0] == 1001
+    assert time.monotonic() - start >= LATENCY_MS / 1000.0
+    listed_at = cache.listings[os.path.normpath(folder)][0]
+
+    # 有效期内不再列目录，新文件也看不到
+    open(os.path.join(folder, "new.png"), "wb").close()
+    assert cache.stat(os.path.join(folder, "002.png"))[0] == 1002
+    assert "new.png" not in cache.list_names(folder)
+    assert cache.listings[os.path.normpath(folder)][0] == listed_at
+
+    cache.invalidate(folder)
+    assert "new.png" in cache.list_names(folder)
+
+    # 超过有效期后下次使用时重新列出
+    monkeypatch.setattr(share_cache, "LISTING_TTL", 0.0)
+    cache.stat(os.path.join(folder, "000.png"))
+    assert cache.listings[os.path.normpath(folder)][0] > listed_at
+
+
+def test_local_copy_is_read_once(share):
+    cache, folder, reads = share
+    path = os.path.join(folder, "000.png")
+    local = cache.local_path(path)
+    assert local != path and local.startswith(cache.root)
+    with open(local, "rb") as f:
+        assert f.read() == bytes([0]) * 1000
+    assert len(reads) == 1
+
+    assert cache.local_path(path) == local
+    assert len(reads) == 1
+
+
+def test_read_ahead_fills_the_cache(share):
+    cache, folder, reads = share
+    paths = [os.path.join(folder, f"{index:03d}.png") for index in range(1, 4)]
+    cache.read_ahead(paths)
+    # 预读只用一个线程，排在后面的任务完成时前面的预读都已完成
+    cache.executor.submit(lambda: None).result()
+    assert len(reads) == 3
+
+    for path in paths:
+        assert cache.local_path(path).startswith(cache.root)
+    assert len(reads) == 3
+
+
+def test_changed_file_gets_a_new_copy(share):
+    cache, folder, reads = share
+    path = os.path.join(folder, "000.png")
+    old = cache.local_path(path)
+
+    # 大小变化
+    with open(path, "wb") as f:
+        f.write(b"\x07" * 1500)
+    cache.invalidate(folder)
+    resized = cache.local_path(path)
+    assert resized != old and not os.path.exists(old)
+    with open(resized, "rb") as f:
+        assert f.read() == b"\x07" * 1500
+
+    # 大小不变，只有修改时间变化
+    with open(path, "wb") as f:
+        f.write(b"\x08" * 1500)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5 * 10 ** 9))
+    cache.invalidate(folder)
+    touched = cache.local_path(path)
+    assert touched != resized and not os.path.exists(resized)
+    with open(touched, "rb") as f:
+        assert f.read() == b"\x08" * 1500
+    assert len(reads) == 3
+
+
+def test_evicted_copy_is_fetched_again(share):
+    cache, folder, reads = share
+    path = os.path.join(folder, "000.png")
+    local = cache.local_path(path)
+    name = os.path.basename(local)
+
+    # 模拟另一个线程在查找和记录使用时间之间淘汰了副本
+    with cache.lock:
+        cache.remove(name)
+    assert cache.touch(name) is False
+    assert cache.local_path(path) == local
+    assert os.path.exists(local)
+    assert len(reads) == 2
@@ -0,0 +1,69 @@
+"""按风险排序审核页面
+
+每页的风险分数由三部分组成:
+- 像素差异面积：原图和翻译图差异明显的像素比例（在 4 倍缩小的图像上计算，
+  由后台进程池逐页计算并缓存）
+- 自动检测到的问题：排版溢出、清理残留等建议标注的置信度之和
+- 画质检查的风险分数
+
+差异面积只是辅助信号（每页翻译后都会有差异），所以权重较低，
+画质问题和检测到的问题权重较高。已通过且未变化的页面风险为0。
+"""
+import analysis_cache
+
+DIFF_VERSION = 1
+
+DIFF_THRESHOLD = 32  # 灰度差超过此值的像素视为有差异
+DIFF_AREA_SATURATION = 0.25  # 差异面积达到此比例时差异分数封顶
+
+# 各部分的权重
+DIFF_WEIGHT = 1.0
+SUGGESTION_WEIGHT = 1.5
+QUALITY_WEIGHT = 2.0
+
+
+def diff_area(inputs):
+    """计算一对图像差异像素的比例（在工作进程中运行）
+
+    只有尺寸相同的图像才会被配对，尺寸不同的页面由 quality_check.size_mismatch_results 单独评分。
+    """
+    return {"area": round(float((inputs["diff_map"] > DIFF_THRESHOLD).mean()), 4)}
+
+
+def risk_score(diff=None, quality=None, suggestions=()):
+    """组合各项结果得到风险分数，缺少的部分按0计算"""
+    score = 0.0
+    if diff:
+        score += DIFF_WEIGHT * min(diff["area"] / DIFF_AREA_SATURATION, 1.0)
+    if quality:
+        score += QUALITY_WEIGHT * quality["score"]
+    score += SUGGESTION_WEIGHT * sum(s["confidence"] for s in suggestions)
+    return score
+
+
+def cache_path(annotation_folder, original_folder):
+    return analysis_cache.chapter_cache_path(annotation_folder, original_folder, "差异缓存")
+
+
+CHECK = {
+    "name": "diff",
+    "version": DIFF_VERSION,
+    "inputs": ("diff_map",),
+    "run": diff_area,
+    "cache_path": cache_path,
+}
+
+
+def run_diff_scan(pairs, annotation_folder, original_folder, on_result=None, cancelled=None, workers=None):
+    """计算章节中所有图像对的差异面积，缓存命中的页面立即通过 on_result 返回
+
+    适合在后台线程中运行。返回 {文件名: 结果}。
+    """
+    import check_scheduler
+
+    def forward(name, filename, result):
+        if on_result:
+            on_result(filename, result)
+
+    return check_scheduler.run_checks(pairs, annotation_folder, original_folder, ["diff"], workers=workers,
+                                      on_result=forward, cancelled=cancelled, batch_size=4)["diff"]